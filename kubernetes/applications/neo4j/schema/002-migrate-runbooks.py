@@ -9,18 +9,27 @@ This script:
 4. Creates SOLVES relationships
 5. Dual-indexes Problems in 'knowledge_nodes' collection
 
-Run with: python 002-migrate-runbooks.py [--dry-run]
+Re-runnable: each Runbook node stores a source_hash of the Qdrant runbook it
+came from, and only runbooks whose hash changed are written. Nodes are
+MERGEd on ids reused from earlier runs, so nothing is duplicated. Runbooks
+are written in batches (one UNWIND statement and one embeddings request per
+batch) with a bounded number of batches in flight, and each finished batch
+is recorded in a checkpoint file so an interrupted run resumes where it
+stopped.
+
+Run with: python 002-migrate-runbooks.py [--dry-run] [--reset] [--batch-size N] [--concurrency N]
 """
 
 import os
-import sys
 import json
+import asyncio
 import hashlib
 import logging
+import argparse
 from datetime import datetime
 from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
-from uuid import uuid4
+from dataclasses import dataclass, asdict
+from uuid import UUID, uuid5
 
 import httpx
 
@@ -31,6 +40,10 @@ NEO4J_USER = os.environ.get("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.environ.get("NEO4J_PASSWORD", "")
 OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://ollama.ai-platform.svc:11434")
 EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "nomic-embed-text")
+CHECKPOINT_PATH = os.environ.get("MIGRATION_CHECKPOINT", ".002-migrate-runbooks.checkpoint.json")
+
+# Node ids are derived from the runbook id so re-runs MERGE onto the same nodes
+ID_NAMESPACE = UUID("3b6f0e1c-8a2d-4c57-b9e4-51d7f0a2c6e8")
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -79,62 +92,100 @@ def content_hash(data: dict) -> str:
     return hashlib.sha256(content.encode()).hexdigest()[:16]
 
 
-async def get_embedding(text: str) -> List[float]:
-    """Generate embedding using Ollama."""
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(
-            f"{OLLAMA_URL}/api/embeddings",
-            json={"model": EMBEDDING_MODEL, "prompt": text}
-        )
-        response.raise_for_status()
-        return response.json().get("embedding", [])
+def source_hash(runbook: RunbookData) -> str:
+    """Hash of everything the migration writes for a runbook (created_at defaults to now, so it's left out)."""
+    data = asdict(runbook)
+    data.pop("created_at")
+    return content_hash(data)
 
 
-async def qdrant_request(endpoint: str, method: str = "GET", data: dict = None) -> Dict[str, Any]:
-    """Make request to Qdrant API."""
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        url = f"{QDRANT_URL}{endpoint}"
-        if method == "GET":
-            response = await client.get(url)
-        elif method == "POST":
-            response = await client.post(url, json=data)
-        elif method == "PUT":
-            response = await client.put(url, json=data)
-        response.raise_for_status()
-        return response.json()
+def derived_id(runbook_id: str, kind: str) -> str:
+    return str(uuid5(ID_NAMESPACE, f"{runbook_id}:{kind}"))
 
 
-async def neo4j_query(cypher: str, params: dict = None) -> List[Dict]:
-    """Execute Cypher query against Neo4j."""
-    async with httpx.AsyncClient(timeout=30.0) as client:
+def load_checkpoint() -> Dict[str, str]:
+    """Runbook id -> source_hash of runbooks written by earlier (possibly interrupted) runs."""
+    try:
+        with open(CHECKPOINT_PATH) as f:
+            return json.load(f).get("runbooks", {})
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoint(done: Dict[str, str]):
+    tmp = f"{CHECKPOINT_PATH}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"updated_at": datetime.utcnow().isoformat(), "runbooks": done}, f, indent=2, sort_keys=True)
+    os.replace(tmp, CHECKPOINT_PATH)
+
+
+async def get_embeddings(client: httpx.AsyncClient, texts: List[str]) -> List[List[float]]:
+    """Generate embeddings for a batch of texts using Ollama."""
+    response = await client.post(
+        f"{OLLAMA_URL}/api/embed",
+        json={"model": EMBEDDING_MODEL, "input": texts},
+        timeout=120.0
+    )
+    if response.status_code != 404:
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    # Ollama before /api/embed: one prompt per request
+    embeddings = []
+    for text in texts:
         response = await client.post(
-            f"{NEO4J_URL}/db/neo4j/tx/commit",
-            auth=(NEO4J_USER, NEO4J_PASSWORD),
-            json={
-                "statements": [{
-                    "statement": cypher,
-                    "parameters": params or {}
-                }]
-            }
+            f"{OLLAMA_URL}/api/embeddings",
+            json={"model": EMBEDDING_MODEL, "prompt": text},
+            timeout=60.0
         )
         response.raise_for_status()
-        result = response.json()
+        embeddings.append(response.json().get("embedding", []))
+    return embeddings
 
-        if result.get("errors"):
-            raise Exception(f"Neo4j error: {result['errors']}")
 
-        return result.get("results", [{}])[0].get("data", [])
-
-
-async def ensure_knowledge_nodes_collection():
+async def qdrant_request(client: httpx.AsyncClient, endpoint: str, method: str = "GET", data: dict = None) -> Dict[str, Any]:
+    """Make request to Qdrant API."""
+    url = f"{QDRANT_URL}{endpoint}"
+    if method == "GET":
+        response = await client.get(url)
+    elif method == "POST":
+        response = await client.post(url, json=data)
+    elif method == "PUT":
+        response = await client.put(url, json=data)
+    response.raise_for_status()
+    return response.json()
+
+
+async def neo4j_query(client: httpx.AsyncClient, cypher: str, params: dict = None) -> List[Dict]:
+    """Execute Cypher query against Neo4j."""
+    response = await client.post(
+        f"{NEO4J_URL}/db/neo4j/tx/commit",
+        auth=(NEO4J_USER, NEO4J_PASSWORD),
+        json={
+            "statements": [{
+                "statement": cypher,
+                "parameters": params or {}
+            }]
+        }
+    )
+    response.raise_for_status()
+    result = response.json()
+
+    if result.get("errors"):
+        raise Exception(f"Neo4j error: {result['errors']}")
+
+    return result.get("results", [{}])[0].get("data", [])
+
+
+async def ensure_knowledge_nodes_collection(client: httpx.AsyncClient):
     """Create knowledge_nodes collection in Qdrant if it doesn't exist."""
     try:
-        await qdrant_request("/collections/knowledge_nodes")
+        await qdrant_request(client, "/collections/knowledge_nodes")
         logger.info("knowledge_nodes collection already exists")
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
             logger.info("Creating knowledge_nodes collection...")
-            await qdrant_request("/collections/knowledge_nodes", "PUT", {
+            await qdrant_request(client, "/collections/knowledge_nodes", "PUT", {
                 "vectors": {
                     "size": 768,  # nomic-embed-text dimension
                     "distance": "Cosine"
@@ -145,42 +196,68 @@ async def ensure_knowledge_nodes_collection():
             raise
 
 
-async def fetch_all_runbooks() -> List[RunbookData]:
+async def fetch_all_runbooks(client: httpx.AsyncClient) -> List[RunbookData]:
     """Fetch all runbooks from Qdrant."""
-    result = await qdrant_request("/collections/runbooks/points/scroll", "POST", {
-        "limit": 100,
-        "with_payload": True
-    })
-
     runbooks = []
-    for point in result.get("result", {}).get("points", []):
-        payload = point.get("payload", {})
-        runbooks.append(RunbookData(
-            id=str(point.get("id")),
-            title=payload.get("title", "Untitled"),
-            trigger_pattern=payload.get("trigger_pattern", ""),
-            solution=payload.get("solution", ""),
-            path=payload.get("path"),
-            automation_level=payload.get("automation_level", "manual"),
-            execution_count=payload.get("execution_count", 0),
-            success_count=payload.get("success_count", 0),
-            success_rate=payload.get("success_rate", 0.0),
-            created_at=payload.get("created_at", datetime.utcnow().isoformat())
-        ))
-
-    return runbooks
-
-
-async def migrate_runbook(runbook: RunbookData, dry_run: bool = False) -> Dict[str, Any]:
-    """Migrate a single runbook to Neo4j with dual-indexing."""
-
-    # Classify domain
-    domain = classify_domain(f"{runbook.title} {runbook.trigger_pattern}")
+    offset = None
+    while True:
+        body = {"limit": 100, "with_payload": True}
+        if offset is not None:
+            body["offset"] = offset
+        result = await qdrant_request(client, "/collections/runbooks/points/scroll", "POST", body)
+
+        for point in result.get("result", {}).get("points", []):
+            payload = point.get("payload", {})
+            runbooks.append(RunbookData(
+                id=str(point.get("id")),
+                title=payload.get("title", "Untitled"),
+                trigger_pattern=payload.get("trigger_pattern", ""),
+                solution=payload.get("solution", ""),
+                path=payload.get("path"),
+                automation_level=payload.get("automation_level", "manual"),
+                execution_count=payload.get("execution_count", 0),
+                success_count=payload.get("success_count", 0),
+                success_rate=payload.get("success_rate", 0.0),
+                created_at=payload.get("created_at", datetime.utcnow().isoformat())
+            ))
+
+        offset = result.get("result", {}).get("next_page_offset")
+        if offset is None:
+            return runbooks
+
+
+async def fetch_migrated_state(client: httpx.AsyncClient) -> Dict[str, Dict[str, Any]]:
+    """
+    What earlier runs wrote per runbook id: source_hash and the ids of its
+    Problem, RunbookVersions and Solution, so they are updated rather than
+    duplicated (including graphs written before ids were derived).
+    """
+    rows = await neo4j_query(client, """
+        MATCH (r:Runbook)
+        OPTIONAL MATCH (r)-[:SOLVES]->(p:Problem)
+        OPTIONAL MATCH (r)-[hv:HAS_VERSION]->(rv:RunbookVersion)
+        WITH r, head(collect(DISTINCT p)) AS p,
+             [v IN collect(DISTINCT {id: rv.id, hash: rv.content_hash, version: rv.version, current: hv.current})
+              WHERE v.id IS NOT NULL] AS versions
+        OPTIONAL MATCH (p)-[:SOLVED_BY]->(s:Solution)
+        RETURN r.id, r.source_hash, p.id, versions, head(collect(s.id))
+    """)
+    state = {}
+    for row in rows:
+        runbook_id, hash_, problem_id, versions, solution_id = row["row"]
+        state[runbook_id] = {
+            "source_hash": hash_,
+            "problem_id": problem_id,
+            "versions": versions,
+            "solution_id": solution_id
+        }
+    return state
+
 
-    # Generate IDs
-    problem_id = str(uuid4())
-    runbook_id = runbook.id  # Keep original ID for reference
-    version_id = str(uuid4())
+def migration_row(runbook: RunbookData, previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """UNWIND parameters for one runbook, reusing node ids from an earlier migration."""
+    previous = previous or {}
+    domain = classify_domain(f"{runbook.title} {runbook.trigger_pattern}")
 
     # Create content hash for version
     version_content = {
@@ -189,180 +266,191 @@ async def migrate_runbook(runbook: RunbookData, dry_run: bool = False) -> Dict[s
     }
     version_hash = content_hash(version_content)
 
-    if dry_run:
-        logger.info(f"[DRY RUN] Would migrate: {runbook.title}")
-        logger.info(f"  - Domain: {domain}")
-        logger.info(f"  - Problem ID: {problem_id}")
-        logger.info(f"  - Runbook ID: {runbook_id}")
-        return {"status": "dry_run", "runbook_id": runbook_id}
-
-    # Create Problem node
-    await neo4j_query("""
-        CREATE (p:Problem {
-            id: $problem_id,
-            description: $trigger_pattern,
-            domain: $domain,
-            created_at: datetime($created_at),
-            last_referenced: datetime(),
-            weight: 1.0
-        })
-    """, {
-        "problem_id": problem_id,
-        "trigger_pattern": runbook.trigger_pattern,
-        "domain": domain,
-        "created_at": runbook.created_at
-    })
+    # RunbookVersions are immutable: unchanged content keeps its version,
+    # changed content gets a new one that becomes current
+    versions = previous.get("versions") or []
+    existing = next((v for v in versions if v.get("hash") == version_hash), None)
+    if existing:
+        version_id, version = existing["id"], existing.get("version") or "1.0.0"
+    else:
+        version_id, version = derived_id(runbook.id, version_hash), f"1.0.{len(versions)}"
 
-    # Create Runbook node
-    await neo4j_query("""
-        CREATE (r:Runbook {
-            id: $runbook_id,
-            name: $title,
-            problem_class: $trigger_pattern,
-            skills_required: $skills,
-            automation_level: $automation_level,
-            current_version: $version,
-            created_at: datetime($created_at),
-            last_used: datetime()
-        })
-    """, {
-        "runbook_id": runbook_id,
+    return {
+        "runbook_id": runbook.id,  # Keep original ID for reference
+        "problem_id": previous.get("problem_id") or derived_id(runbook.id, "problem"),
+        "solution_id": previous.get("solution_id") or derived_id(runbook.id, "solution"),
+        "version_id": version_id,
+        "version": version,
+        "version_hash": version_hash,
+        "source_hash": source_hash(runbook),
+        "domain": domain,
         "title": runbook.title,
         "trigger_pattern": runbook.trigger_pattern,
         "skills": [domain] if domain != "general" else ["infra"],
         "automation_level": runbook.automation_level,
-        "version": "1.0.0",
-        "created_at": runbook.created_at
-    })
-
-    # Create RunbookVersion node
-    # Note: steps and ground_truth_probes stored as JSON strings for Neo4j Community Edition compatibility
-    await neo4j_query("""
-        CREATE (rv:RunbookVersion {
-            id: $version_id,
-            runbook_id: $runbook_id,
-            version: "1.0.0",
-            steps_json: $steps_json,
-            ground_truth_probes_json: "[]",
-            content_hash: $content_hash,
-            created_at: datetime(),
-            created_by: "migration"
-        })
-    """, {
-        "version_id": version_id,
-        "runbook_id": runbook_id,
+        "created_at": runbook.created_at,
         "steps_json": json.dumps([{"action": "Execute solution", "description": runbook.solution[:500]}]),
-        "content_hash": version_hash
-    })
+        "solution": runbook.solution[:500],
+        "execution_count": runbook.execution_count,
+        "success_count": runbook.success_count,
+        "success_rate": runbook.success_rate
+    }
 
-    # Create relationships
-    await neo4j_query("""
-        MATCH (r:Runbook {id: $runbook_id})
-        MATCH (p:Problem {id: $problem_id})
-        MATCH (rv:RunbookVersion {id: $version_id})
-        CREATE (r)-[:SOLVES]->(p)
-        CREATE (r)-[:HAS_VERSION {current: true}]->(rv)
-    """, {
-        "runbook_id": runbook_id,
-        "problem_id": problem_id,
-        "version_id": version_id
-    })
 
-    # If we have execution history, create a synthetic SOLVED_BY relationship
-    if runbook.execution_count > 0:
-        await neo4j_query("""
-            MATCH (p:Problem {id: $problem_id})
-            CREATE (s:Solution {
-                id: randomUUID(),
-                approach: $solution,
-                outcome_summary: "Migrated from Qdrant runbooks",
-                confidence: $success_rate,
-                created_at: datetime()
-            })
-            CREATE (p)-[:SOLVED_BY {
-                success_rate: $success_rate,
-                attempts: $attempts,
-                successes: $successes,
-                last_used: datetime()
-            }]->(s)
-        """, {
-            "problem_id": problem_id,
-            "solution": runbook.solution[:500],
-            "success_rate": runbook.success_rate,
-            "attempts": runbook.execution_count,
-            "successes": runbook.success_count
-        })
-
-    # Dual-index Problem in Qdrant
-    embedding = await get_embedding(runbook.trigger_pattern)
-    await qdrant_request("/collections/knowledge_nodes/points", "PUT", {
-        "points": [{
-            "id": problem_id,
-            "vector": embedding,
-            "payload": {
-                "type": "problem",
-                "neo4j_id": problem_id,
-                "domain": domain,
-                "content_hash": content_hash({"description": runbook.trigger_pattern}),
-                "indexed_at": datetime.utcnow().isoformat()
+# One statement per batch. RunbookVersion steps and ground_truth_probes are
+# stored as JSON strings for Neo4j Community Edition compatibility. Runbooks
+# with execution history get a synthetic SOLVED_BY Solution.
+MIGRATE_BATCH_CYPHER = """
+    UNWIND $rows AS row
+    MERGE (p:Problem {id: row.problem_id})
+      ON CREATE SET p.created_at = datetime(row.created_at), p.weight = 1.0
+    SET p.description = row.trigger_pattern,
+        p.domain = row.domain,
+        p.last_referenced = datetime()
+    MERGE (r:Runbook {id: row.runbook_id})
+      ON CREATE SET r.created_at = datetime(row.created_at), r.last_used = datetime()
+    SET r.name = row.title,
+        r.problem_class = row.trigger_pattern,
+        r.skills_required = row.skills,
+        r.automation_level = row.automation_level,
+        r.current_version = row.version,
+        r.source_hash = row.source_hash
+    MERGE (r)-[:SOLVES]->(p)
+    MERGE (rv:RunbookVersion {id: row.version_id})
+      ON CREATE SET rv.runbook_id = row.runbook_id,
+                    rv.version = row.version,
+                    rv.steps_json = row.steps_json,
+                    rv.ground_truth_probes_json = "[]",
+                    rv.content_hash = row.version_hash,
+                    rv.created_at = datetime(),
+                    rv.created_by = "migration"
+    WITH row, p, r, rv
+    OPTIONAL MATCH (r)-[old:HAS_VERSION]->(other:RunbookVersion)
+    WHERE other.id <> row.version_id
+    SET old.current = false
+    WITH DISTINCT row, p, r, rv
+    MERGE (r)-[hv:HAS_VERSION]->(rv)
+    SET hv.current = true
+    FOREACH (_ IN CASE WHEN row.execution_count > 0 THEN [1] ELSE [] END |
+        MERGE (s:Solution {id: row.solution_id})
+          ON CREATE SET s.created_at = datetime(), s.outcome_summary = "Migrated from Qdrant runbooks"
+        SET s.approach = row.solution, s.confidence = row.success_rate
+        MERGE (p)-[sb:SOLVED_BY]->(s)
+        SET sb.success_rate = row.success_rate,
+            sb.attempts = row.execution_count,
+            sb.successes = row.success_count,
+            sb.last_used = datetime()
+    )
+"""
+
+
+async def migrate_batch(client: httpx.AsyncClient, rows: List[Dict[str, Any]]):
+    """Write a batch of runbooks to Neo4j with dual-indexing of their Problems."""
+    # Dual-index Problems in Qdrant first (point id = Problem id, so re-runs
+    # overwrite): the Cypher below records source_hash, which makes later runs
+    # skip the runbook, so it must only commit once everything else is written
+    embeddings = await get_embeddings(client, [row["trigger_pattern"] for row in rows])
+    if len(embeddings) != len(rows):
+        raise RuntimeError(f"Expected {len(rows)} embeddings, got {len(embeddings)}")
+    await qdrant_request(client, "/collections/knowledge_nodes/points?wait=true", "PUT", {
+        "points": [
+            {
+                "id": row["problem_id"],
+                "vector": embedding,
+                "payload": {
+                    "type": "problem",
+                    "neo4j_id": row["problem_id"],
+                    "domain": row["domain"],
+                    "content_hash": content_hash({"description": row["trigger_pattern"]}),
+                    "indexed_at": datetime.utcnow().isoformat()
+                }
             }
-        }]
+            for row, embedding in zip(rows, embeddings)
+        ]
     })
+    await neo4j_query(client, MIGRATE_BATCH_CYPHER, {"rows": rows})
 
-    logger.info(f"Migrated: {runbook.title} -> Problem({problem_id}), Runbook({runbook_id})")
-
-    return {
-        "status": "migrated",
-        "runbook_id": runbook_id,
-        "problem_id": problem_id,
-        "domain": domain
-    }
+    for row in rows:
+        logger.info(f"Migrated: {row['title']} -> Problem({row['problem_id']}), Runbook({row['runbook_id']})")
 
 
 async def main():
-    dry_run = "--dry-run" in sys.argv
-
-    if dry_run:
+    parser = argparse.ArgumentParser(description="Migrate Qdrant runbooks to the Neo4j reasoning graph")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be migrated without writing")
+    parser.add_argument("--reset", action="store_true", help="Ignore the checkpoint file (e.g. after wiping Neo4j)")
+    parser.add_argument("--batch-size", type=int, default=25, help="Runbooks per Neo4j write (default: 25)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Batches in flight (default: 4)")
+    args = parser.parse_args()
+
+    if args.dry_run:
         logger.info("=== DRY RUN MODE ===")
 
-    # Ensure knowledge_nodes collection exists
-    await ensure_knowledge_nodes_collection()
-
-    # Fetch all runbooks
-    logger.info("Fetching runbooks from Qdrant...")
-    runbooks = await fetch_all_runbooks()
-    logger.info(f"Found {len(runbooks)} runbooks to migrate")
-
-    # Migrate each runbook
-    results = {
-        "total": len(runbooks),
-        "migrated": 0,
-        "failed": 0,
-        "domains": {}
-    }
-
-    for runbook in runbooks:
-        try:
-            result = await migrate_runbook(runbook, dry_run)
-            results["migrated"] += 1
-
-            domain = result.get("domain", "unknown")
-            results["domains"][domain] = results["domains"].get(domain, 0) + 1
-
-        except Exception as e:
-            logger.error(f"Failed to migrate {runbook.title}: {e}")
-            results["failed"] += 1
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        # Ensure knowledge_nodes collection exists
+        if not args.dry_run:
+            await ensure_knowledge_nodes_collection(client)
+
+        # Fetch all runbooks
+        logger.info("Fetching runbooks from Qdrant...")
+        runbooks = await fetch_all_runbooks(client)
+        logger.info(f"Found {len(runbooks)} runbooks")
+
+        # Skip runbooks whose source is unchanged since they were last written
+        checkpoint = {} if args.reset else load_checkpoint()
+        state = await fetch_migrated_state(client)
+        pending = []
+        for runbook in runbooks:
+            hash_ = source_hash(runbook)
+            if hash_ in (checkpoint.get(runbook.id), state.get(runbook.id, {}).get("source_hash")):
+                continue
+            pending.append(migration_row(runbook, state.get(runbook.id)))
+
+        results = {
+            "total": len(runbooks),
+            "unchanged": len(runbooks) - len(pending),
+            "migrated": 0,
+            "failed": 0,
+            "domains": {}
+        }
+
+        if args.dry_run:
+            for row in pending:
+                logger.info(f"[DRY RUN] Would migrate: {row['title']}")
+                logger.info(f"  - Domain: {row['domain']}")
+                logger.info(f"  - Problem ID: {row['problem_id']}")
+                logger.info(f"  - Runbook ID: {row['runbook_id']}")
+                logger.info(f"  - Version: {row['version']}")
+        else:
+            done = dict(checkpoint)
+            semaphore = asyncio.Semaphore(max(1, args.concurrency))
+
+            async def run_batch(rows):
+                async with semaphore:
+                    try:
+                        await migrate_batch(client, rows)
+                    except Exception as e:
+                        logger.error(f"Failed to migrate batch of {len(rows)} ({rows[0]['title']}, ...): {e}")
+                        results["failed"] += len(rows)
+                        return
+                results["migrated"] += len(rows)
+                for row in rows:
+                    done[row["runbook_id"]] = row["source_hash"]
+                    results["domains"][row["domain"]] = results["domains"].get(row["domain"], 0) + 1
+                save_checkpoint(done)
+
+            size = max(1, args.batch_size)
+            await asyncio.gather(*[run_batch(pending[i:i + size]) for i in range(0, len(pending), size)])
 
     # Print summary
     logger.info("=== Migration Summary ===")
-    logger.info(f"Total:    {results['total']}")
-    logger.info(f"Migrated: {results['migrated']}")
-    logger.info(f"Failed:   {results['failed']}")
+    logger.info(f"Total:     {results['total']}")
+    logger.info(f"Unchanged: {results['unchanged']}")
+    logger.info(f"Migrated:  {results['migrated']}" + (f" (dry run: {len(pending)} pending)" if args.dry_run else ""))
+    logger.info(f"Failed:    {results['failed']}")
     logger.info("Domains:")
     for domain, count in sorted(results["domains"].items()):
         logger.info(f"  - {domain}: {count}")
 
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
@@ -1,12 +1,35 @@
 #!/usr/bin/env python3
 """Knowledge MCP server for Qdrant vector database operations."""
 import os
+import re
+import sys
+import uuid
+import copy
+import base64
+import json
+import time
+import asyncio
 import logging
+import hashlib
+import heapq
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
 import httpx
-from typing import List, Optional
-from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, List, Optional, Union
+from datetime import datetime, timedelta, timezone
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from fastmcp import FastMCP
+from fastmcp.server.middleware import Middleware, MiddlewareContext
 from pydantic import BaseModel
+from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,6 +39,93 @@ QDRANT_URL = os.environ.get("QDRANT_URL", "http://qdrant:6333")
 OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://ollama:11434")
 EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "nomic-embed-text")
 
+# Backend connection pools (shared for the lifetime of the server)
+QDRANT_TIMEOUT = float(os.environ.get("QDRANT_TIMEOUT", "30"))
+QDRANT_MAX_CONNECTIONS = int(os.environ.get("QDRANT_MAX_CONNECTIONS", "50"))
+QDRANT_MAX_KEEPALIVE = int(os.environ.get("QDRANT_MAX_KEEPALIVE", "20"))
+QDRANT_HTTP2 = os.environ.get("QDRANT_HTTP2", "false").lower() == "true"
+OLLAMA_TIMEOUT = float(os.environ.get("OLLAMA_TIMEOUT", "60"))
+OLLAMA_MAX_CONNECTIONS = int(os.environ.get("OLLAMA_MAX_CONNECTIONS", "10"))
+OLLAMA_MAX_KEEPALIVE = int(os.environ.get("OLLAMA_MAX_KEEPALIVE", "5"))
+OLLAMA_HTTP2 = os.environ.get("OLLAMA_HTTP2", "false").lower() == "true"
+KEEPALIVE_EXPIRY = float(os.environ.get("KEEPALIVE_EXPIRY", "30"))
+
+# Embedding cache (in-memory LRU, optional sqlite tier that survives restarts)
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "")
+
+# Embedding micro-batching (concurrent requests coalesced into one /api/embed call)
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_BATCH_WINDOW_MS = float(os.environ.get("EMBEDDING_BATCH_WINDOW_MS", "5"))
+
+# In-process identifier map for get_entity (other writers may update Qdrant, hence the TTL)
+ENTITY_CACHE_ENABLED = os.environ.get("ENTITY_CACHE_ENABLED", "true").lower() == "true"
+ENTITY_CACHE_TTL = float(os.environ.get("ENTITY_CACHE_TTL", "60"))
+
+# Grouped payload counts (facet/count APIs, scroll fallback), cached until the next write
+AGGREGATE_CACHE_TTL = float(os.environ.get("AGGREGATE_CACHE_TTL", "300"))
+AGGREGATE_FACET_LIMIT = int(os.environ.get("AGGREGATE_FACET_LIMIT", "1000"))
+SCROLL_PAGE_SIZE = int(os.environ.get("SCROLL_PAGE_SIZE", "256"))
+
+# In-memory alertname/trigger_pattern -> runbook index (reloaded in the background when stale)
+RUNBOOK_INDEX_TTL = float(os.environ.get("RUNBOOK_INDEX_TTL", "300"))
+
+# Search result cache (dropped per collection on every write through this server)
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "512"))
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", "60"))
+
+# Collection settings the startup schema reconciler creates and checks for drift
+VECTOR_SIZE = int(os.environ.get("VECTOR_SIZE", "768"))
+HNSW_M = int(os.environ.get("HNSW_M", "16"))
+HNSW_EF_CONSTRUCT = int(os.environ.get("HNSW_EF_CONSTRUCT", "100"))
+INDEXING_THRESHOLD = int(os.environ.get("INDEXING_THRESHOLD", "20000"))
+
+# Large collections get quantized vectors in RAM with originals on disk (scalar | binary | none)
+QUANTIZATION = os.environ.get("QUANTIZATION", "scalar").lower()
+QUANTIZED_COLLECTIONS = [
+    c.strip() for c in os.environ.get("QUANTIZED_COLLECTIONS", "agent_events,entities,documentation").split(",") if c.strip()
+]
+SEARCH_OVERSAMPLING = float(os.environ.get("SEARCH_OVERSAMPLING", "2.0"))
+
+# In-process vector mirrors for small, hot collections (needs numpy)
+LOCAL_INDEX_COLLECTIONS = [
+    c.strip() for c in os.environ.get("LOCAL_INDEX_COLLECTIONS", "device_types,runbooks").split(",") if c.strip()
+]
+LOCAL_INDEX_RELOAD_INTERVAL = float(os.environ.get("LOCAL_INDEX_RELOAD_INTERVAL", "300"))
+
+# Log a per-tool-call timing breakdown (embedding, qdrant, ollama, conversion)
+DEBUG_TIMINGS = os.environ.get("DEBUG_TIMINGS", "false").lower() == "true"
+
+# Write-behind for log_event/update_event: queued ops are embedded and upserted in batches
+EVENT_WRITE_BEHIND = os.environ.get("EVENT_WRITE_BEHIND", "false").lower() == "true"
+EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", "1000"))
+EVENT_QUEUE_BATCH = int(os.environ.get("EVENT_QUEUE_BATCH", "64"))
+EVENT_QUEUE_MAX_RETRIES = int(os.environ.get("EVENT_QUEUE_MAX_RETRIES", "5"))
+EVENT_QUEUE_DRAIN_TIMEOUT = float(os.environ.get("EVENT_QUEUE_DRAIN_TIMEOUT", "10"))
+EVENT_SPILL_PATH = os.environ.get("EVENT_SPILL_PATH", "")
+
+# agent_events retention: days kept per event type (0 = forever), rolled up into daily summaries.
+# Off unless configured; EVENT_RETENTION_TTLS is e.g. "agent.tool.call=14,agent.chat.start=30",
+# and EVENT_RETENTION_INTERVAL (seconds, 0 = never) schedules the sweep.
+EVENT_RETENTION_DAYS = int(os.environ.get("EVENT_RETENTION_DAYS", "0"))
+EVENT_RETENTION_TTLS = {
+    event_type.strip(): int(days)
+    for event_type, _, days in (
+        item.partition("=") for item in os.environ.get("EVENT_RETENTION_TTLS", "").split(",") if "=" in item
+    )
+}
+EVENT_ROLLUP_RETENTION_DAYS = int(os.environ.get("EVENT_ROLLUP_RETENTION_DAYS", "0"))
+EVENT_RETENTION_INTERVAL = float(os.environ.get("EVENT_RETENTION_INTERVAL", "0"))
+
+# Runbook autonomy suggestions use this rolling window (one of 7, 30, 90 days)
+AUTONOMY_WINDOW_DAYS = int(os.environ.get("AUTONOMY_WINDOW_DAYS", "30"))
+
+# NDJSON import: parallel upsert requests in flight
+IMPORT_CONCURRENCY = int(os.environ.get("IMPORT_CONCURRENCY", "4"))
+
+# Bulk entity ingest: points per upsert request
+BULK_UPSERT_CHUNK = int(os.environ.get("BULK_UPSERT_CHUNK", "256"))
+
 mcp = FastMCP(
     name="knowledge-mcp",
     instructions="""
@@ -29,8 +139,11 @@ mcp = FastMCP(
     - get_entities_by_network: Filter by network/VLAN
     - get_device_type_info: Get control methods for a device type
     - update_entity: Update entity metadata after actions
+    - add_entities_bulk, upsert_entities_bulk: Ingest scan results or lease dumps in one call
 
     KNOWLEDGE TOOLS:
+    - lookup_runbook_tiered: Runbook for an alertname (exact match first, semantic fallback)
+    - search_knowledge: One query across runbooks, decisions, and documentation
     - search_runbooks, search_decisions, search_documentation: Find relevant information
     - add_runbook, add_decision: Store new knowledge
     - get_similar_events: Pattern matching for events
@@ -89,133 +202,1330 @@ class DeviceTypeInfo(BaseModel):
     default_credentials_path: str = ""
 
 
+# ============================================================
+# METRICS
+# ============================================================
+
+TOOL_DURATION = Histogram(
+    'knowledge_mcp_tool_duration_seconds',
+    'MCP tool call duration in seconds',
+    ['tool', 'status'],
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+)
+BACKEND_DURATION = Histogram(
+    'knowledge_mcp_backend_duration_seconds',
+    'Qdrant/Ollama request duration in seconds, including the response body',
+    ['backend', 'operation', 'collection', 'status'],
+    buckets=[0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10]
+)
+BACKEND_BYTES = Counter(
+    'knowledge_mcp_backend_bytes_total',
+    'Bytes sent to and received from Qdrant/Ollama',
+    ['backend', 'direction']
+)
+STAGE_DURATION = Histogram(
+    'knowledge_mcp_stage_duration_seconds',
+    'Time spent in in-process stages (embedding lookup, result conversion)',
+    ['stage'],
+    buckets=[0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5]
+)
+EMBEDDING_REQUESTS = Counter(
+    'knowledge_mcp_embedding_requests_total',
+    'Ollama embedding API calls',
+    ['api']
+)
+EMBEDDING_INPUTS = Counter(
+    'knowledge_mcp_embedding_inputs_total',
+    'Texts sent to Ollama for embedding'
+)
+EMBEDDING_CACHE_LOOKUPS = Counter(
+    'knowledge_mcp_embedding_cache_lookups_total',
+    'Embedding cache lookups',
+    ['result']
+)
+
+# Per-tool-call stage timings, set while DEBUG_TIMINGS is on
+request_timings: ContextVar[Optional[dict]] = ContextVar("request_timings", default=None)
+
+
+def add_timing(stage: str, seconds: float):
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str):
+    """Record the duration of an in-process stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.labels(stage).observe(elapsed)
+        add_timing(stage, elapsed)
+
+
+# Qdrant point sub-resources; any other /points/<x> is a point id
+QDRANT_POINT_OPERATIONS = {"search", "scroll", "count", "delete", "payload", "batch", "recommend", "query", "vectors"}
+
+
+def backend_labels(path: str) -> tuple:
+    """(operation, collection) labels for a backend request path, with ids collapsed."""
+    parts = path.strip("/").split("/")
+    if parts[0] == "collections" and len(parts) >= 2 and parts[1] != "aliases":
+        rest = parts[2:]
+        if len(rest) >= 2 and rest[0] == "points" and rest[1] not in QDRANT_POINT_OPERATIONS:
+            rest = ["points", "{id}"]
+        return "/".join(rest) or "collection", parts[1]
+    return "/".join(parts), ""
+
+
+def backend_event_hooks(backend: str) -> dict:
+    """httpx event hooks timing each request and counting bytes for one backend."""
+    async def on_request(request: httpx.Request):
+        request.extensions["started_at"] = time.perf_counter()
+        BACKEND_BYTES.labels(backend, "sent").inc(len(request.content))
+
+    async def on_response(response: httpx.Response):
+        await response.aread()
+        elapsed = time.perf_counter() - response.request.extensions.get("started_at", time.perf_counter())
+        operation, collection = backend_labels(response.request.url.path)
+        BACKEND_DURATION.labels(backend, operation, collection, str(response.status_code)).observe(elapsed)
+        BACKEND_BYTES.labels(backend, "received").inc(len(response.content))
+        add_timing(backend, elapsed)
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+class ToolMetricsMiddleware(Middleware):
+    """Times every tool call; with DEBUG_TIMINGS, logs where the time went."""
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next):
+        tool = context.message.name
+        token = request_timings.set({}) if DEBUG_TIMINGS else None
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            result = await call_next(context)
+            # Tools report most failures as {"success": false, ...} rather than raising
+            structured = getattr(result, "structured_content", None)
+            if isinstance(structured, dict) and structured.get("success") is False:
+                status = "error"
+            return result
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            TOOL_DURATION.labels(tool, status).observe(elapsed)
+            if token is not None:
+                stages = " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in request_timings.get().items())
+                logger.info(f"timing tool={tool} status={status} total={elapsed * 1000:.1f}ms {stages}")
+                request_timings.reset(token)
+
+
+mcp.add_middleware(ToolMetricsMiddleware())
+
+
+async def rest_metrics(request):
+    """GET /metrics - Prometheus exposition."""
+    from starlette.responses import Response
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+class BackendClients:
+    """Shared, long-lived HTTP clients for Qdrant and Ollama.
+
+    Clients are created on first use (or by start() in the server lifespan)
+    and reused across tool calls so connections stay pooled and kept alive.
+    """
+
+    def __init__(self):
+        self._qdrant: Optional[httpx.AsyncClient] = None
+        self._ollama: Optional[httpx.AsyncClient] = None
+
+    @staticmethod
+    def _build(backend: str, base_url: str, timeout: float, max_connections: int,
+               max_keepalive: int, http2: bool) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            http2=http2,
+            event_hooks=backend_event_hooks(backend),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            )
+        )
+
+    @property
+    def qdrant(self) -> httpx.AsyncClient:
+        if self._qdrant is None or self._qdrant.is_closed:
+            self._qdrant = self._build(
+                "qdrant", QDRANT_URL, QDRANT_TIMEOUT, QDRANT_MAX_CONNECTIONS,
+                QDRANT_MAX_KEEPALIVE, QDRANT_HTTP2
+            )
+        return self._qdrant
+
+    @property
+    def ollama(self) -> httpx.AsyncClient:
+        if self._ollama is None or self._ollama.is_closed:
+            self._ollama = self._build(
+                "ollama", OLLAMA_URL, OLLAMA_TIMEOUT, OLLAMA_MAX_CONNECTIONS,
+                OLLAMA_MAX_KEEPALIVE, OLLAMA_HTTP2
+            )
+        return self._ollama
+
+    async def start(self):
+        """Open both connection pools."""
+        _ = self.qdrant, self.ollama
+        logger.info(
+            f"Backend pools ready: qdrant={QDRANT_URL} (max={QDRANT_MAX_CONNECTIONS}, http2={QDRANT_HTTP2}), "
+            f"ollama={OLLAMA_URL} (max={OLLAMA_MAX_CONNECTIONS}, http2={OLLAMA_HTTP2})"
+        )
+
+    async def close(self):
+        """Close both connection pools."""
+        for client in (self._qdrant, self._ollama):
+            if client is not None and not client.is_closed:
+                await client.aclose()
+        self._qdrant = None
+        self._ollama = None
+
+
+# Global backend clients
+backends = BackendClients()
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache keyed by (model, normalized text hash).
+
+    Vectors are held as float32 arrays in a bounded LRU. When a path is
+    configured, a sqlite tier persists them across restarts; it is wiped
+    whenever the configured embedding model differs from the stored one.
+    New vectors reach sqlite in batches written from a worker thread, and
+    lookups use a separate WAL reader connection that doesn't share the
+    writer's lock, so the event loop never waits on a commit.
+    """
+
+    def __init__(self, model: str, max_size: int, path: str = ""):
+        self.model = model
+        self.max_size = max_size
+        self.path = path
+        self._memory: "OrderedDict[str, array]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()  # guards the writer connection only
+        self._reader: Optional[sqlite3.Connection] = None
+        self._unwritten: dict = {}  # key -> vector bytes not yet queued for sqlite
+        self._writing: List[tuple] = []  # rows the worker thread is committing
+        self._flush_task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path:
+            self._open_db()
+
+    def _open_db(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+            row = db.execute("SELECT value FROM meta WHERE key = 'model'").fetchone()
+            if row and row[0] != self.model:
+                logger.info(f"Embedding model changed ({row[0]} -> {self.model}), clearing disk cache")
+                db.execute("DELETE FROM embeddings")
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('model', ?)", (self.model,))
+            db.commit()
+            self._reader = sqlite3.connect(self.path, check_same_thread=False)
+            self._db = db
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding disk cache disabled ({self.path}): {e}")
+            self._db = None
+            self._reader = None
+
+    def key(self, text: str) -> str:
+        normalized = " ".join(text.split())
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return f"{self.model}:{digest}"
+
+    def _remember(self, key: str, vector: array):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """Return a cached vector or None."""
+        key = self.key(text)
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return vector.tolist()
+
+        if self._reader is not None:
+            row = self._reader.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row:
+                vector = array("f")
+                vector.frombytes(row[0])
+                self._remember(key, vector)
+                self.hits += 1
+                self.disk_hits += 1
+                return vector.tolist()
+
+        self.misses += 1
+        return None
+
+    def put(self, text: str, vector: List[float]):
+        """Store a vector in memory now and in sqlite with the next batch."""
+        key = self.key(text)
+        packed = array("f", vector)
+        self._remember(key, packed)
+        if self._db is not None:
+            self._unwritten[key] = packed.tobytes()
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        while self._unwritten:
+            self._writing = list(self._unwritten.items())
+            self._unwritten = {}
+            await asyncio.to_thread(self._write, self._writing)
+            self._writing = []
+
+    def _write(self, rows: List[tuple]):
+        with self._db_lock:
+            if self._db is None or not rows:
+                return
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding disk cache write of {len(rows)} vectors failed: {e}")
+            rows.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        disk_entries = 0
+        if self._reader is not None:
+            disk_entries = self._reader.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "model": self.model,
+            "memory_entries": len(self._memory),
+            "memory_max": self.max_size,
+            "disk_enabled": self._db is not None,
+            "disk_entries": disk_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    def close(self):
+        if self._db is not None:
+            # Whatever the worker thread hasn't committed yet
+            self._write(self._writing + list(self._unwritten.items()))
+            self._unwritten = {}
+            with self._db_lock:
+                self._db.close()
+                self._db = None
+            self._reader.close()
+            self._reader = None
+
+
+# Global embedding cache
+embedding_cache = EmbeddingCache(EMBEDDING_MODEL, EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_PATH)
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embedding requests into batched Ollama calls.
+
+    Requests arriving within the batch window (or until max_batch texts are
+    queued) are sent as a single /api/embed call with an input list, and the
+    resulting vectors are fanned back out to the waiting callers. Identical
+    texts already in flight share one slot. Falls back to per-prompt
+    /api/embeddings on Ollama versions without /api/embed.
+    """
+
+    def __init__(self, max_batch: int, window_ms: float):
+        self.max_batch = max(1, max_batch)
+        self.window = max(0.0, window_ms) / 1000.0
+        self._pending: List[tuple] = []
+        self._inflight: dict = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self._batch_api = True
+        self.batches = 0
+        self.inputs = 0
+
+    async def embed(self, text: str) -> List[float]:
+        """Queue a text and wait for its vector."""
+        future = self._inflight.get(text)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._inflight[text] = future
+            future.add_done_callback(lambda _: self._inflight.pop(text, None))
+            self._pending.append((text, future))
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._flush)
+        # Shielded so one cancelled caller doesn't fail others waiting on the same text
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: List[tuple]):
+        texts = [text for text, _ in batch]
+        try:
+            vectors = await self._request(texts)
+            if len(vectors) != len(texts):
+                raise RuntimeError(f"Ollama returned {len(vectors)} embeddings for {len(texts)} inputs")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.inputs += len(texts)
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    async def _request(self, texts: List[str]) -> List[List[float]]:
+        if self._batch_api:
+            response = await backends.ollama.post(
+                "/api/embed",
+                json={"model": EMBEDDING_MODEL, "input": texts}
+            )
+            EMBEDDING_REQUESTS.labels("embed").inc()
+            if response.status_code != 404:
+                response.raise_for_status()
+                EMBEDDING_INPUTS.inc(len(texts))
+                return response.json()["embeddings"]
+            logger.warning("Ollama has no /api/embed, falling back to /api/embeddings")
+            self._batch_api = False
+
+        vectors = []
+        for text in texts:
+            response = await backends.ollama.post(
+                "/api/embeddings",
+                json={"model": EMBEDDING_MODEL, "prompt": text}
+            )
+            EMBEDDING_REQUESTS.labels("embeddings").inc()
+            response.raise_for_status()
+            EMBEDDING_INPUTS.inc()
+            vectors.append(response.json()["embedding"])
+        return vectors
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "inputs": self.inputs,
+            "avg_batch_size": round(self.inputs / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "window_ms": self.window * 1000.0,
+            "batch_api": self._batch_api
+        }
+
+
+# Global embedding batcher
+embedding_batcher = EmbeddingBatcher(EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_WINDOW_MS)
+
+
 async def get_embedding(text: str) -> List[float]:
     """Get embedding vector from Ollama (nomic-embed-text, 768 dimensions)."""
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(
-            f"{OLLAMA_URL}/api/embeddings",
-            json={"model": EMBEDDING_MODEL, "prompt": text}
-        )
-        response.raise_for_status()
-        return response.json()["embedding"]
+    with timed("embedding"):
+        cached = embedding_cache.get(text)
+        if cached is not None:
+            EMBEDDING_CACHE_LOOKUPS.labels("hit").inc()
+            return cached
+
+        EMBEDDING_CACHE_LOOKUPS.labels("miss").inc()
+        vector = await embedding_batcher.embed(text)
+        embedding_cache.put(text, vector)
+        return vector
+
+
+async def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """Get embedding vectors for several texts, batching the cache misses."""
+    return list(await asyncio.gather(*(get_embedding(text) for text in texts)))
+
+
+class SearchResultCache:
+    """
+    TTL + LRU cache of Qdrant search results.
+
+    Keyed by (collection, query vector hash, filter, limit). Each collection
+    has a generation that is bumped on every upsert, delete or payload write
+    made through this server, which drops that collection's entries.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (stored_at, generation, results)
+        self._generations: dict = {}
+        self._hits: dict = {}
+        self._misses: dict = {}
+
+    @staticmethod
+    def key(
+        collection: str,
+        vector: List[float],
+        limit: int,
+        filter_conditions: Optional[dict],
+        with_payload: Union[bool, List[str]] = True
+    ) -> tuple:
+        vector_hash = hashlib.sha1(array("f", vector).tobytes()).hexdigest()
+        filter_key = json.dumps(filter_conditions, sort_keys=True) if filter_conditions else ""
+        payload_key = with_payload if isinstance(with_payload, bool) else ",".join(with_payload)
+        return (collection, vector_hash, filter_key, limit, payload_key)
+
+    def get(self, key: tuple) -> Optional[List[dict]]:
+        collection = key[0]
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, generation, results = entry
+            if generation == self._generations.get(collection, 0) and time.monotonic() - stored_at < self.ttl:
+                self._entries.move_to_end(key)
+                self._hits[collection] = self._hits.get(collection, 0) + 1
+                return results
+            del self._entries[key]
+        self._misses[collection] = self._misses.get(collection, 0) + 1
+        return None
+
+    def put(self, key: tuple, results: List[dict]):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic(), self._generations.get(key[0], 0), results)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, collection: str):
+        self._generations[collection] = self._generations.get(collection, 0) + 1
+        for key in [k for k in self._entries if k[0] == collection]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        collections = {}
+        for collection in set(self._hits) | set(self._misses) | set(self._generations):
+            hits = self._hits.get(collection, 0)
+            misses = self._misses.get(collection, 0)
+            collections[collection] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                "generation": self._generations.get(collection, 0),
+                "entries": sum(1 for k in self._entries if k[0] == collection)
+            }
+        return {"entries": len(self._entries), "max_size": self.max_size, "ttl": self.ttl, "collections": collections}
+
+
+# Global search result cache
+search_cache = SearchResultCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+
+def invalidate_collection_caches(collection: str, point_ids: Optional[List] = None):
+    """Drop everything cached for a collection after a write (point_ids None: unknown)."""
+    search_cache.invalidate(collection)
+    payload_aggregates.invalidate(collection)
+    collection_migrator.note_write(collection, point_ids)
+
+
+class LocalVectorIndex:
+    """In-process mirror of one collection: a normalized float32 matrix plus payloads.
+
+    Searches are a single matmul with argpartition top-k, scored like
+    Qdrant's Cosine distance. Writes made through this server are applied
+    as they happen; a periodic full reload picks up everything else. Writes
+    arriving while a reload is in flight are replayed onto the new snapshot.
+    """
+
+    def __init__(self, collection: str):
+        self.collection = collection
+        self.ready = False
+        self.loaded_at: Optional[str] = None
+        self._ids: List[str] = []
+        self._payloads: List[dict] = []
+        self._rows: dict = {}  # point id -> row
+        self._matrix = None
+        self._replay: Optional[List[tuple]] = None
+        self.searches = 0
+        self.fallbacks = 0
+
+    async def reload(self):
+        self._replay = []
+        try:
+            ids, payloads, vectors = [], [], []
+            async for point in qdrant_scroll_iter(self.collection, with_vector=True):
+                ids.append(str(point["id"]))
+                payloads.append(point.get("payload", {}))
+                vectors.append(point["vector"])
+            self._ids = ids
+            self._payloads = payloads
+            self._rows = {point_id: row for row, point_id in enumerate(ids)}
+            matrix = np.asarray(vectors, dtype=np.float32) if vectors else np.zeros((0, VECTOR_SIZE), dtype=np.float32)
+            self._matrix = self._normalize(matrix)
+            self.ready = True
+            replay, self._replay = self._replay, None
+            for op, args in replay:
+                getattr(self, op)(*args)
+            self.loaded_at = datetime.now(timezone.utc).isoformat()
+        finally:
+            self._replay = None
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+    def search(self, vector: List[float], limit: int, filter_conditions: Optional[dict]) -> Optional[List[dict]]:
+        """Qdrant-shaped search hits, or None if the filter can't be evaluated locally."""
+        if not self.ready:
+            return None
+        mask = self._filter_mask(filter_conditions)
+        if mask is False:
+            self.fallbacks += 1
+            return None
+        self.searches += 1
+        if not self._ids:
+            return []
+
+        query = self._normalize(np.asarray(vector, dtype=np.float32))
+        scores = self._matrix @ query
+        candidates = np.arange(len(self._ids)) if mask is None else np.flatnonzero(mask)
+        if limit <= 0 or candidates.size == 0:
+            return []
+        if candidates.size > limit:
+            top = np.argpartition(-scores[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [
+            {"id": self._ids[row], "score": float(scores[row]), "payload": dict(self._payloads[row])}
+            for row in ordered
+        ]
+
+    def _filter_mask(self, filter_conditions: Optional[dict]):
+        """Boolean row mask for a must-of-match-value filter; None for no filter, False if unsupported."""
+        if not filter_conditions:
+            return None
+        if set(filter_conditions) != {"must"}:
+            return False
+        mask = np.ones(len(self._ids), dtype=bool)
+        for condition in filter_conditions["must"]:
+            if set(condition) != {"key", "match"} or set(condition["match"]) != {"value"}:
+                return False
+            key, value = condition["key"], condition["match"]["value"]
+            mask &= np.fromiter((p.get(key) == value for p in self._payloads), dtype=bool, count=len(self._ids))
+        return mask
+
+    def stale(self):
+        """Reload soon: a write changed points this mirror can't identify."""
+        if self.ready:
+            local_indexes.schedule_reload(self.collection)
+
+    def _record(self, op: str, *args) -> bool:
+        if self._replay is not None:
+            self._replay.append((op, args))
+        return self.ready
+
+    def upsert(self, points: List[dict]):
+        if not self._record("upsert", points):
+            return
+        for point in points:
+            point_id = str(point["id"])
+            vector = self._normalize(np.asarray(point["vector"], dtype=np.float32).reshape(1, -1))
+            row = self._rows.get(point_id)
+            if row is None:
+                self._rows[point_id] = len(self._ids)
+                self._ids.append(point_id)
+                self._payloads.append(dict(point.get("payload", {})))
+                self._matrix = np.vstack([self._matrix, vector]) if len(self._matrix) else vector
+            else:
+                self._payloads[row] = dict(point.get("payload", {}))
+                self._matrix[row] = vector[0]
+
+    def set_payload(self, point_ids: List, payload: dict):
+        if not self._record("set_payload", point_ids, payload):
+            return
+        for point_id in point_ids:
+            row = self._rows.get(str(point_id))
+            if row is not None:
+                self._payloads[row] = {**self._payloads[row], **payload}
+
+    def delete(self, point_ids: List):
+        if not self._record("delete", point_ids):
+            return
+        rows = {self._rows[str(p)] for p in point_ids if str(p) in self._rows}
+        if not rows:
+            return
+        keep = [row for row in range(len(self._ids)) if row not in rows]
+        self._ids = [self._ids[row] for row in keep]
+        self._payloads = [self._payloads[row] for row in keep]
+        self._matrix = np.ascontiguousarray(self._matrix[keep])
+        self._rows = {point_id: row for row, point_id in enumerate(self._ids)}
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "points": len(self._ids),
+            "loaded_at": self.loaded_at,
+            "searches": self.searches,
+            "fallbacks": self.fallbacks,
+            "bytes": int(self._matrix.nbytes) if self._matrix is not None else 0
+        }
+
+
+class LocalIndexes:
+    """The LocalVectorIndex per configured collection and their reload loop."""
+
+    def __init__(self, collections: List[str], reload_interval: float):
+        self.enabled = bool(collections) and np is not None
+        self.reload_interval = reload_interval
+        self._indexes = {c: LocalVectorIndex(c) for c in collections} if self.enabled else {}
+        self._task: Optional[asyncio.Task] = None
+        self._pending: set = set()
+        if collections and np is None:
+            logger.warning("LOCAL_INDEX_COLLECTIONS set but numpy is not installed; searching Qdrant only")
+
+    def get(self, collection: str) -> Optional[LocalVectorIndex]:
+        return self._indexes.get(collection)
+
+    async def reload(self, collection: str):
+        try:
+            await self._indexes[collection].reload()
+        except Exception as e:
+            logger.warning(f"Local index reload for {collection} failed: {e}")
+
+    def schedule_reload(self, collection: str):
+        task = asyncio.ensure_future(self.reload(collection))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def start(self):
+        if not self.enabled:
+            return
+        for collection in self._indexes:
+            await self.reload(collection)
+        self._task = asyncio.ensure_future(self._reload_loop())
+
+    async def _reload_loop(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            for collection in self._indexes:
+                await self.reload(collection)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "reload_interval": self.reload_interval,
+            "collections": {c: index.stats() for c, index in self._indexes.items()}
+        }
+
+
+# Global in-process vector mirrors
+local_indexes = LocalIndexes(LOCAL_INDEX_COLLECTIONS, LOCAL_INDEX_RELOAD_INTERVAL)
 
 
 async def qdrant_search(
     collection: str,
     vector: List[float],
     limit: int = 5,
-    filter_conditions: dict = None
+    filter_conditions: dict = None,
+    with_payload: Union[bool, List[str]] = True
 ) -> List[dict]:
-    """Search Qdrant collection."""
-    async with httpx.AsyncClient(timeout=30.0) as client:
+    """Search Qdrant collection (local mirror if configured, else cached until the collection changes).
+
+    with_payload may list the payload fields to return instead of all of them.
+    """
+    local = local_indexes.get(collection)
+    if local is not None:
+        results = local.search(vector, limit, filter_conditions)
+        if results is not None:
+            if isinstance(with_payload, list):
+                results = [
+                    {**hit, "payload": {k: v for k, v in hit.get("payload", {}).items() if k in with_payload}}
+                    for hit in results
+                ]
+            return results
+
+    cache_key = search_cache.key(collection, vector, limit, filter_conditions, with_payload)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+
+    payload = {
+        "vector": vector,
+        "limit": limit,
+        "with_payload": with_payload
+    }
+    if filter_conditions:
+        payload["filter"] = filter_conditions
+    if collection in QUANTIZED_COLLECTIONS and QUANTIZATION != "none":
+        # Rank on the quantized vectors, then rescore the top candidates with the originals
+        payload["params"] = {"quantization": {"rescore": True, "oversampling": SEARCH_OVERSAMPLING}}
+
+    response = await backends.qdrant.post(
+        f"/collections/{collection}/points/search",
+        json=payload
+    )
+    response.raise_for_status()
+    results = response.json().get("result", [])
+    search_cache.put(cache_key, results)
+    return list(results)
+
+
+async def qdrant_upsert(collection: str, points: List[dict], wait: Optional[bool] = None) -> bool:
+    """Upsert points to Qdrant collection (wait=False returns once the write is acknowledged)."""
+    params = {"wait": str(wait).lower()} if wait is not None else None
+    async with collection_migrator.writing(collection):
+        response = await backends.qdrant.put(
+            f"/collections/{collection}/points",
+            params=params,
+            json={"points": points}
+        )
+        invalidate_collection_caches(collection, [point["id"] for point in points])
+    local = local_indexes.get(collection)
+    if local is not None and response.status_code == 200:
+        local.upsert(points)
+    return response.status_code == 200
+
+
+def match_condition(key: str, value) -> dict:
+    """Qdrant filter condition: payload field equals value."""
+    return {"key": key, "match": {"value": value}}
+
+
+def match_any_condition(key: str, values: List) -> dict:
+    """Qdrant filter condition: payload field equals any of the values."""
+    return {"key": key, "match": {"any": list(values)}}
+
+
+def range_condition(key: str, gte=None, gt=None, lte=None, lt=None) -> dict:
+    """Qdrant filter condition: numeric or datetime (RFC 3339) payload field within a range."""
+    bounds = {"gte": gte, "gt": gt, "lte": lte, "lt": lt}
+    return {"key": key, "range": {op: v for op, v in bounds.items() if v is not None}}
+
+
+def must_filter(*conditions: Optional[dict]) -> Optional[dict]:
+    """Combine conditions into a must filter, skipping None; None if empty."""
+    must = [c for c in conditions if c]
+    return {"must": must} if must else None
+
+
+async def qdrant_scroll_iter(
+    collection: str,
+    filter_conditions: dict = None,
+    with_payload=True,
+    limit: Optional[int] = None,
+    page_size: int = SCROLL_PAGE_SIZE,
+    with_vector: bool = False
+) -> AsyncIterator[dict]:
+    """
+    Stream points matching a filter page by page, following next_page_offset.
+
+    Args:
+        collection: Collection name
+        filter_conditions: Qdrant filter, evaluated server-side
+        with_payload: True, False, or a list of payload fields to project
+        limit: Stop after this many points (default: all)
+        page_size: Points requested per page
+        with_vector: Include stored vectors (for copying points)
+    """
+    offset = None
+    remaining = limit
+    while remaining is None or remaining > 0:
         payload = {
-            "vector": vector,
-            "limit": limit,
-            "with_payload": True
+            "limit": page_size if remaining is None else min(page_size, remaining),
+            "with_payload": with_payload,
+            "with_vector": with_vector
         }
         if filter_conditions:
             payload["filter"] = filter_conditions
+        if offset is not None:
+            payload["offset"] = offset
 
-        response = await client.post(
-            f"{QDRANT_URL}/collections/{collection}/points/search",
+        response = await backends.qdrant.post(
+            f"/collections/{collection}/points/scroll",
             json=payload
         )
         response.raise_for_status()
-        return response.json().get("result", [])
+        result = response.json().get("result", {})
+        points = result.get("points", [])
+        for point in points:
+            yield point
+        if remaining is not None:
+            remaining -= len(points)
 
-
-async def qdrant_upsert(collection: str, points: List[dict]) -> bool:
-    """Upsert points to Qdrant collection."""
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.put(
-            f"{QDRANT_URL}/collections/{collection}/points",
-            json={"points": points}
-        )
-        return response.status_code == 200
+        offset = result.get("next_page_offset")
+        if offset is None:
+            return
 
 
 async def qdrant_scroll(
     collection: str,
     filter_conditions: dict = None,
-    limit: int = 100
+    limit: int = 100,
+    with_payload=True
 ) -> List[dict]:
-    """Scroll through Qdrant collection with optional filter."""
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        payload = {
-            "limit": limit,
-            "with_payload": True,
-            "with_vector": False
-        }
-        if filter_conditions:
-            payload["filter"] = filter_conditions
+    """Scroll through Qdrant collection with optional filter, up to limit points."""
+    return [point async for point in qdrant_scroll_iter(collection, filter_conditions, with_payload, limit=limit)]
 
-        response = await client.post(
-            f"{QDRANT_URL}/collections/{collection}/points/scroll",
-            json=payload
-        )
+
+async def qdrant_filter_batch(collection: str, filters: List[dict], limit: int = 1) -> List[List[dict]]:
+    """
+    First points matching each filter, in one request.
+
+    Uses the query API's batch endpoint with filter-only queries (Qdrant
+    1.10+); older servers get one scroll per filter instead.
+    """
+    response = await backends.qdrant.post(
+        f"/collections/{collection}/points/query/batch",
+        json={"searches": [{"filter": f, "limit": limit, "with_payload": True} for f in filters]}
+    )
+    if response.status_code != 404:
+        response.raise_for_status()
+        return [batch.get("points", []) for batch in response.json().get("result", [])]
+    return list(await asyncio.gather(*(qdrant_scroll(collection, f, limit=limit) for f in filters)))
+
+
+async def qdrant_scroll_latest(
+    collection: str,
+    order_key: str,
+    filter_conditions: dict = None,
+    limit: int = 50
+) -> List[dict]:
+    """
+    Newest points first by a datetime payload field.
+
+    Uses Qdrant's order_by scroll, which needs a range-capable (datetime)
+    index on order_key. Without one, falls back to streaming every matching
+    point through a bounded heap so the result is still the true newest N.
+    """
+    payload = {
+        "limit": limit,
+        "with_payload": True,
+        "with_vector": False,
+        "order_by": {"key": order_key, "direction": "desc"}
+    }
+    if filter_conditions:
+        payload["filter"] = filter_conditions
+
+    response = await backends.qdrant.post(
+        f"/collections/{collection}/points/scroll",
+        json=payload
+    )
+    if response.status_code != 400:
         response.raise_for_status()
         return response.json().get("result", {}).get("points", [])
 
+    logger.warning(f"order_by {collection}.{order_key} rejected ({response.text}), sorting client-side")
+    heap = []
+    async for point in qdrant_scroll_iter(collection, filter_conditions):
+        item = (point.get("payload", {}).get(order_key) or "", str(point.get("id", "")), point)
+        if len(heap) < limit:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+    return [item[2] for item in sorted(heap, key=lambda item: item[:2], reverse=True)]
+
+
+async def qdrant_create_payload_index(collection: str, field: str, schema) -> bool:
+    """Create a payload index on a field (Qdrant treats an existing index as success)."""
+    response = await backends.qdrant.put(
+        f"/collections/{collection}/index",
+        json={"field_name": field, "field_schema": schema}
+    )
+    return response.status_code == 200
+
+
+async def qdrant_count(collection: str, filter_conditions: dict = None) -> int:
+    """Exact number of points matching a filter."""
+    payload = {"exact": True}
+    if filter_conditions:
+        payload["filter"] = filter_conditions
+
+    response = await backends.qdrant.post(
+        f"/collections/{collection}/points/count",
+        json=payload
+    )
+    response.raise_for_status()
+    return response.json().get("result", {}).get("count", 0)
+
 
 async def qdrant_get_by_id(collection: str, point_id: str) -> Optional[dict]:
     """Get a single point by ID."""
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.get(
-            f"{QDRANT_URL}/collections/{collection}/points/{point_id}"
-        )
-        if response.status_code == 200:
-            return response.json().get("result")
-        return None
+    response = await backends.qdrant.get(
+        f"/collections/{collection}/points/{point_id}"
+    )
+    if response.status_code == 200:
+        return response.json().get("result")
+    return None
 
 
 async def qdrant_delete_points(collection: str, point_ids: List[str]) -> bool:
     """Delete points by IDs from a Qdrant collection."""
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(
-            f"{QDRANT_URL}/collections/{collection}/points/delete",
+    async with collection_migrator.writing(collection):
+        response = await backends.qdrant.post(
+            f"/collections/{collection}/points/delete",
             json={"points": point_ids}
         )
-        return response.status_code == 200
+        invalidate_collection_caches(collection, point_ids)
+    local = local_indexes.get(collection)
+    if local is not None and response.status_code == 200:
+        local.delete(point_ids)
+    return response.status_code == 200
+
+
+async def qdrant_delete_by_filter(collection: str, filter_conditions: dict) -> bool:
+    """Delete every point matching a filter."""
+    async with collection_migrator.writing(collection):
+        response = await backends.qdrant.post(
+            f"/collections/{collection}/points/delete",
+            params={"wait": "true"},
+            json={"filter": filter_conditions}
+        )
+        invalidate_collection_caches(collection)
+    local = local_indexes.get(collection)
+    if local is not None and response.status_code == 200:
+        local.stale()
+    return response.status_code == 200
+
+
+async def qdrant_set_payload(collection: str, point_ids: List[str], payload: dict) -> bool:
+    """Merge payload fields into existing points without touching their vectors."""
+    async with collection_migrator.writing(collection):
+        response = await backends.qdrant.post(
+            f"/collections/{collection}/points/payload",
+            json={"payload": payload, "points": point_ids}
+        )
+        invalidate_collection_caches(collection, point_ids)
+    local = local_indexes.get(collection)
+    if local is not None and response.status_code == 200:
+        local.set_payload(point_ids, payload)
+    return response.status_code == 200
+
+
+async def qdrant_set_payload_by_filter(collection: str, filter_conditions: dict, payload: dict) -> bool:
+    """Merge payload fields into every point matching a filter."""
+    async with collection_migrator.writing(collection):
+        response = await backends.qdrant.post(
+            f"/collections/{collection}/points/payload",
+            params={"wait": "true"},
+            json={"payload": payload, "filter": filter_conditions}
+        )
+        invalidate_collection_caches(collection)
+    local = local_indexes.get(collection)
+    if local is not None and response.status_code == 200:
+        local.stale()
+    return response.status_code == 200
+
+
+async def qdrant_batch_update(collection: str, operations: List[dict]) -> bool:
+    """
+    Apply several point operations in one request, in order.
+
+    Operations use Qdrant's /points/batch shapes, e.g.
+    {"set_payload": {"payload": {...}, "filter": {...}}} or
+    {"delete": {"filter": {...}}}. Affected ids aren't known up front, so
+    caches for the whole collection are dropped.
+    """
+    async with collection_migrator.writing(collection):
+        response = await backends.qdrant.post(
+            f"/collections/{collection}/points/batch",
+            params={"wait": "true"},
+            json={"operations": operations}
+        )
+        invalidate_collection_caches(collection)
+    local = local_indexes.get(collection)
+    if local is not None and response.status_code == 200:
+        local.stale()
+    return response.status_code == 200
+
+
+def payload_filter(where: dict) -> Optional[dict]:
+    """Must filter from {field: value} equality pairs; a list value matches any of its items."""
+    return must_filter(*[
+        match_any_condition(field, value) if isinstance(value, (list, tuple)) else match_condition(field, value)
+        for field, value in (where or {}).items()
+    ])
+
+
+class PayloadAggregator:
+    """
+    Grouped point counts per payload field.
+
+    Uses Qdrant's facet API (exact, needs a keyword index) plus the count API
+    for points missing the field. Falls back to paging through every point
+    with only that field projected. Results are cached until the next write
+    to the collection through this server, or AGGREGATE_CACHE_TTL seconds for
+    writes made by other services.
+    """
+
+    def __init__(self, ttl: float, facet_limit: int):
+        self.ttl = ttl
+        self.facet_limit = facet_limit
+        self._cache: dict = {}  # (collection, field) -> (computed_at, counts)
+        self._facet_api = True
+
+    def invalidate(self, collection: str):
+        for key in [k for k in self._cache if k[0] == collection]:
+            del self._cache[key]
+
+    async def counts(self, collection: str, field: str, missing: str = "unknown") -> dict:
+        """Map of field value -> number of points, missing values counted under `missing`."""
+        key = (collection, field)
+        cached = self._cache.get(key)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+
+        counts = None
+        if self._facet_api:
+            counts = await self._facet_counts(collection, field, missing)
+        if counts is None:
+            counts = await self._scroll_counts(collection, field, missing)
+
+        self._cache[key] = (time.monotonic(), counts)
+        return counts
+
+    async def _facet_counts(self, collection: str, field: str, missing: str) -> Optional[dict]:
+        response = await backends.qdrant.post(
+            f"/collections/{collection}/facet",
+            json={"key": field, "limit": self.facet_limit, "exact": True}
+        )
+        if response.status_code == 404:
+            logger.info("Qdrant has no facet API, aggregating by scroll")
+            self._facet_api = False
+            return None
+        if response.status_code != 200:
+            # Typically no keyword index on this field
+            logger.debug(f"Facet on {collection}.{field} unavailable: {response.text}")
+            return None
+
+        hits = response.json().get("result", {}).get("hits", [])
+        if len(hits) >= self.facet_limit:
+            return None  # Possibly truncated
+
+        counts = {str(hit["value"]): hit["count"] for hit in hits}
+        without_field = await qdrant_count(collection) - sum(counts.values())
+        if without_field > 0:
+            counts[missing] = counts.get(missing, 0) + without_field
+        return counts
+
+    async def _scroll_counts(self, collection: str, field: str, missing: str) -> dict:
+        counts = {}
+        async for point in qdrant_scroll_iter(collection, with_payload=[field]):
+            value = point.get("payload", {}).get(field, missing)
+            counts[value] = counts.get(value, 0) + 1
+        return counts
+
+
+# Global payload aggregator
+payload_aggregates = PayloadAggregator(AGGREGATE_CACHE_TTL, AGGREGATE_FACET_LIMIT)
+
+
+def text_hash(text: str) -> str:
+    """Hash of the text a point's vector was embedded from."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def runbook_embedding_text(payload: dict) -> str:
+    """Text that feeds a runbook's vector."""
+    return f"{payload.get('title', '')}\n{payload.get('trigger_pattern', '')}\n{payload.get('solution', '')}"
+
+
+def decision_embedding_text(payload: dict) -> str:
+    """Text that feeds a decision's vector."""
+    text = f"{payload.get('title', '')}\n{payload.get('description', '')}\n{payload.get('decision_type', '')}"
+    if payload.get("outcome"):
+        text += f"\n{payload['outcome']}"
+    return text
+
+
+def documentation_embedding_text(payload: dict) -> str:
+    """Text that feeds a documentation page's vector (title plus the start of the content)."""
+    return f"{payload.get('title', '')}\n\n{payload.get('content', '')[:2000]}"
+
+
+def section_embedding_text(payload: dict) -> str:
+    """Text that feeds a document section's vector (document title, heading path, section text)."""
+    return f"{payload.get('title', '')} > {payload.get('heading', '')}\n\n{payload.get('content', '')}"
+
+
+def event_embedding_text(payload: dict) -> str:
+    """Text that feeds an agent event's vector."""
+    text = f"{payload.get('event_type', '')}: {payload.get('description', '')}"
+    if payload.get("resolution"):
+        text += f" - {payload['resolution']}"
+    if payload.get("feedback"):
+        text += f" (feedback: {payload['feedback']})"
+    return text
+
+
+# Payload fields entity_embedding_text reads
+ENTITY_EMBEDDING_FIELDS = {"manufacturer", "model", "type", "location", "function", "network", "ip"}
+
+
+def entity_embedding_text(payload: dict) -> str:
+    """Text that feeds a network entity's vector."""
+    parts = [payload.get("manufacturer"), payload.get("model"), payload.get("type")]
+    if payload.get("location"):
+        parts.append(f"in {payload['location']}")
+    if payload.get("function"):
+        parts.append(payload["function"])
+    if payload.get("network"):
+        parts.append(f"on {payload['network']} network")
+    if payload.get("ip"):
+        parts.append(f"at {payload['ip']}")
+    return " ".join(filter(None, parts))
+
+
+# Embedding text per collection, for re-embedding stored payloads
+EMBEDDING_TEXTS = {
+    "runbooks": runbook_embedding_text,
+    "decisions": decision_embedding_text,
+    "documentation": documentation_embedding_text,
+    "document_sections": section_embedding_text,
+    "agent_events": event_embedding_text,
+    "entities": entity_embedding_text
+}
+
+
+async def qdrant_patch_point(
+    collection: str,
+    point_id: str,
+    payload: dict,
+    changes: dict,
+    embedding_text: Callable[[dict], str]
+) -> bool:
+    """
+    Apply payload changes to a point, re-embedding only if its vector text changed.
+
+    The hash of the text a vector was built from is kept in the payload as
+    text_hash. When the changes leave that text alone (counters, status,
+    timestamps), only the changed fields are sent via the set-payload API.
+
+    Args:
+        collection: Collection name
+        point_id: ID of the point being updated
+        payload: Current payload of the point (updated in place)
+        changes: Fields to set
+        embedding_text: Builds the vector text from a payload
+    """
+    current_hash = payload.get("text_hash") or text_hash(embedding_text(payload))
+    payload.update(changes)
+    text = embedding_text(payload)
+    new_hash = text_hash(text)
+
+    if new_hash == current_hash:
+        return await qdrant_set_payload(collection, [point_id], {**changes, "text_hash": new_hash})
+
+    payload["text_hash"] = new_hash
+    vector = await get_embedding(text)
+    return await qdrant_upsert(collection, [{"id": point_id, "vector": vector, "payload": payload}])
+
+
+async def qdrant_reembed_points(
+    collection: str,
+    point_ids: List[str],
+    embedding_text: Callable[[dict], str]
+) -> int:
+    """
+    Re-embed points whose vector text no longer matches their text_hash.
+
+    For writes that change payloads without knowing the points up front
+    (filter-based set_payload). Returns the number of points re-embedded.
+    """
+    reembedded = 0
+    for start in range(0, len(point_ids), BULK_UPSERT_CHUNK):
+        response = await backends.qdrant.post(
+            f"/collections/{collection}/points",
+            json={"ids": point_ids[start:start + BULK_UPSERT_CHUNK], "with_payload": True}
+        )
+        response.raise_for_status()
+        points = []
+        texts = []
+        for point in response.json().get("result", []):
+            payload = point.get("payload", {})
+            text = embedding_text(payload)
+            if payload.get("text_hash") == text_hash(text):
+                continue
+            payload["text_hash"] = text_hash(text)
+            points.append({"id": point["id"], "payload": payload})
+            texts.append(text)
+        if not points:
+            continue
+        for point, vector in zip(points, await get_embeddings(texts)):
+            point["vector"] = vector
+        if not await qdrant_upsert(collection, points, wait=True):
+            raise RuntimeError(f"Re-embedding {len(points)} points in {collection} was rejected")
+        reembedded += len(points)
+    return reembedded
 
 
 def payload_to_entity(point: dict) -> EntityResult:
     """Convert Qdrant point to EntityResult."""
-    payload = point.get("payload", {})
-    return EntityResult(
-        id=str(point.get("id", "")),
-        score=point.get("score", 0.0),
-        ip=payload.get("ip", ""),
-        mac=payload.get("mac", ""),
-        hostname=payload.get("hostname", ""),
-        category=payload.get("category", ""),
-        type=payload.get("type", ""),
-        manufacturer=payload.get("manufacturer", ""),
-        model=payload.get("model", ""),
-        location=payload.get("location", ""),
-        function=payload.get("function", ""),
-        network=payload.get("network", ""),
-        status=payload.get("status", "unknown"),
-        interfaces=payload.get("interfaces", []),
-        capabilities=payload.get("capabilities", []),
-        discovered_via=payload.get("discovered_via", []),
-        last_seen=payload.get("last_seen", "")
-    )
+    with timed("convert"):
+        payload = point.get("payload", {})
+        return EntityResult(
+            id=str(point.get("id", "")),
+            score=point.get("score", 0.0),
+            ip=payload.get("ip", ""),
+            mac=payload.get("mac", ""),
+            hostname=payload.get("hostname", ""),
+            category=payload.get("category", ""),
+            type=payload.get("type", ""),
+            manufacturer=payload.get("manufacturer", ""),
+            model=payload.get("model", ""),
+            location=payload.get("location", ""),
+            function=payload.get("function", ""),
+            network=payload.get("network", ""),
+            status=payload.get("status", "unknown"),
+            interfaces=payload.get("interfaces", []),
+            capabilities=payload.get("capabilities", []),
+            discovered_via=payload.get("discovered_via", []),
+            last_seen=payload.get("last_seen", "")
+        )
 
 
 def payload_to_device_type(point: dict) -> DeviceTypeInfo:
     """Convert Qdrant point to DeviceTypeInfo."""
-    payload = point.get("payload", {})
-    return DeviceTypeInfo(
-        id=str(point.get("id", "")),
-        name=payload.get("name", ""),
-        description=payload.get("description", ""),
-        category=payload.get("category", ""),
-        manufacturers=payload.get("manufacturers", []),
-        protocols=payload.get("protocols", []),
-        discovery_methods=payload.get("discovery_methods", []),
-        control_api=payload.get("control_api", {}),
-        default_credentials_path=payload.get("default_credentials_path", "")
-    )
+    with timed("convert"):
+        payload = point.get("payload", {})
+        return DeviceTypeInfo(
+            id=str(point.get("id", "")),
+            name=payload.get("name", ""),
+            description=payload.get("description", ""),
+            category=payload.get("category", ""),
+            manufacturers=payload.get("manufacturers", []),
+            protocols=payload.get("protocols", []),
+            discovery_methods=payload.get("discovery_methods", []),
+            control_api=payload.get("control_api", {}),
+            default_credentials_path=payload.get("default_credentials_path", "")
+        )
 
 
 @mcp.resource("health://status")
@@ -224,6 +1534,151 @@ def health_check() -> str:
     return "healthy"
 
 
+@mcp.resource("stats://embedding-cache")
+def embedding_cache_stats() -> str:
+    """Embedding cache hit/miss counters and tier sizes."""
+    return json.dumps(embedding_cache.stats())
+
+
+@mcp.resource("stats://embedding-batcher")
+def embedding_batcher_stats() -> str:
+    """Embedding micro-batching counters."""
+    return json.dumps(embedding_batcher.stats())
+
+
+@mcp.resource("stats://entity-index")
+def entity_index_stats() -> str:
+    """In-process entity identifier index counters."""
+    return json.dumps(entity_index.stats())
+
+
+@mcp.resource("stats://runbook-index")
+def runbook_index_stats() -> str:
+    """Runbook exact-match index size and hit counters."""
+    return json.dumps(runbook_index.stats())
+
+
+@mcp.resource("stats://runbook-stats")
+def runbook_stats_stats() -> str:
+    """Runbook execution-stat writes and how many executions each one collapsed."""
+    return json.dumps(runbook_stats.stats())
+
+
+@mcp.resource("stats://search-cache")
+def search_cache_stats() -> str:
+    """Search result cache hit ratios per collection."""
+    return json.dumps(search_cache.stats())
+
+
+@mcp.resource("stats://schema")
+def schema_stats() -> str:
+    """Last startup schema reconcile: created collections/indexes and drift."""
+    return json.dumps(schema_reconciler.stats())
+
+
+@mcp.resource("stats://local-index")
+def local_index_stats() -> str:
+    """In-process vector mirrors: size, searches served, and last reload."""
+    return json.dumps(local_indexes.stats())
+
+
+@mcp.resource("stats://event-queue")
+def event_queue_stats() -> str:
+    """Write-behind queue depth and counters for log_event/update_event."""
+    return json.dumps(event_queue.stats())
+
+
+@mcp.resource("stats://event-retention")
+def event_retention_stats() -> str:
+    """agent_events retention settings and progress of the current or last run."""
+    return json.dumps(event_retention.stats())
+
+
+@mcp.resource("stats://migrations")
+def migration_stats() -> str:
+    """Collection migrations: status and points copied/re-synced."""
+    return json.dumps(collection_migrator.stats())
+
+
+def runbook_search_result(result: dict) -> SearchResult:
+    """Convert a runbooks search hit to SearchResult."""
+    payload = result.get("payload", {})
+    return SearchResult(
+        id=str(result.get("id", "")),
+        score=result.get("score", 0),
+        title=payload.get("title", "Untitled"),
+        content=payload.get("solution", ""),
+        metadata={
+            "trigger_pattern": payload.get("trigger_pattern", ""),
+            "automation_level": payload.get("automation_level", "manual"),
+            "success_rate": payload.get("success_rate", 0)
+        }
+    )
+
+
+def decision_search_result(result: dict) -> SearchResult:
+    """Convert a decisions search hit to SearchResult."""
+    payload = result.get("payload", {})
+    return SearchResult(
+        id=str(result.get("id", "")),
+        score=result.get("score", 0),
+        title=payload.get("title", "Untitled"),
+        content=payload.get("description", ""),
+        metadata={
+            "decision_type": payload.get("decision_type", "unknown"),
+            "timestamp": payload.get("timestamp", ""),
+            "outcome": payload.get("outcome", "")
+        }
+    )
+
+
+def documentation_search_result(result: dict) -> SearchResult:
+    """Convert a documentation search hit to SearchResult."""
+    payload = result.get("payload", {})
+    return SearchResult(
+        id=str(result.get("id", "")),
+        score=result.get("score", 0),
+        title=payload.get("title", "Untitled"),
+        content=payload.get("content", ""),
+        metadata={
+            "doc_type": payload.get("doc_type", "general"),
+            "source": payload.get("source", ""),
+            "last_updated": payload.get("last_updated", "")
+        }
+    )
+
+
+# Section fields returned by search; the full text comes from get_document_section
+SECTION_SEARCH_FIELDS = ["title", "heading", "snippet", "parent_id", "collection", "path", "doc_type", "section_index"]
+
+
+def section_search_result(result: dict) -> SearchResult:
+    """Convert a document section search hit (projected payload) to SearchResult."""
+    payload = result.get("payload", {})
+    return SearchResult(
+        id=str(result.get("id", "")),
+        score=result.get("score", 0),
+        title=payload.get("title", "Untitled"),
+        content=payload.get("snippet", ""),
+        metadata={
+            "heading": payload.get("heading", ""),
+            "parent_id": payload.get("parent_id", ""),
+            "collection": payload.get("collection", ""),
+            "path": payload.get("path", ""),
+            "doc_type": payload.get("doc_type", "general"),
+            "section_index": payload.get("section_index", 0)
+        }
+    )
+
+
+# Collections search_knowledge can federate over, with their result converters
+KNOWLEDGE_COLLECTIONS = {
+    "runbooks": runbook_search_result,
+    "decisions": decision_search_result,
+    "documentation": documentation_search_result
+}
+
+
 @mcp.tool()
 async def search_runbooks(
     query: str,
@@ -245,22 +1700,8 @@ async def search_runbooks(
         vector = await get_embedding(query)
         results = await qdrant_search("runbooks", vector, limit=limit)
 
-        matches = []
-        for result in results:
-            if result.get("score", 0) >= min_score:
-                payload = result.get("payload", {})
-                matches.append(SearchResult(
-                    id=str(result.get("id", "")),
-                    score=result.get("score", 0),
-                    title=payload.get("title", "Untitled"),
-                    content=payload.get("solution", ""),
-                    metadata={
-                        "trigger_pattern": payload.get("trigger_pattern", ""),
-                        "automation_level": payload.get("automation_level", "manual"),
-                        "success_rate": payload.get("success_rate", 0)
-                    }
-                ))
-        return matches
+        with timed("convert"):
+            return [runbook_search_result(result) for result in results if result.get("score", 0) >= min_score]
     except Exception as e:
         logger.error(f"Runbook search failed: {e}")
         return []
@@ -291,72 +1732,207 @@ async def search_decisions(
                 "must": [{"key": "decision_type", "match": {"value": decision_type}}]
             }
 
-        results = await qdrant_search("decisions", vector, limit=limit, filter_conditions=filter_conditions)
+        results = await qdrant_search("decisions", vector, limit=limit, filter_conditions=filter_conditions)
+
+        with timed("convert"):
+            return [decision_search_result(result) for result in results]
+    except Exception as e:
+        logger.error(f"Decision search failed: {e}")
+        return []
+
+
+@mcp.tool()
+async def search_documentation(
+    query: str,
+    limit: int = 5,
+    doc_type: Optional[str] = None,
+    include_runbooks: bool = False,
+    whole_documents: bool = False
+) -> List[SearchResult]:
+    """
+    Search documentation for information.
+
+    Matches individual sections (split on headings at index time) and returns
+    a snippet of each; fetch a section's full text with get_document_section
+    using the result id. Falls back to whole documents if no sections are
+    indexed.
+
+    Args:
+        query: Natural language search query
+        limit: Maximum results to return (default: 5)
+        doc_type: Filter by type (architecture, guide, reference)
+        include_runbooks: Also match sections of runbooks
+        whole_documents: Return whole documents instead of sections
+
+    Returns:
+        List of matching documentation sections (content is a snippet;
+        metadata has heading, parent_id, path)
+    """
+    try:
+        vector = await get_embedding(query)
+        type_condition = match_condition("doc_type", doc_type) if doc_type else None
+
+        if not whole_documents:
+            sources = ["documentation", "runbooks"] if include_runbooks else ["documentation"]
+            try:
+                results = await qdrant_search(
+                    "document_sections", vector, limit=limit,
+                    filter_conditions=must_filter(match_any_condition("collection", sources), type_condition),
+                    with_payload=SECTION_SEARCH_FIELDS
+                )
+            except httpx.HTTPStatusError as e:
+                logger.warning(f"Section search unavailable, searching whole documents: {e}")
+                results = []
+            if results:
+                with timed("convert"):
+                    return [section_search_result(result) for result in results]
+
+        results = await qdrant_search("documentation", vector, limit=limit, filter_conditions=must_filter(type_condition))
+
+        with timed("convert"):
+            return [documentation_search_result(result) for result in results]
+    except Exception as e:
+        logger.error(f"Documentation search failed: {e}")
+        return []
+
+
+@mcp.tool()
+async def get_document_section(section_id: str, include_neighbours: bool = False) -> Optional[dict]:
+    """
+    Get the full text of a documentation section found by search_documentation.
+
+    Args:
+        section_id: Section id (the id of a search_documentation result)
+        include_neighbours: Also return the sections just before and after it
+
+    Returns:
+        Section with title, heading, content, parent_id, and path,
+        or None if not found
+    """
+    try:
+        point = await qdrant_get_by_id("document_sections", section_id)
+        if not point:
+            return None
+
+        payload = point.get("payload", {})
+        section = {
+            "id": str(point.get("id", section_id)),
+            "title": payload.get("title", ""),
+            "heading": payload.get("heading", ""),
+            "content": payload.get("content", ""),
+            "parent_id": payload.get("parent_id", ""),
+            "collection": payload.get("collection", ""),
+            "path": payload.get("path", ""),
+            "section_index": payload.get("section_index", 0)
+        }
 
-        matches = []
-        for result in results:
-            payload = result.get("payload", {})
-            matches.append(SearchResult(
-                id=str(result.get("id", "")),
-                score=result.get("score", 0),
-                title=payload.get("title", "Untitled"),
-                content=payload.get("description", ""),
-                metadata={
-                    "decision_type": payload.get("decision_type", "unknown"),
-                    "timestamp": payload.get("timestamp", ""),
-                    "outcome": payload.get("outcome", "")
+        if include_neighbours:
+            index = section["section_index"]
+            neighbours = await qdrant_scroll(
+                "document_sections",
+                filter_conditions=must_filter(
+                    match_condition("parent_id", section["parent_id"]),
+                    match_any_condition("section_index", [index - 1, index + 1])
+                ),
+                limit=2
+            )
+            for neighbour in neighbours:
+                neighbour_payload = neighbour.get("payload", {})
+                key = "previous" if neighbour_payload.get("section_index", 0) < index else "next"
+                section[key] = {
+                    "id": str(neighbour.get("id", "")),
+                    "heading": neighbour_payload.get("heading", ""),
+                    "content": neighbour_payload.get("content", "")
                 }
-            ))
-        return matches
+
+        return section
     except Exception as e:
-        logger.error(f"Decision search failed: {e}")
-        return []
+        logger.error(f"Get document section failed: {e}")
+        return None
 
 
 @mcp.tool()
-async def search_documentation(
+async def search_knowledge(
     query: str,
-    limit: int = 5,
-    doc_type: Optional[str] = None
+    collections: Optional[List[str]] = None,
+    limit: int = 10,
+    per_collection_limit: int = 5,
+    limits: Optional[dict] = None,
+    filters: Optional[dict] = None,
+    min_score: float = 0.0
 ) -> List[SearchResult]:
     """
-    Search documentation for information.
+    Search runbooks, decisions, and documentation at once for one question.
+
+    The query is embedded once and the collections are searched concurrently.
+    Qdrant's /points/search/batch only batches searches within one
+    collection, and this makes one search per collection, so each goes
+    through qdrant_search instead and can be answered by the local mirror or
+    the search cache without a request.
+
+    Each collection's scores are rescaled so its best hit scores 1.0, which
+    keeps one collection's similarity scale from crowding out the others
+    (the raw similarity is kept in metadata.raw_score). Results are then
+    merged and de-duplicated by title and content. Each result's
+    metadata.collection names where it came from.
 
     Args:
         query: Natural language search query
-        limit: Maximum results to return (default: 5)
-        doc_type: Filter by type (architecture, guide, reference)
+        collections: Collections to search (default: runbooks, decisions, documentation)
+        limit: Maximum merged results to return (default: 10)
+        per_collection_limit: Results fetched from each collection (default: 5)
+        limits: Per-collection overrides, e.g. {"documentation": 10}
+        filters: Per-collection payload equality filters,
+                 e.g. {"decisions": {"decision_type": "approved"}}
+        min_score: Minimum raw similarity score (default: 0.0)
 
     Returns:
-        List of matching documentation sections
+        Merged list of matches across collections, best first
     """
     try:
-        vector = await get_embedding(query)
-        filter_conditions = None
-        if doc_type:
-            filter_conditions = {
-                "must": [{"key": "doc_type", "match": {"value": doc_type}}]
-            }
-
-        results = await qdrant_search("documentation", vector, limit=limit, filter_conditions=filter_conditions)
+        collections = collections or list(KNOWLEDGE_COLLECTIONS)
+        unknown = [c for c in collections if c not in KNOWLEDGE_COLLECTIONS]
+        if unknown:
+            logger.warning(f"search_knowledge ignoring unknown collections: {unknown}")
+            collections = [c for c in collections if c in KNOWLEDGE_COLLECTIONS]
+        limits = limits or {}
+        filters = filters or {}
 
-        matches = []
-        for result in results:
-            payload = result.get("payload", {})
-            matches.append(SearchResult(
-                id=str(result.get("id", "")),
-                score=result.get("score", 0),
-                title=payload.get("title", "Untitled"),
-                content=payload.get("content", ""),
-                metadata={
-                    "doc_type": payload.get("doc_type", "general"),
-                    "source": payload.get("source", ""),
-                    "last_updated": payload.get("last_updated", "")
-                }
-            ))
-        return matches
+        vector = await get_embedding(query)
+        responses = await asyncio.gather(*(
+            qdrant_search(
+                collection,
+                vector,
+                limit=limits.get(collection, per_collection_limit),
+                filter_conditions=must_filter(*(
+                    match_condition(key, value) for key, value in (filters.get(collection) or {}).items()
+                ))
+            )
+            for collection in collections
+        ), return_exceptions=True)
+
+        merged = {}
+        for collection, results in zip(collections, responses):
+            if isinstance(results, Exception):
+                logger.warning(f"search_knowledge: {collection} search failed: {results}")
+                continue
+            results = [result for result in results if result.get("score", 0) >= min_score]
+            best = max((result.get("score", 0) for result in results), default=0)
+            for result in results:
+                match = KNOWLEDGE_COLLECTIONS[collection](result)
+                match.metadata["collection"] = collection
+                match.metadata["raw_score"] = match.score
+                match.score = round(match.score / best, 4) if best > 0 else 0.0
+                key = text_hash(f"{match.title}\n{match.content}")
+                if key not in merged or merged[key].score < match.score:
+                    merged[key] = match
+
+        # Ties on the normalized score (each collection's top hit) go to the higher raw similarity
+        return sorted(
+            merged.values(), key=lambda m: (m.score, m.metadata["raw_score"]), reverse=True
+        )[:limit]
     except Exception as e:
-        logger.error(f"Documentation search failed: {e}")
+        logger.error(f"Knowledge search failed: {e}")
         return []
 
 
@@ -393,6 +1969,349 @@ AUTONOMY_LEVELS = {
 }
 
 
+class RunbookExactIndex:
+    """
+    alertname / trigger_pattern -> runbook map for exact lookups.
+
+    Built from the runbooks collection at startup and kept current by the
+    runbook write tools, so an exact match never needs Ollama or a vector
+    search. Reloaded in the background after RUNBOOK_INDEX_TTL seconds to
+    pick up runbooks written by the indexer or other services.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._by_key: dict = {}  # normalized name -> runbook id
+        self._runbooks: dict = {}  # runbook id -> (payload, keys)
+        self._loaded_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._writes_during_refresh: Optional[dict] = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _keys(payload: dict) -> List[str]:
+        # alertname goes last so it wins over another runbook's trigger_pattern
+        names = [payload.get("trigger_pattern"), payload.get("alertname")]
+        return [name.strip().lower() for name in names if isinstance(name, str) and name.strip()]
+
+    @classmethod
+    def _apply(cls, by_key: dict, runbooks: dict, runbook_id: str, payload: Optional[dict]):
+        _, old_keys = runbooks.pop(runbook_id, (None, []))
+        for key in old_keys:
+            if by_key.get(key) == runbook_id:
+                del by_key[key]
+        if payload is not None:
+            keys = cls._keys(payload)
+            runbooks[runbook_id] = (payload, keys)
+            for key in keys:
+                by_key[key] = runbook_id
+
+    def _set(self, runbook_id: str, payload: Optional[dict]):
+        self._apply(self._by_key, self._runbooks, runbook_id, payload)
+
+    def add(self, runbook_id: str, payload: dict):
+        runbook_id = str(runbook_id)
+        payload = dict(payload)
+        self._set(runbook_id, payload)
+        if self._writes_during_refresh is not None:
+            self._writes_during_refresh[runbook_id] = payload
+
+    def get(self, name: str) -> Optional[dict]:
+        """Runbook payload (with id) whose alertname or trigger_pattern equals name."""
+        self.refresh_if_stale()
+        runbook_id = self._by_key.get(name.strip().lower())
+        if runbook_id is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {**self._runbooks[runbook_id][0], "id": runbook_id}
+
+    async def refresh(self):
+        """Reload the whole index from Qdrant; lookups use the old one until it's done."""
+        self._writes_during_refresh = {}
+        try:
+            by_key: dict = {}
+            runbooks: dict = {}
+            async for point in qdrant_scroll_iter("runbooks"):
+                self._apply(by_key, runbooks, str(point.get("id", "")), point.get("payload", {}))
+            # Writes that landed while the scroll was in flight win over the snapshot
+            for runbook_id, payload in self._writes_during_refresh.items():
+                self._apply(by_key, runbooks, runbook_id, payload)
+            self._by_key, self._runbooks = by_key, runbooks
+            self._loaded_at = time.monotonic()
+            logger.info(f"Runbook exact-match index loaded: {len(self._runbooks)} runbooks, {len(self._by_key)} keys")
+        finally:
+            self._writes_during_refresh = None
+
+    def refresh_if_stale(self):
+        if time.monotonic() - self._loaded_at < self.ttl:
+            return
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self.try_refresh())
+
+    async def try_refresh(self):
+        """Reload the index, logging instead of raising on failure."""
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning(f"Runbook index refresh failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "runbooks": len(self._runbooks),
+            "keys": len(self._by_key),
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Global runbook exact-match index
+runbook_index = RunbookExactIndex(RUNBOOK_INDEX_TTL)
+
+
+# Rolling execution-stat windows kept on each runbook, in days
+EXECUTION_WINDOWS = [7, 30, 90]
+
+# Resolution-time histogram bucket upper bounds in seconds; the last bucket is open-ended
+RESOLUTION_TIME_BUCKETS = [5, 10, 15, 30, 45, 60, 90, 120, 180, 300, 450, 600, 900, 1200, 1800, 3600]
+
+if AUTONOMY_WINDOW_DAYS not in EXECUTION_WINDOWS:
+    raise ValueError(f"AUTONOMY_WINDOW_DAYS must be one of {EXECUTION_WINDOWS}, got {AUTONOMY_WINDOW_DAYS}")
+
+
+def resolution_bucket(seconds: int) -> str:
+    for index, bound in enumerate(RESOLUTION_TIME_BUCKETS):
+        if seconds <= bound:
+            return str(index)
+    return str(len(RESOLUTION_TIME_BUCKETS))
+
+
+def add_execution_counts(counts: list, executions: int, successes: int, histogram: dict, sign: int = 1):
+    """Add (or with sign=-1 remove) executions to an [executions, successes, histogram, ...] entry."""
+    counts[0] += sign * executions
+    counts[1] += sign * successes
+    for bucket, n in histogram.items():
+        remaining = counts[2].get(bucket, 0) + sign * n
+        if remaining:
+            counts[2][bucket] = remaining
+        else:
+            counts[2].pop(bucket, None)
+
+
+def advance_execution_windows(history: dict, today: str):
+    """
+    Move every window's start up to today, subtracting days that fell out of it.
+
+    A window's start only moves once a day, and each day is subtracted from a
+    window once, so this is O(1) per execution amortized.
+    """
+    for days in EXECUTION_WINDOWS:
+        window = history["windows"].setdefault(str(days), [0, 0, {}, today])
+        start = (datetime.fromisoformat(today) - timedelta(days=days - 1)).date().isoformat()
+        if window[3] >= start:
+            continue
+        for day, (executions, successes, histogram) in history["days"].items():
+            if window[3] <= day < start:
+                add_execution_counts(window, executions, successes, histogram, sign=-1)
+        window[3] = start
+
+    oldest = (datetime.fromisoformat(today) - timedelta(days=max(EXECUTION_WINDOWS) - 1)).date().isoformat()
+    for day in [day for day in history["days"] if day < oldest]:
+        del history["days"][day]
+
+
+def record_execution_history(history: Optional[dict], success: bool, resolution_time: Optional[int]) -> dict:
+    """
+    Add one execution to a runbook's execution_history payload field.
+
+    The field holds per-day buckets for the longest window plus a running
+    [executions, successes, resolution histogram, start day] total per
+    window, so windows are read without summing the days.
+    """
+    history = history or {"days": {}, "windows": {}}
+    today = datetime.now(timezone.utc).date().isoformat()
+    advance_execution_windows(history, today)
+
+    histogram = {resolution_bucket(resolution_time): 1} if resolution_time is not None else {}
+    add_execution_counts(history["days"].setdefault(today, [0, 0, {}]), 1, int(success), histogram)
+    for days in EXECUTION_WINDOWS:
+        add_execution_counts(history["windows"][str(days)], 1, int(success), histogram)
+    return history
+
+
+def histogram_percentile(histogram: dict, q: float) -> Optional[int]:
+    """Upper bound of the bucket holding the q-th resolution time (bucketed, not exact)."""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    seen = 0
+    for index in sorted(int(bucket) for bucket in histogram):
+        seen += histogram[str(index)]
+        if seen >= q * total:
+            return RESOLUTION_TIME_BUCKETS[min(index, len(RESOLUTION_TIME_BUCKETS) - 1)]
+    return RESOLUTION_TIME_BUCKETS[-1]
+
+
+def execution_window_stats(history: Optional[dict]) -> dict:
+    """Success rate and p50/p95 resolution time per window ("7d", "30d", "90d"), as of today."""
+    history = copy.deepcopy(history) if history else {"days": {}, "windows": {}}
+    advance_execution_windows(history, datetime.now(timezone.utc).date().isoformat())
+    stats = {}
+    for days in EXECUTION_WINDOWS:
+        executions, successes, histogram, _ = history["windows"][str(days)]
+        stats[f"{days}d"] = {
+            "executions": executions,
+            "successes": successes,
+            "success_rate": successes / executions if executions else None,
+            "p50_resolution_time": histogram_percentile(histogram, 0.5),
+            "p95_resolution_time": histogram_percentile(histogram, 0.95)
+        }
+    return stats
+
+
+def runbook_response(payload: dict, runbook_id: str) -> dict:
+    """Runbook payload for tool responses: execution_history summarized as its 7/30/90-day windows."""
+    runbook = {key: value for key, value in payload.items() if key != "execution_history"}
+    if payload.get("execution_history"):
+        runbook["windows"] = execution_window_stats(payload["execution_history"])
+    runbook["id"] = runbook_id
+    return runbook
+
+
+def autonomy_evidence(payload: dict) -> tuple:
+    """(executions, success rate, basis) that autonomy suggestions judge a runbook on.
+
+    Runbooks with execution history use the AUTONOMY_WINDOW_DAYS window; ones
+    recorded before history was kept fall back to their lifetime totals.
+    """
+    if payload.get("execution_history"):
+        window = execution_window_stats(payload["execution_history"])[f"{AUTONOMY_WINDOW_DAYS}d"]
+        return window["executions"], window["success_rate"] or 0.0, f"{AUTONOMY_WINDOW_DAYS}d"
+    return payload.get("execution_count", 0), payload.get("success_rate", 0.0), "lifetime"
+
+
+def apply_runbook_execution(stats: dict, success: bool, resolution_time: Optional[int]) -> dict:
+    """Execution stat fields of a runbook payload after one more execution."""
+    execution_count = stats.get("execution_count", 0) + 1
+    success_count = stats.get("success_count", 0) + (1 if success else 0)
+    # Running total so the integer average doesn't drift from truncation
+    total_resolution_time = stats.get("total_resolution_time")
+    if total_resolution_time is None:
+        total_resolution_time = stats.get("avg_resolution_time", 0) * (execution_count - 1)
+    avg_resolution_time = stats.get("avg_resolution_time", 0)
+    if resolution_time is not None:
+        total_resolution_time += resolution_time
+        avg_resolution_time = int(total_resolution_time / execution_count)
+    return {
+        "execution_count": execution_count,
+        "success_count": success_count,
+        "success_rate": success_count / execution_count,
+        "avg_resolution_time": avg_resolution_time,
+        "total_resolution_time": total_resolution_time
+    }
+
+
+class RunbookStatsWriter:
+    """Serializes execution-stat updates per runbook.
+
+    Executions recorded while a runbook's previous update is in flight queue
+    up and are applied together in the next read-modify-write, so concurrent
+    record_runbook_execution calls don't lose counts and a burst costs one
+    read and one write. The rolling execution_history windows are updated
+    in the same write. Other writers of the stat fields (update_runbook)
+    hold the same per-runbook lock.
+    """
+
+    def __init__(self):
+        self._locks: dict = {}  # runbook id -> [asyncio.Lock, holders and waiters]
+        self._pending: dict = {}  # runbook id -> [(success, resolution_time, future)]
+        self.executions = 0
+        self.writes = 0
+
+    @asynccontextmanager
+    async def lock(self, runbook_id: str):
+        """Hold a runbook's lock; it's dropped once nobody holds or waits for it."""
+        runbook_id = str(runbook_id)
+        entry = self._locks.setdefault(runbook_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[runbook_id]
+
+    async def record(self, runbook_id: str, success: bool, resolution_time: Optional[int]) -> dict:
+        """Queue an execution and wait for the write that includes it.
+
+        Returns the runbook payload as of this execution, or None if the
+        runbook doesn't exist.
+        """
+        runbook_id = str(runbook_id)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(runbook_id, []).append((success, resolution_time, future))
+        async with self.lock(runbook_id):
+            if not future.done():
+                await self._write(runbook_id)
+        return await future
+
+    async def _write(self, runbook_id: str):
+        batch = self._pending.pop(runbook_id, [])
+        try:
+            point = await qdrant_get_by_id("runbooks", runbook_id)
+            if not point:
+                for _, _, future in batch:
+                    future.set_result(None)
+                return
+
+            payload = point.get("payload", {})
+            snapshots = []
+            stats = payload
+            history = copy.deepcopy(payload.get("execution_history"))
+            for success, resolution_time, _ in batch:
+                stats = apply_runbook_execution(stats, success, resolution_time)
+                history = record_execution_history(history, success, resolution_time)
+                snapshots.append({**payload, **stats, "execution_history": copy.deepcopy(history)})
+            changes = {
+                **stats,
+                "execution_history": history,
+                "last_executed": datetime.now(timezone.utc).isoformat()
+            }
+
+            # Stats don't feed the vector, so this is a payload-only update
+            if not await qdrant_patch_point("runbooks", runbook_id, payload, changes, runbook_embedding_text):
+                raise RuntimeError(f"Failed to write stats for runbook {runbook_id}")
+            runbook_index.add(runbook_id, payload)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.executions += len(batch)
+        self.writes += 1
+        for (_, _, future), snapshot in zip(batch, snapshots):
+            future.set_result(snapshot)
+
+    def stats(self) -> dict:
+        return {
+            "active_runbooks": len(self._locks),
+            "pending": sum(len(batch) for batch in self._pending.values()),
+            "executions": self.executions,
+            "writes": self.writes,
+            "executions_per_write": round(self.executions / self.writes, 2) if self.writes else 0.0
+        }
+
+
+# Global per-runbook execution stats writer
+runbook_stats = RunbookStatsWriter()
+
+
 @mcp.tool()
 async def get_runbook(runbook_id: str) -> Optional[dict]:
     """
@@ -402,20 +2321,85 @@ async def get_runbook(runbook_id: str) -> Optional[dict]:
         runbook_id: UUID of the runbook
 
     Returns:
-        Runbook details or None if not found
+        Runbook details, with execution windows instead of the raw history, or None if not found
     """
     try:
         point = await qdrant_get_by_id("runbooks", runbook_id)
         if not point:
             return None
-        payload = point.get("payload", {})
-        payload["id"] = runbook_id
-        return payload
+        return runbook_response(point.get("payload", {}), runbook_id)
     except Exception as e:
         logger.error(f"Get runbook failed: {e}")
         return None
 
 
+@mcp.tool()
+async def lookup_runbook_tiered(
+    alertname: str,
+    context: Optional[str] = None,
+    exact_threshold: float = 0.95,
+    semantic_threshold: float = 0.80
+) -> dict:
+    """
+    Find the runbook for an alert: exact alertname match first, semantic search second.
+
+    Tier 1 is an in-memory alertname/trigger_pattern lookup that never calls
+    Ollama or Qdrant. Only when it misses is the alertname (plus context)
+    embedded and searched against the runbooks collection.
+
+    Args:
+        alertname: Alert name (e.g. "KubePodCrashLooping")
+        context: Extra text for the semantic fallback (alert description, findings)
+        exact_threshold: Semantic score at or above which a match counts as EXACT (default: 0.95)
+        semantic_threshold: Semantic score at or above which a match counts as SIMILAR (default: 0.80)
+
+    Returns:
+        {match_type: EXACT|SIMILAR|NO_MATCH, tier, score, runbook, alternatives}
+    """
+    try:
+        runbook = runbook_index.get(alertname)
+        if runbook:
+            return {
+                "match_type": "EXACT",
+                "tier": "exact",
+                "score": 1.0,
+                "runbook": runbook_response(runbook, runbook["id"]),
+                "alternatives": []
+            }
+
+        query = f"{alertname} {context}" if context else alertname
+        vector = await get_embedding(query)
+        results = await qdrant_search("runbooks", vector, limit=3)
+        if not results:
+            return {"match_type": "NO_MATCH", "tier": "semantic", "score": 0.0, "runbook": None, "alternatives": []}
+
+        best = results[0]
+        score = best.get("score", 0)
+        if score >= exact_threshold:
+            match_type = "EXACT"
+        elif score >= semantic_threshold:
+            match_type = "SIMILAR"
+        else:
+            match_type = "NO_MATCH"
+
+        runbook = None
+        if match_type != "NO_MATCH":
+            runbook = runbook_response(best.get("payload", {}), str(best.get("id", "")))
+        return {
+            "match_type": match_type,
+            "tier": "semantic",
+            "score": score,
+            "runbook": runbook,
+            "alternatives": [
+                {"id": str(r.get("id", "")), "title": r.get("payload", {}).get("title", ""), "score": r.get("score", 0)}
+                for r in results[1:]
+            ]
+        }
+    except Exception as e:
+        logger.error(f"Tiered runbook lookup failed: {e}")
+        return {"match_type": "NO_MATCH", "error": str(e), "runbook": None, "alternatives": []}
+
+
 @mcp.tool()
 async def update_runbook(
     runbook_id: str,
@@ -451,49 +2435,49 @@ async def update_runbook(
                          f"Valid levels: {list(AUTONOMY_LEVELS.keys())}"
             }
 
-        # Get existing runbook
-        point = await qdrant_get_by_id("runbooks", runbook_id)
-        if not point:
-            return {"success": False, "error": f"Runbook not found: {runbook_id}"}
-
-        payload = point.get("payload", {})
+        # Serialized with record_runbook_execution so stat edits aren't lost
+        async with runbook_stats.lock(runbook_id):
+            # Get existing runbook
+            point = await qdrant_get_by_id("runbooks", runbook_id)
+            if not point:
+                return {"success": False, "error": f"Runbook not found: {runbook_id}"}
 
-        # Update fields if provided
-        if automation_level is not None:
-            old_level = payload.get("automation_level", "manual")
-            payload["automation_level"] = automation_level
-            # Log autonomy change
-            if old_level != automation_level:
-                logger.info(f"Runbook {runbook_id} autonomy: {old_level} -> {automation_level}")
+            payload = point.get("payload", {})
+            changes = {}
 
-        if success_rate is not None:
-            if not 0.0 <= success_rate <= 1.0:
-                return {"success": False, "error": "success_rate must be between 0.0 and 1.0"}
-            payload["success_rate"] = success_rate
+            # Update fields if provided
+            if automation_level is not None:
+                old_level = payload.get("automation_level", "manual")
+                changes["automation_level"] = automation_level
+                # Log autonomy change
+                if old_level != automation_level:
+                    logger.info(f"Runbook {runbook_id} autonomy: {old_level} -> {automation_level}")
 
-        if execution_count is not None:
-            payload["execution_count"] = execution_count
+            if success_rate is not None:
+                if not 0.0 <= success_rate <= 1.0:
+                    return {"success": False, "error": "success_rate must be between 0.0 and 1.0"}
+                changes["success_rate"] = success_rate
 
-        if success_count is not None:
-            payload["success_count"] = success_count
+            if execution_count is not None:
+                changes["execution_count"] = execution_count
 
-        if avg_resolution_time is not None:
-            payload["avg_resolution_time"] = avg_resolution_time
+            if success_count is not None:
+                changes["success_count"] = success_count
 
-        payload["last_updated"] = datetime.now(timezone.utc).isoformat()
+            if avg_resolution_time is not None:
+                changes["avg_resolution_time"] = avg_resolution_time
 
-        # Regenerate embedding if title/solution changed (not in this case, but future-proof)
-        combined_text = f"{payload.get('title', '')}\n{payload.get('trigger_pattern', '')}\n{payload.get('solution', '')}"
-        vector = await get_embedding(combined_text)
+            if execution_count is not None or avg_resolution_time is not None:
+                # Rebuilt from the new average on the next recorded execution
+                changes["total_resolution_time"] = None
 
-        updated_point = {
-            "id": runbook_id,
-            "vector": vector,
-            "payload": payload
-        }
+            changes["last_updated"] = datetime.now(timezone.utc).isoformat()
 
-        success = await qdrant_upsert("runbooks", [updated_point])
-        return {"success": success, "id": runbook_id}
+            # Only re-embeds if title/trigger_pattern/solution changed
+            success = await qdrant_patch_point("runbooks", runbook_id, payload, changes, runbook_embedding_text)
+            if success:
+                runbook_index.add(runbook_id, payload)
+            return {"success": success, "id": runbook_id}
     except Exception as e:
         logger.error(f"Update runbook failed: {e}")
         return {"success": False, "error": str(e)}
@@ -520,67 +2504,42 @@ async def record_runbook_execution(
         Updated runbook stats and any autonomy level changes
     """
     try:
-        # Get existing runbook
-        point = await qdrant_get_by_id("runbooks", runbook_id)
-        if not point:
+        payload = await runbook_stats.record(runbook_id, success, resolution_time)
+        if payload is None:
             return {"success": False, "error": f"Runbook not found: {runbook_id}"}
 
-        payload = point.get("payload", {})
-
-        # Update counts
-        execution_count = payload.get("execution_count", 0) + 1
-        success_count = payload.get("success_count", 0) + (1 if success else 0)
-        success_rate = success_count / execution_count if execution_count > 0 else 0.0
+        execution_count = payload["execution_count"]
+        success_count = payload["success_count"]
+        success_rate = payload["success_rate"]
+        windows = execution_window_stats(payload["execution_history"])
 
-        # Update average resolution time
-        avg_resolution_time = payload.get("avg_resolution_time", 0)
-        if resolution_time is not None:
-            old_total = avg_resolution_time * (execution_count - 1)
-            avg_resolution_time = int((old_total + resolution_time) / execution_count)
-
-        payload["execution_count"] = execution_count
-        payload["success_count"] = success_count
-        payload["success_rate"] = success_rate
-        payload["avg_resolution_time"] = avg_resolution_time
-        payload["last_executed"] = datetime.now(timezone.utc).isoformat()
-
-        # Check for autonomy level upgrade eligibility
+        # Check for autonomy level upgrade eligibility on recent executions
         current_level = payload.get("automation_level", "manual")
         suggested_upgrade = None
+        window_executions, window_rate, basis = autonomy_evidence(payload)
 
-        if execution_count >= 10:  # Minimum executions for upgrade consideration
+        if window_executions >= 10:  # Minimum executions for upgrade consideration
             for level_name, level_config in AUTONOMY_LEVELS.items():
-                if success_rate >= level_config["confidence_threshold"]:
+                if window_rate >= level_config["confidence_threshold"]:
                     if level_name != current_level:
                         # Check if this is actually an upgrade
                         level_order = ["manual", "prompted", "standard", "autonomous"]
                         if level_order.index(level_name) > level_order.index(current_level):
                             suggested_upgrade = level_name
 
-        # Regenerate embedding
-        combined_text = f"{payload.get('title', '')}\n{payload.get('trigger_pattern', '')}\n{payload.get('solution', '')}"
-        vector = await get_embedding(combined_text)
-
-        updated_point = {
-            "id": runbook_id,
-            "vector": vector,
-            "payload": payload
-        }
-
-        upsert_success = await qdrant_upsert("runbooks", [updated_point])
-
         result = {
-            "success": upsert_success,
+            "success": True,
             "id": runbook_id,
             "execution_count": execution_count,
             "success_count": success_count,
             "success_rate": success_rate,
+            "windows": windows,
             "current_level": current_level
         }
 
         if suggested_upgrade:
             result["suggested_upgrade"] = suggested_upgrade
-            result["upgrade_reason"] = f"Success rate {success_rate:.0%} exceeds threshold for {suggested_upgrade}"
+            result["upgrade_reason"] = f"{basis} success rate {window_rate:.0%} exceeds threshold for {suggested_upgrade}"
 
         return result
     except Exception as e:
@@ -612,30 +2571,35 @@ async def list_autonomy_candidates(
     """
     List runbooks eligible for autonomy upgrade.
 
-    Finds runbooks that meet the criteria for upgrading to a higher autonomy level
-    based on their execution history and success rate.
+    Runbooks are judged on their rolling AUTONOMY_WINDOW_DAYS execution
+    window (lifetime totals for runbooks without execution history), so a
+    runbook that was flaky long ago but is reliable now qualifies, and one
+    that has started failing doesn't.
 
     Args:
-        min_executions: Minimum number of executions required (default: 10)
-        min_success_rate: Minimum success rate required (default: 0.9)
+        min_executions: Minimum number of executions in the window (default: 10)
+        min_success_rate: Minimum success rate in the window (default: 0.9)
 
     Returns:
         List of runbooks with upgrade suggestions
     """
     try:
-        results = await qdrant_scroll("runbooks", limit=200)
+        # Lifetime count bounds the window count, so it's a safe pushdown; the
+        # window rate can't be filtered in Qdrant
+        filter_conditions = must_filter(
+            range_condition("execution_count", gte=min_executions) if min_executions > 0 else None
+        )
+        fields = ["title", "execution_count", "success_rate", "automation_level", "execution_history"]
 
         candidates = []
         level_order = ["manual", "prompted", "standard", "autonomous"]
 
-        for point in results:
+        async for point in qdrant_scroll_iter("runbooks", filter_conditions, with_payload=fields):
             payload = point.get("payload", {})
-            execution_count = payload.get("execution_count", 0)
-            success_rate = payload.get("success_rate", 0.0)
-            current_level = payload.get("automation_level", "manual")
-
+            execution_count, success_rate, basis = autonomy_evidence(payload)
             if execution_count < min_executions or success_rate < min_success_rate:
                 continue
+            current_level = payload.get("automation_level", "manual")
 
             # Find the highest eligible level
             eligible_level = current_level
@@ -652,6 +2616,8 @@ async def list_autonomy_candidates(
                     "suggested_level": eligible_level,
                     "success_rate": success_rate,
                     "execution_count": execution_count,
+                    "basis": basis,
+                    "windows": execution_window_stats(payload.get("execution_history")),
                     "threshold": AUTONOMY_LEVELS[eligible_level]["confidence_threshold"]
                 })
 
@@ -693,27 +2659,32 @@ async def add_runbook(
 
         point_id = str(uuid.uuid4())
 
+        payload = {
+            "title": title,
+            "trigger_pattern": trigger_pattern,
+            "solution": solution,
+            "automation_level": automation_level,
+            "success_rate": 0.0,
+            "success_count": 0,
+            "execution_count": 0,
+            "avg_resolution_time": 0,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+
         # Create combined text for embedding
-        combined_text = f"{title}\n{trigger_pattern}\n{solution}"
+        combined_text = runbook_embedding_text(payload)
         vector = await get_embedding(combined_text)
+        payload["text_hash"] = text_hash(combined_text)
 
         point = {
             "id": point_id,
             "vector": vector,
-            "payload": {
-                "title": title,
-                "trigger_pattern": trigger_pattern,
-                "solution": solution,
-                "automation_level": automation_level,
-                "success_rate": 0.0,
-                "success_count": 0,
-                "execution_count": 0,
-                "avg_resolution_time": 0,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
+            "payload": payload
         }
 
         success = await qdrant_upsert("runbooks", [point])
+        if success:
+            runbook_index.add(point_id, payload)
         return {"success": success, "id": point_id}
     except Exception as e:
         logger.error(f"Add runbook failed: {e}")
@@ -830,13 +2801,185 @@ EVENT_TYPES = {
 }
 
 
+class EventWriteQueue:
+    """Bounded write-behind queue for agent_events.
+
+    log_event/update_event ops are queued in order and applied by a single
+    worker: runs of new events are embedded as one batch and upserted
+    together, updates are applied in between. A full queue makes callers
+    wait (backpressure). Ops still queued at shutdown, and batches that keep
+    failing, are appended to the spill file and replayed on the next start.
+    """
+
+    def __init__(self, max_size: int, batch_size: int, max_retries: int, spill_path: str):
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.spill_path = spill_path
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._inflight: List[dict] = []
+        self._worker: Optional[asyncio.Task] = None
+        self.queued = 0
+        self.written = 0
+        self.retries = 0
+        self.spilled = 0
+
+    @property
+    def accepting(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() + len(self._inflight)
+
+    async def enqueue(self, op: dict):
+        await self._queue.put(op)
+        self.queued += 1
+
+    async def start(self):
+        self._worker = asyncio.ensure_future(self._run())
+        if self.spill_path and os.path.exists(self.spill_path):
+            with open(self.spill_path, encoding="utf-8") as f:
+                ops = [json.loads(line) for line in f if line.strip()]
+            os.remove(self.spill_path)
+            logger.info(f"Replaying {len(ops)} spilled event writes from {self.spill_path}")
+            for op in ops:
+                await self.enqueue(op)
+        elif not self.spill_path:
+            logger.warning("EVENT_WRITE_BEHIND is on without EVENT_SPILL_PATH; queued events are lost on shutdown")
+
+    async def flush(self, timeout: float) -> bool:
+        """Wait until every op queued so far is written."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self, timeout: float):
+        if self._worker is None:
+            return
+        await self.flush(timeout)
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        remaining = list(self._inflight)
+        for _ in self._inflight:
+            self._queue.task_done()
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+            self._queue.task_done()
+        self._inflight = []
+        self._spill(remaining)
+
+    def _spill(self, ops: List[dict]):
+        if not ops:
+            return
+        if not self.spill_path:
+            logger.error(f"Dropping {len(ops)} queued event writes: no EVENT_SPILL_PATH")
+            return
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for op in ops:
+                f.write(json.dumps(op) + "\n")
+        self.spilled += len(ops)
+        logger.warning(f"Spilled {len(ops)} event writes to {self.spill_path}")
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self._inflight = batch
+            for attempt in range(self.max_retries + 1):
+                try:
+                    await self._apply(batch)
+                    self.written += len(batch)
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        logger.error(f"Event write batch failed {attempt + 1} times, spilling: {e}")
+                        self._spill(batch)
+                        break
+                    self.retries += 1
+                    logger.warning(f"Event write batch failed, retrying: {e}")
+                    await asyncio.sleep(min(2 ** attempt, 30))
+            self._inflight = []
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _apply(self, batch: List[dict]):
+        """Apply ops in order; runs of new events share one embedding batch and upsert."""
+        run = []
+        for op in batch:
+            if op["op"] == "log":
+                run.append(op)
+                continue
+            await self._write_events(run)
+            run = []
+            result = await apply_event_update(op["id"], op["changes"])
+            if not result["success"]:
+                if "error" not in result:
+                    raise RuntimeError(f"Update of event {op['id']} rejected")
+                logger.warning(f"Dropping queued update: {result['error']}")
+        await self._write_events(run)
+
+    async def _write_events(self, ops: List[dict]):
+        if not ops:
+            return
+        texts = [event_embedding_text(op["payload"]) for op in ops]
+        vectors = await get_embeddings(texts)
+        points = [
+            {"id": op["id"], "vector": vector, "payload": {**op["payload"], "text_hash": text_hash(text)}}
+            for op, text, vector in zip(ops, texts, vectors)
+        ]
+        if not await qdrant_upsert("agent_events", points, wait=True):
+            raise RuntimeError(f"Upsert of {len(points)} events rejected")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": EVENT_WRITE_BEHIND,
+            "running": self.accepting,
+            "pending": self.pending,
+            "max_size": self._queue.maxsize,
+            "queued": self.queued,
+            "written": self.written,
+            "retries": self.retries,
+            "spilled": self.spilled,
+            "spill_path": self.spill_path
+        }
+
+
+# Global agent_events write-behind queue
+event_queue = EventWriteQueue(EVENT_QUEUE_SIZE, EVENT_QUEUE_BATCH, EVENT_QUEUE_MAX_RETRIES, EVENT_SPILL_PATH)
+
+
+def use_write_behind(wait: Optional[bool]) -> bool:
+    """Whether an event write should be queued: wait=None follows EVENT_WRITE_BEHIND."""
+    queued = EVENT_WRITE_BEHIND if wait is None else not wait
+    return queued and event_queue.accepting
+
+
+async def apply_event_update(event_id: str, changes: dict) -> dict:
+    """Merge changes into a stored event, re-embedding only if its text changed."""
+    point = await qdrant_get_by_id("agent_events", event_id)
+    if not point:
+        return {"success": False, "error": f"Event not found: {event_id}"}
+
+    payload = point.get("payload", {})
+    success = await qdrant_patch_point("agent_events", event_id, payload, changes, event_embedding_text)
+    return {"success": success, "id": event_id}
+
+
 @mcp.tool()
 async def log_event(
     event_type: str,
     description: str,
     source_agent: str = "claude-agent",
     metadata: Optional[dict] = None,
-    resolution: Optional[str] = None
+    resolution: Optional[str] = None,
+    wait: Optional[bool] = None
 ) -> dict:
     """
     Log an event to the agent_events collection for learning.
@@ -859,9 +3002,12 @@ async def log_event(
         source_agent: Source of the event (default: claude-agent)
         metadata: Additional context (task_id, model, latency_ms, tools_used, etc.)
         resolution: What happened / outcome (completed, failed, pending)
+        wait: False returns as soon as the event is queued (write-behind),
+              True waits for it to be stored; default follows the server's
+              EVENT_WRITE_BEHIND setting. Use flush_events to wait for queued writes.
 
     Returns:
-        Status with event ID for later feedback
+        Status with event ID for later feedback ("queued": true if not yet stored)
     """
     try:
         import uuid
@@ -873,12 +3019,6 @@ async def log_event(
         point_id = str(uuid.uuid4())
         timestamp = datetime.now(timezone.utc).isoformat()
 
-        # Build combined text for embedding (description + event type for semantic search)
-        combined_text = f"{event_type}: {description}"
-        if resolution:
-            combined_text += f" - {resolution}"
-        vector = await get_embedding(combined_text)
-
         payload = {
             "event_type": event_type,
             "description": description,
@@ -890,6 +3030,15 @@ async def log_event(
             "feedback": None  # Will be set by feedback
         }
 
+        if use_write_behind(wait):
+            await event_queue.enqueue({"op": "log", "id": point_id, "payload": payload})
+            return {"success": True, "id": point_id, "timestamp": timestamp, "queued": True}
+
+        # Build combined text for embedding (description + event type for semantic search)
+        combined_text = event_embedding_text(payload)
+        vector = await get_embedding(combined_text)
+        payload["text_hash"] = text_hash(combined_text)
+
         point = {
             "id": point_id,
             "vector": vector,
@@ -912,7 +3061,8 @@ async def update_event(
     event_id: str,
     score: Optional[float] = None,
     feedback: Optional[str] = None,
-    resolution: Optional[str] = None
+    resolution: Optional[str] = None,
+    wait: Optional[bool] = None
 ) -> dict:
     """
     Update an existing event with feedback or outcome.
@@ -925,59 +3075,69 @@ async def update_event(
         score: Feedback score 0.0-1.0 (0=failed, 0.5=partial, 1.0=perfect)
         feedback: Human feedback text explaining the score
         resolution: Updated resolution status (resolved, partial, failed, escalated)
+        wait: False queues the update behind earlier queued writes; default
+              follows the server's EVENT_WRITE_BEHIND setting
 
     Returns:
         Status of the update operation
     """
     try:
-        # Get the existing event
-        point = await qdrant_get_by_id("agent_events", event_id)
-        if not point:
-            return {"success": False, "error": f"Event not found: {event_id}"}
-
-        payload = point.get("payload", {})
+        changes = {}
 
         # Update fields if provided
         if score is not None:
             if not 0.0 <= score <= 1.0:
                 return {"success": False, "error": "Score must be between 0.0 and 1.0"}
-            payload["score"] = score
+            changes["score"] = score
 
         if feedback is not None:
-            payload["feedback"] = feedback
+            changes["feedback"] = feedback
 
         if resolution is not None:
-            payload["resolution"] = resolution
+            changes["resolution"] = resolution
 
         # Add feedback timestamp
-        payload["feedback_at"] = datetime.now(timezone.utc).isoformat()
-
-        # Regenerate embedding with feedback context for better similarity matching
-        combined_text = f"{payload.get('event_type', '')}: {payload.get('description', '')}"
-        if payload.get("resolution"):
-            combined_text += f" - {payload['resolution']}"
-        if payload.get("feedback"):
-            combined_text += f" (feedback: {payload['feedback']})"
-
-        vector = await get_embedding(combined_text)
+        changes["feedback_at"] = datetime.now(timezone.utc).isoformat()
 
-        updated_point = {
-            "id": event_id,
-            "vector": vector,
-            "payload": payload
-        }
+        if use_write_behind(wait):
+            await event_queue.enqueue({"op": "update", "id": event_id, "changes": changes})
+            return {"success": True, "id": event_id, "queued": True}
 
-        success = await qdrant_upsert("agent_events", [updated_point])
+        # Re-embeds with feedback context only when resolution/feedback text changed
+        result = await apply_event_update(event_id, changes)
 
-        if success:
+        if result["success"]:
             logger.info(f"Updated event {event_id} with score={score}, resolution={resolution}")
 
-        return {"success": success, "id": event_id}
+        return result
     except Exception as e:
         logger.error(f"Update event failed: {e}")
         return {"success": False, "error": str(e)}
 
 
+@mcp.tool()
+async def flush_events(timeout: float = 30.0) -> dict:
+    """
+    Wait until every queued log_event/update_event write is stored.
+
+    Call before reading back events that were logged with write-behind.
+
+    Args:
+        timeout: Seconds to wait at most (default: 30)
+
+    Returns:
+        Whether the queue drained, and how many writes are still pending
+    """
+    try:
+        if not event_queue.accepting:
+            return {"success": True, "pending": 0}
+        drained = await event_queue.flush(timeout)
+        return {"success": drained, "pending": event_queue.pending}
+    except Exception as e:
+        logger.error(f"Flush events failed: {e}")
+        return {"success": False, "error": str(e)}
+
+
 @mcp.tool()
 async def get_event(event_id: str) -> Optional[dict]:
     """
@@ -1003,52 +3163,490 @@ async def get_event(event_id: str) -> Optional[dict]:
 async def list_recent_events(
     event_type: Optional[str] = None,
     source_agent: Optional[str] = None,
-    limit: int = 50
+    limit: int = 50,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    before: Optional[str] = None,
+    before_id: Optional[str] = None
 ) -> List[dict]:
     """
-    List recent events, optionally filtered by type or source.
+    List recent events, optionally filtered by type, source, or time range.
+
+    Events are ordered by (timestamp, id), newest first, so a page never
+    ends part-way through events sharing a timestamp in a way the next page
+    can't continue from.
 
     Args:
         event_type: Filter by event type (optional)
         source_agent: Filter by source agent (optional)
         limit: Maximum events to return (default: 50)
+        since: Only events at or after this ISO 8601 timestamp (optional)
+        until: Only events at or before this ISO 8601 timestamp (optional)
+        before: Pagination cursor - pass the timestamp of the last event from
+                the previous page to get the next (older) page (optional)
+        before_id: The id of that last event; with it, other events at the
+                   same timestamp aren't skipped (optional)
 
     Returns:
         List of recent events (most recent first)
     """
     try:
-        filter_conditions = None
-        must_conditions = []
+        type_conditions = (
+            match_condition("event_type", event_type) if event_type else None,
+            match_condition("source_agent", source_agent) if source_agent else None
+        )
+
+        async def at_timestamp(timestamp: str, below_id: Optional[str] = None) -> List[dict]:
+            """Every matching event at exactly timestamp (with id < below_id), by id descending."""
+            same = must_filter(*type_conditions, range_condition("timestamp", gte=timestamp, lte=timestamp))
+            points = [p async for p in qdrant_scroll_iter("agent_events", same)
+                      if below_id is None or str(p.get("id", "")) < below_id]
+            return sorted(points, key=lambda p: str(p.get("id", "")), reverse=True)
+
+        results = await at_timestamp(before, before_id) if before and before_id else []
+        wanted = limit - len(results)
+        if wanted > 0:
+            time_range = None
+            if since or until or before:
+                time_range = range_condition("timestamp", gte=since, lte=until, lt=before)
+            filter_conditions = must_filter(*type_conditions, time_range)
+            older = await qdrant_scroll_latest("agent_events", "timestamp", filter_conditions, limit=wanted)
+            if len(older) == wanted:
+                # The page may hold only some of the events at its oldest timestamp:
+                # swap them for all of them in id order so before/before_id resumes exactly
+                oldest = older[-1].get("payload", {}).get("timestamp")
+                if oldest:
+                    older = [p for p in older if p.get("payload", {}).get("timestamp") != oldest]
+                    older += await at_timestamp(oldest)
+            results += older
+        results.sort(key=lambda p: (p.get("payload", {}).get("timestamp") or "", str(p.get("id", ""))), reverse=True)
+        results = results[:limit]
+
+        events = []
+        for r in results:
+            payload = r.get("payload", {})
+            payload["id"] = str(r.get("id", ""))
+            events.append(payload)
+        return events
+    except Exception as e:
+        logger.error(f"List recent events failed: {e}")
+        return []
+
+
+# ============================================================
+# EVENT RETENTION - rollups of expired agent_events
+# ============================================================
+
+def event_pattern(description: str) -> str:
+    """Description with case, whitespace, and numbers normalized, for grouping similar events."""
+    return re.sub(r"\d+", "#", " ".join(description.lower().split()))[:200]
+
+
+def add_vectors(total: Optional[List[float]], vector: List[float], weight: float = 1.0) -> List[float]:
+    if total is None:
+        return [x * weight for x in vector]
+    return [a + b * weight for a, b in zip(total, vector)]
+
+
+def normalized(vector: List[float]) -> List[float]:
+    norm = sum(x * x for x in vector) ** 0.5
+    return [x / norm for x in vector] if norm else vector
+
+
+class EventRollup:
+    """Running daily summary of expired events sharing an event type and pattern."""
+
+    def __init__(self, day: str, event_type: str, pattern: str):
+        self.day = day
+        self.event_type = event_type
+        self.pattern = pattern
+        self.id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"agent_events/rollup/{day}/{event_type}/{pattern}"))
+        self.description = ""
+        self.count = 0
+        self.resolutions: dict = {}
+        self.source_agents: set = set()
+        self.scored = 0
+        self.score_sum = 0.0
+        self.first_seen: Optional[str] = None
+        self.last_seen: Optional[str] = None
+        self.vector_sum: Optional[List[float]] = None
+
+    def add(self, payload: dict, vector: Optional[List[float]], weight: int = 1):
+        """Fold in a raw event (weight 1) or an existing rollup (weight = its count)."""
+        self.description = self.description or payload.get("description", "")
+        self.count += weight
+        if payload.get("rollup"):
+            for resolution, count in payload.get("resolutions", {}).items():
+                self.resolutions[resolution] = self.resolutions.get(resolution, 0) + count
+            self.source_agents.update(payload.get("source_agents", []))
+            self.scored += payload.get("scored", 0)
+            self.score_sum += payload.get("score_sum", 0.0)
+        else:
+            resolution = payload.get("resolution") or "none"
+            self.resolutions[resolution] = self.resolutions.get(resolution, 0) + 1
+            if payload.get("source_agent"):
+                self.source_agents.add(payload["source_agent"])
+            if payload.get("score") is not None:
+                self.scored += 1
+                self.score_sum += payload["score"]
+        first = payload.get("first_seen") or payload.get("timestamp")
+        last = payload.get("last_seen") or payload.get("timestamp")
+        if first and (self.first_seen is None or first < self.first_seen):
+            self.first_seen = first
+        if last and (self.last_seen is None or last > self.last_seen):
+            self.last_seen = last
+        if vector:
+            self.vector_sum = add_vectors(self.vector_sum, normalized(vector), weight)
+
+    def point(self) -> dict:
+        resolution = max(self.resolutions.items(), key=lambda item: item[1])[0] if self.resolutions else ""
+        return {
+            "id": self.id,
+            "vector": normalized(self.vector_sum),
+            "payload": {
+                "event_type": self.event_type,
+                "description": self.description,
+                "pattern": self.pattern,
+                "rollup": True,
+                "day": self.day,
+                "timestamp": f"{self.day}T00:00:00+00:00",
+                "count": self.count,
+                "resolutions": self.resolutions,
+                "resolution": resolution,
+                "source_agents": sorted(self.source_agents),
+                "scored": self.scored,
+                "score_sum": self.score_sum,
+                "mean_score": round(self.score_sum / self.scored, 4) if self.scored else None,
+                "first_seen": self.first_seen,
+                "last_seen": self.last_seen,
+                "metadata": {}
+            }
+        }
+
+
+class EventRetention:
+    """Expires agent_events by per-type TTL, keeping daily rollups in their place.
+
+    Expired events are walked one day at a time: each day's events are folded
+    into one rollup point per (event type, description pattern) whose vector is
+    the members' centroid, the rollups are upserted (merged with any written
+    by an earlier run), and then that day's raw events are deleted by filter.
+    Memory use is bounded by the patterns in a single day.
+    """
+
+    def __init__(self, default_days: int, ttls: dict, rollup_days: int, interval: float):
+        self.default_days = default_days
+        self.ttls = ttls
+        self.rollup_days = rollup_days
+        self.interval = interval
+        self.progress: dict = {"status": "idle"}
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.Task] = None
+
+    def groups(self) -> List[tuple]:
+        """(label, type filter condition(s), ttl days) for every retention class."""
+        groups = [(event_type, [match_condition("event_type", event_type)], [], days)
+                  for event_type, days in self.ttls.items()]
+        others = [match_any_condition("event_type", list(self.ttls))] if self.ttls else []
+        groups.append(("default", [], others, self.default_days))
+        return groups
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, dry_run: bool = False) -> dict:
+        if not self.running:
+            self._task = asyncio.ensure_future(self.run(dry_run))
+        return dict(self.progress)
+
+    async def run(self, dry_run: bool = False) -> dict:
+        now = datetime.now(timezone.utc)
+        self.progress = {
+            "status": "running",
+            "dry_run": dry_run,
+            "started_at": now.isoformat(),
+            "finished_at": None,
+            "group": None,
+            "days_done": 0,
+            "events_rolled_up": 0,
+            "rollups_written": 0,
+            "rollups_expired": 0,
+            "expired": {},
+            "error": None
+        }
+        try:
+            for label, must, must_not, days in self.groups():
+                if days <= 0:
+                    continue
+                self.progress["group"] = label
+                cutoff = (now - timedelta(days=days)).isoformat()
+                await self._expire_group(label, must, must_not, cutoff, dry_run)
+            if self.rollup_days > 0:
+                cutoff = (now - timedelta(days=self.rollup_days)).isoformat()
+                rollup_filter = must_filter(match_condition("rollup", True), range_condition("timestamp", lt=cutoff))
+                self.progress["rollups_expired"] = await qdrant_count("agent_events", rollup_filter)
+                if not dry_run and self.progress["rollups_expired"]:
+                    await qdrant_delete_by_filter("agent_events", rollup_filter)
+            self.progress["status"] = "done"
+        except Exception as e:
+            logger.error(f"Event retention failed: {e}")
+            self.progress["status"] = "failed"
+            self.progress["error"] = str(e)
+        finally:
+            self.progress["group"] = None
+            self.progress["finished_at"] = datetime.now(timezone.utc).isoformat()
+        return dict(self.progress)
+
+    def _filter(self, must: List[dict], must_not: List[dict], gte: Optional[str], lt: str) -> dict:
+        return {
+            "must": must + [range_condition("timestamp", gte=gte, lt=lt)],
+            "must_not": must_not + [match_condition("rollup", True)]
+        }
+
+    async def _expire_group(self, label: str, must: List[dict], must_not: List[dict], cutoff: str, dry_run: bool):
+        expired_filter = self._filter(must, must_not, None, cutoff)
+        total = await qdrant_count("agent_events", expired_filter)
+        self.progress["expired"][label] = total
+        if dry_run or total == 0:
+            return
+
+        oldest = await self._oldest_timestamp(expired_filter)
+        day = datetime.fromisoformat(oldest).astimezone(timezone.utc).date()
+        cutoff_day = datetime.fromisoformat(cutoff).date()
+        while day <= cutoff_day:
+            start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+            end = min(start + timedelta(days=1), datetime.fromisoformat(cutoff))
+            window = self._filter(must, must_not, start.isoformat(), end.isoformat())
+            await self._roll_up_window(day.isoformat(), window)
+            self.progress["days_done"] += 1
+            day += timedelta(days=1)
+
+    async def _oldest_timestamp(self, filter_conditions: dict) -> str:
+        response = await backends.qdrant.post(
+            "/collections/agent_events/points/scroll",
+            json={
+                "limit": 1,
+                "with_payload": ["timestamp"],
+                "filter": filter_conditions,
+                "order_by": {"key": "timestamp", "direction": "asc"}
+            }
+        )
+        if response.status_code != 400:
+            response.raise_for_status()
+            points = response.json().get("result", {}).get("points", [])
+            return points[0]["payload"]["timestamp"]
+        oldest = None
+        async for point in qdrant_scroll_iter("agent_events", filter_conditions, with_payload=["timestamp"]):
+            timestamp = point.get("payload", {}).get("timestamp")
+            if timestamp and (oldest is None or timestamp < oldest):
+                oldest = timestamp
+        return oldest
+
+    async def _roll_up_window(self, day: str, window: dict):
+        rollups: dict = {}
+        async for point in qdrant_scroll_iter("agent_events", window, with_vector=True):
+            payload = point.get("payload", {})
+            event_type = payload.get("event_type", "unknown")
+            pattern = event_pattern(payload.get("description", ""))
+            key = (event_type, pattern)
+            if key not in rollups:
+                rollups[key] = EventRollup(day, event_type, pattern)
+            rollups[key].add(payload, point.get("vector"))
+        if not rollups:
+            return
+
+        # Merge with rollups an earlier run wrote for the same day (the partial cutoff day)
+        by_id = {rollup.id: rollup for rollup in rollups.values()}
+        for start in range(0, len(by_id), BULK_UPSERT_CHUNK):
+            ids = list(by_id)[start:start + BULK_UPSERT_CHUNK]
+            response = await backends.qdrant.post(
+                "/collections/agent_events/points",
+                json={"ids": ids, "with_payload": True, "with_vector": True}
+            )
+            response.raise_for_status()
+            for existing in response.json().get("result", []):
+                payload = existing.get("payload", {})
+                by_id[str(existing["id"])].add(payload, existing.get("vector"), payload.get("count", 0))
+
+        points = [rollup.point() for rollup in rollups.values() if rollup.vector_sum]
+        if len(points) < len(rollups):
+            logger.warning(f"{len(rollups) - len(points)} rollups for {day} have no vectors and are dropped")
+        for start in range(0, len(points), BULK_UPSERT_CHUNK):
+            if not await qdrant_upsert("agent_events", points[start:start + BULK_UPSERT_CHUNK], wait=True):
+                raise RuntimeError(f"Writing rollups for {day} failed; raw events kept")
+        if not await qdrant_delete_by_filter("agent_events", window):
+            raise RuntimeError(f"Deleting expired events for {day} failed")
+        self.progress["events_rolled_up"] += sum(r.count for r in rollups.values())
+        self.progress["rollups_written"] += len(points)
+
+    async def start_schedule(self):
+        if self.interval > 0:
+            self._loop = asyncio.ensure_future(self._schedule())
+
+    async def _schedule(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.running:
+                self._task = asyncio.ensure_future(self.run())
+                await asyncio.shield(self._task)
+
+    async def stop(self):
+        for task in (self._loop, self._task):
+            if task is not None and not task.done():
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "default_days": self.default_days,
+            "ttls": self.ttls,
+            "rollup_days": self.rollup_days,
+            "interval": self.interval,
+            "running": self.running,
+            "last_run": self.progress
+        }
+
+
+# Global agent_events retention
+event_retention = EventRetention(
+    EVENT_RETENTION_DAYS, EVENT_RETENTION_TTLS, EVENT_ROLLUP_RETENTION_DAYS, EVENT_RETENTION_INTERVAL
+)
+
+
+@mcp.tool()
+async def run_event_retention(dry_run: bool = False) -> dict:
+    """
+    Expire old agent_events into daily rollups (runs in the background).
+
+    Events older than their type's TTL are summarized per day and description
+    pattern (count, resolutions, scores, centroid vector) and then deleted, so
+    get_similar_events still matches old patterns. Call again to see progress.
+
+    Args:
+        dry_run: Only count what would expire (default: False)
+
+    Returns:
+        Progress of the current or last run
+    """
+    try:
+        return {"success": True, **event_retention.start(dry_run)}
+    except Exception as e:
+        logger.error(f"Event retention failed to start: {e}")
+        return {"success": False, "error": str(e)}
+
+
+# ============================================================
+# ENTITY TOOLS - Network Device Intelligence
+# ============================================================
+
+ENTITY_IDENTIFIER_FIELDS = ["ip", "mac", "hostname"]
+
+
+def entity_identifier_keys(identifier: str) -> List[tuple]:
+    """(field, value) pairs to try for an identifier, in match precedence order."""
+    # Normalize identifier
+    identifier = identifier.strip().lower()
+    keys = [(field, identifier) for field in ENTITY_IDENTIFIER_FIELDS]
+
+    # Also try case-insensitive MAC (with colons normalized)
+    if ":" in identifier or "-" in identifier:
+        keys.append(("mac", identifier.replace("-", ":").upper()))
+    return keys
+
+
+class EntityIdentifierIndex:
+    """In-process ip/mac/hostname -> entity point map for hot get_entity lookups.
+
+    Kept current by the entity write tools; entries expire after a TTL so
+    writes from other services (network discovery, enrichment) are picked up.
+    """
+
+    def __init__(self, enabled: bool, ttl: float):
+        self.enabled = enabled
+        self.ttl = ttl
+        self._ids: dict = {}  # (field, value) -> point id
+        self._points: dict = {}  # point id -> (loaded_at, payload, keys)
+        self.hits = 0
+        self.misses = 0
 
-        if event_type:
-            must_conditions.append({"key": "event_type", "match": {"value": event_type}})
-        if source_agent:
-            must_conditions.append({"key": "source_agent", "match": {"value": source_agent}})
+    def lookup(self, identifier: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        for key in entity_identifier_keys(identifier):
+            point_id = self._ids.get(key)
+            if point_id is None:
+                continue
+            loaded_at, payload, _ = self._points[point_id]
+            if now - loaded_at < self.ttl:
+                self.hits += 1
+                # Copy so callers mutating the payload don't corrupt the index
+                return {"id": point_id, "payload": dict(payload)}
+            self.remove(point_id)
+        self.misses += 1
+        return None
 
-        if must_conditions:
-            filter_conditions = {"must": must_conditions}
+    def add(self, point: dict):
+        if not self.enabled:
+            return
+        point_id = str(point.get("id", ""))
+        self.remove(point_id)
+        payload = dict(point.get("payload", {}))
+        keys = [(field, payload[field]) for field in ENTITY_IDENTIFIER_FIELDS if payload.get(field)]
+        self._points[point_id] = (time.monotonic(), payload, keys)
+        for key in keys:
+            self._ids[key] = point_id
+
+    def remove(self, point_id: str):
+        point_id = str(point_id)
+        _, _, keys = self._points.pop(point_id, (0.0, None, []))
+        for key in keys:
+            if self._ids.get(key) == point_id:
+                del self._ids[key]
+
+    def clear(self):
+        """Drop every entry, for writes that match by filter rather than id."""
+        self._ids.clear()
+        self._points.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._points),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
 
-        results = await qdrant_scroll("agent_events", filter_conditions, limit=limit)
 
-        # Extract payloads and sort by timestamp (descending)
-        events = []
-        for r in results:
-            payload = r.get("payload", {})
-            payload["id"] = str(r.get("id", ""))
-            events.append(payload)
+# Global entity identifier index
+entity_index = EntityIdentifierIndex(ENTITY_CACHE_ENABLED, ENTITY_CACHE_TTL)
 
-        # Sort by timestamp descending
-        events.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
 
-        return events
-    except Exception as e:
-        logger.error(f"List recent events failed: {e}")
-        return []
+async def find_entity_point(identifier: str) -> Optional[dict]:
+    """Find the entity point matching an IP address, MAC address, or hostname.
+
+    Checks the in-process identifier index first, then sends one query
+    batch with a filter-only limit=1 query per (keyword-indexed) identifier
+    field, and keeps the match with ip > mac > hostname precedence. A single
+    should-filter scroll can't keep that precedence: its page may be filled
+    by lower-precedence matches.
+    """
+    point = entity_index.lookup(identifier)
+    if point is not None:
+        return point
 
+    for results in await qdrant_filter_batch(
+        "entities", [must_filter(match_condition(field, value)) for field, value in entity_identifier_keys(identifier)]
+    ):
+        if results:
+            entity_index.add(results[0])
+            return results[0]
+
+    return None
 
-# ============================================================
-# ENTITY TOOLS - Network Device Intelligence
-# ============================================================
 
 @mcp.tool()
 async def search_entities(
@@ -1103,29 +3701,8 @@ async def get_entity(identifier: str) -> Optional[EntityResult]:
         Entity details or None if not found
     """
     try:
-        # Normalize identifier
-        identifier = identifier.strip().lower()
-
-        # Try each field type
-        for field in ["ip", "mac", "hostname"]:
-            filter_conditions = {
-                "must": [{"key": field, "match": {"value": identifier}}]
-            }
-            results = await qdrant_scroll("entities", filter_conditions, limit=1)
-            if results:
-                return payload_to_entity(results[0])
-
-        # Also try case-insensitive MAC (with colons normalized)
-        if ":" in identifier or "-" in identifier:
-            mac_normalized = identifier.replace("-", ":").upper()
-            filter_conditions = {
-                "must": [{"key": "mac", "match": {"value": mac_normalized}}]
-            }
-            results = await qdrant_scroll("entities", filter_conditions, limit=1)
-            if results:
-                return payload_to_entity(results[0])
-
-        return None
+        point = await find_entity_point(identifier)
+        return payload_to_entity(point) if point else None
     except Exception as e:
         logger.error(f"Get entity failed: {e}")
         return None
@@ -1148,11 +3725,11 @@ async def get_entities_by_type(
         List of entities of that type
     """
     try:
-        filter_conditions = {
-            "must": [{"key": "type", "match": {"value": entity_type.lower()}}]
-        }
-        results = await qdrant_scroll("entities", filter_conditions, limit=limit)
-        return [payload_to_entity(r) for r in results]
+        filter_conditions = must_filter(match_condition("type", entity_type.lower()))
+        return [
+            payload_to_entity(point)
+            async for point in qdrant_scroll_iter("entities", filter_conditions, limit=limit)
+        ]
     except Exception as e:
         logger.error(f"Get entities by type failed: {e}")
         return []
@@ -1174,11 +3751,11 @@ async def get_entities_by_network(
         List of entities on that network
     """
     try:
-        filter_conditions = {
-            "must": [{"key": "network", "match": {"value": network.lower()}}]
-        }
-        results = await qdrant_scroll("entities", filter_conditions, limit=limit)
-        return [payload_to_entity(r) for r in results]
+        filter_conditions = must_filter(match_condition("network", network.lower()))
+        return [
+            payload_to_entity(point)
+            async for point in qdrant_scroll_iter("entities", filter_conditions, limit=limit)
+        ]
     except Exception as e:
         logger.error(f"Get entities by network failed: {e}")
         return []
@@ -1235,49 +3812,20 @@ async def update_entity(
     """
     try:
         # Find the entity first
-        entity = await get_entity(identifier)
-        if not entity:
-            return {"success": False, "error": f"Entity not found: {identifier}"}
-
-        # Get current point
-        point = await qdrant_get_by_id("entities", entity.id)
+        point = await find_entity_point(identifier)
         if not point:
-            return {"success": False, "error": f"Could not retrieve entity point"}
+            return {"success": False, "error": f"Entity not found: {identifier}"}
 
-        # Merge updates into payload
+        entity_id = str(point.get("id", ""))
         payload = point.get("payload", {})
-        for key, value in updates.items():
-            payload[key] = value
-
-        # Regenerate description and embedding
-        description_parts = []
-        if payload.get("manufacturer"):
-            description_parts.append(payload["manufacturer"])
-        if payload.get("model"):
-            description_parts.append(payload["model"])
-        if payload.get("type"):
-            description_parts.append(payload["type"])
-        if payload.get("location"):
-            description_parts.append(f"in {payload['location']}")
-        if payload.get("function"):
-            description_parts.append(payload["function"])
-        if payload.get("network"):
-            description_parts.append(f"on {payload['network']} network")
-        if payload.get("ip"):
-            description_parts.append(f"at {payload['ip']}")
-
-        description = " ".join(description_parts)
-        vector = await get_embedding(description)
-
-        # Update point
-        updated_point = {
-            "id": entity.id,
-            "vector": vector,
-            "payload": payload
-        }
 
-        success = await qdrant_upsert("entities", [updated_point])
-        return {"success": success, "id": entity.id}
+        # Merge updates; the description is only re-embedded if its fields changed
+        success = await qdrant_patch_point("entities", entity_id, payload, dict(updates), entity_embedding_text)
+        if success:
+            entity_index.add({"id": entity_id, "payload": payload})
+        else:
+            entity_index.remove(entity_id)
+        return {"success": success, "id": entity_id}
     except Exception as e:
         logger.error(f"Update entity failed: {e}")
         return {"success": False, "error": str(e)}
@@ -1322,37 +3870,25 @@ async def add_entity(
         import uuid
         point_id = str(uuid.uuid4())
 
-        # Build description for embedding
-        description_parts = [manufacturer, model, entity_type]
-        if location:
-            description_parts.append(f"in {location}")
-        if function:
-            description_parts.append(function)
-        if network:
-            description_parts.append(f"on {network} network")
-        description_parts.append(f"at {ip}")
-
-        description = " ".join(filter(None, description_parts))
-        vector = await get_embedding(description)
-
-        payload = {
+        payload = new_entity_payload({
             "ip": ip,
-            "mac": mac.upper() if mac else "",
-            "hostname": hostname,
+            "entity_type": entity_type,
             "category": category,
-            "type": entity_type.lower(),
+            "hostname": hostname,
+            "mac": mac,
             "manufacturer": manufacturer,
             "model": model,
             "location": location,
             "function": function,
             "network": network,
-            "status": "online",
-            "interfaces": interfaces or [],
-            "capabilities": capabilities or [],
-            "discovered_via": ["manual"],
-            "first_seen": datetime.now(timezone.utc).isoformat(),
-            "last_seen": datetime.now(timezone.utc).isoformat()
-        }
+            "interfaces": interfaces,
+            "capabilities": capabilities
+        }, source="manual")
+
+        # Build description for embedding
+        description = entity_embedding_text(payload)
+        vector = await get_embedding(description)
+        payload["text_hash"] = text_hash(description)
 
         point = {
             "id": point_id,
@@ -1361,12 +3897,205 @@ async def add_entity(
         }
 
         success = await qdrant_upsert("entities", [point])
+        if success:
+            entity_index.add(point)
         return {"success": success, "id": point_id}
     except Exception as e:
         logger.error(f"Add entity failed: {e}")
         return {"success": False, "error": str(e)}
 
 
+ENTITY_TEXT_FIELDS = ["hostname", "manufacturer", "model", "location", "function", "network"]
+
+
+def new_entity_payload(item: dict, source: str) -> dict:
+    """Payload for a new entity from add_entity-style fields (ip, entity_type, category, ...)."""
+    now = datetime.now(timezone.utc).isoformat()
+    payload = {
+        "ip": item["ip"],
+        "mac": (item.get("mac") or "").upper(),
+        "category": item["category"],
+        "type": (item.get("entity_type") or item.get("type") or "").lower()
+    }
+    for field in ENTITY_TEXT_FIELDS:
+        payload[field] = item.get(field) or ""
+    payload.update({
+        "status": item.get("status") or "online",
+        "interfaces": item.get("interfaces") or [],
+        "capabilities": item.get("capabilities") or [],
+        "discovered_via": [source],
+        "first_seen": now,
+        "last_seen": now
+    })
+    return payload
+
+
+def merge_entity_payload(payload: dict, item: dict, source: str) -> dict:
+    """Existing entity payload updated with the non-empty fields of an ingest item."""
+    merged = dict(payload)
+    for field in ["ip", "category", "status", "interfaces", "capabilities"] + ENTITY_TEXT_FIELDS:
+        if item.get(field):
+            merged[field] = item[field]
+    if item.get("mac"):
+        merged["mac"] = item["mac"].upper()
+    if item.get("entity_type") or item.get("type"):
+        merged["type"] = (item.get("entity_type") or item.get("type")).lower()
+    discovered_via = list(merged.get("discovered_via") or [])
+    if source not in discovered_via:
+        discovered_via.append(source)
+    merged["discovered_via"] = discovered_via
+    merged["last_seen"] = datetime.now(timezone.utc).isoformat()
+    return merged
+
+
+async def find_entities_by_identifiers(ips: List[str], macs: List[str]) -> dict:
+    """Existing entity points keyed by ("ip", value) and ("mac", value), fetched in chunks."""
+    found = {}
+    for field, values in (("ip", ips), ("mac", macs)):
+        values = sorted(set(v for v in values if v))
+        for start in range(0, len(values), BULK_UPSERT_CHUNK):
+            chunk = values[start:start + BULK_UPSERT_CHUNK]
+            async for point in qdrant_scroll_iter("entities", must_filter(match_any_condition(field, chunk))):
+                value = point.get("payload", {}).get(field)
+                if value:
+                    found.setdefault((field, value), point)
+    return found
+
+
+async def ingest_entities(entities: List[dict], update_existing: bool, source: str) -> dict:
+    """
+    Shared body of add_entities_bulk/upsert_entities_bulk.
+
+    Items are validated and de-duplicated by ip/mac (within the batch and
+    against stored entities), embedded concurrently through the embedding
+    batcher, and written in BULK_UPSERT_CHUNK-point upserts with wait=false.
+    """
+    import uuid
+    results = [None] * len(entities)
+    seen = {}
+    candidates = []  # (index, item)
+
+    for index, item in enumerate(entities):
+        if not isinstance(item, dict):
+            results[index] = {"index": index, "status": "error", "error": "Entity must be an object"}
+            continue
+        missing = [f for f in ("ip", "category") if not item.get(f)]
+        if not (item.get("entity_type") or item.get("type")):
+            missing.append("entity_type")
+        if missing:
+            results[index] = {"index": index, "ip": item.get("ip", ""), "status": "error",
+                              "error": f"Missing required fields: {', '.join(missing)}"}
+            continue
+        keys = [("ip", item["ip"])] + ([("mac", item["mac"].upper())] if item.get("mac") else [])
+        first = next((seen[key] for key in keys if key in seen), None)
+        if first is not None:
+            results[index] = {"index": index, "ip": item["ip"], "status": "duplicate", "duplicate_of": first}
+            continue
+        for key in keys:
+            seen[key] = index
+        candidates.append((index, item))
+
+    existing = await find_entities_by_identifiers(
+        [item["ip"] for _, item in candidates],
+        [mac for _, item in candidates if item.get("mac") for mac in (item["mac"].upper(), item["mac"].lower())]
+    )
+
+    writes = []  # (index, point, status)
+    for index, item in candidates:
+        point = existing.get(("ip", item["ip"]))
+        if point is None and item.get("mac"):
+            point = existing.get(("mac", item["mac"].upper())) or existing.get(("mac", item["mac"].lower()))
+        if point is None:
+            writes.append((index, {"id": str(uuid.uuid4()), "payload": new_entity_payload(item, source)}, "created"))
+        elif update_existing:
+            payload = merge_entity_payload(point.get("payload", {}), item, source)
+            writes.append((index, {"id": str(point["id"]), "payload": payload}, "updated"))
+        else:
+            results[index] = {"index": index, "ip": item["ip"], "id": str(point["id"]), "status": "exists"}
+
+    descriptions = [entity_embedding_text(point["payload"]) for _, point, _ in writes]
+    vectors = await asyncio.gather(*(get_embedding(d) for d in descriptions), return_exceptions=True)
+
+    ready = []
+    for (index, point, status), description, vector in zip(writes, descriptions, vectors):
+        if isinstance(vector, Exception):
+            results[index] = {"index": index, "ip": point["payload"]["ip"], "id": point["id"],
+                              "status": "error", "error": f"Embedding failed: {vector}"}
+            continue
+        point["vector"] = vector
+        point["payload"]["text_hash"] = text_hash(description)
+        ready.append((index, point, status))
+
+    chunks = [ready[start:start + BULK_UPSERT_CHUNK] for start in range(0, len(ready), BULK_UPSERT_CHUNK)]
+    outcomes = await asyncio.gather(
+        *(qdrant_upsert("entities", [point for _, point, _ in chunk], wait=False) for chunk in chunks),
+        return_exceptions=True
+    )
+    for chunk, outcome in zip(chunks, outcomes):
+        for index, point, status in chunk:
+            result = {"index": index, "ip": point["payload"]["ip"], "id": point["id"], "status": status}
+            if outcome is True:
+                entity_index.add(point)
+            else:
+                entity_index.remove(point["id"])
+                result["status"] = "error"
+                result["error"] = str(outcome) if isinstance(outcome, Exception) else "Upsert rejected"
+            results[index] = result
+
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return {"success": "error" not in summary, "summary": summary, "results": results}
+
+
+@mcp.tool()
+async def add_entities_bulk(entities: List[dict], source: str = "bulk") -> dict:
+    """
+    Add many entities in one call (e.g. from a subnet scan or DHCP lease dump).
+
+    Entities whose IP or MAC already exists are left untouched and reported
+    as "exists". Use upsert_entities_bulk to merge into them instead.
+
+    Args:
+        entities: List of entity dicts with the same fields as add_entity
+                  (ip, entity_type, category required; hostname, mac, ... optional)
+        source: Recorded in discovered_via (e.g. "nmap", "dhcp")
+
+    Returns:
+        Summary counts and per-item results ({index, ip, id, status, error?}),
+        status being created, exists, duplicate, or error
+    """
+    try:
+        return await ingest_entities(entities, update_existing=False, source=source)
+    except Exception as e:
+        logger.error(f"Add entities bulk failed: {e}")
+        return {"success": False, "error": str(e)}
+
+
+@mcp.tool()
+async def upsert_entities_bulk(entities: List[dict], source: str = "bulk") -> dict:
+    """
+    Add or update many entities in one call.
+
+    Entities are matched to existing ones by IP, then MAC. Matches keep their
+    ID and first_seen; non-empty fields from the input replace stored ones.
+
+    Args:
+        entities: List of entity dicts with the same fields as add_entity
+                  (ip, entity_type, category required; hostname, mac, ... optional)
+        source: Recorded in discovered_via (e.g. "nmap", "dhcp")
+
+    Returns:
+        Summary counts and per-item results ({index, ip, id, status, error?}),
+        status being created, updated, duplicate, or error
+    """
+    try:
+        return await ingest_entities(entities, update_existing=True, source=source)
+    except Exception as e:
+        logger.error(f"Upsert entities bulk failed: {e}")
+        return {"success": False, "error": str(e)}
+
+
 @mcp.tool()
 async def delete_entity(entity_id: str) -> dict:
     """
@@ -1380,6 +4109,7 @@ async def delete_entity(entity_id: str) -> dict:
     """
     try:
         success = await qdrant_delete_points("entities", [entity_id])
+        entity_index.remove(entity_id)
         return {"success": success, "id": entity_id}
     except Exception as e:
         logger.error(f"Delete entity failed: {e}")
@@ -1395,31 +4125,156 @@ async def delete_entities_by_ip(ip: str) -> dict:
         ip: IP address to match
 
     Returns:
-        Status with count of deleted entities
+        Status with count and ids of deleted entities
     """
     try:
-        # Find all entities with this IP
-        filter_conditions = {
-            "must": [{"key": "ip", "match": {"value": ip}}]
-        }
-        results = await qdrant_scroll("entities", filter_conditions, limit=100)
-
-        if not results:
+        filter_conditions = must_filter(match_condition("ip", ip))
+        entity_ids = [
+            str(point["id"]) async for point in qdrant_scroll_iter("entities", filter_conditions, with_payload=False)
+        ]
+        if not entity_ids:
             return {"success": True, "deleted": 0, "message": f"No entities found with IP {ip}"}
 
-        # Get all IDs
-        entity_ids = [str(r.get("id", "")) for r in results if r.get("id")]
+        # By id, so the response lists exactly the points removed
+        success = await qdrant_delete_points("entities", entity_ids)
+        for entity_id in entity_ids:
+            entity_index.remove(entity_id)
+        return {"success": success, "deleted": len(entity_ids) if success else 0, "ids": entity_ids}
+    except Exception as e:
+        logger.error(f"Delete entities by IP failed: {e}")
+        return {"success": False, "error": str(e)}
+
+
+@mcp.tool()
+async def delete_entities_where(where: dict, dry_run: bool = False) -> dict:
+    """
+    Delete every entity whose payload matches all the given fields.
+
+    Args:
+        where: Field/value pairs, e.g. {"network": "iot", "status": "offline"};
+               a list value matches any of its items, e.g. {"ip": ["10.10.0.5", "10.10.0.6"]}
+        dry_run: Only count the matching entities
+
+    Returns:
+        Status with count of matched (and deleted) entities
+    """
+    try:
+        filter_conditions = payload_filter(where)
+        if not filter_conditions:
+            return {"success": False, "error": "where must name at least one field"}
 
-        if entity_ids:
-            success = await qdrant_delete_points("entities", entity_ids)
-            return {"success": success, "deleted": len(entity_ids), "ids": entity_ids}
+        count = await qdrant_count("entities", filter_conditions)
+        if dry_run or not count:
+            return {"success": True, "matched": count, "deleted": 0, "dry_run": dry_run}
 
-        return {"success": True, "deleted": 0}
+        success = await qdrant_delete_by_filter("entities", filter_conditions)
+        entity_index.clear()
+        return {"success": success, "matched": count, "deleted": count if success else 0, "dry_run": False}
     except Exception as e:
-        logger.error(f"Delete entities by IP failed: {e}")
+        logger.error(f"Delete entities where failed: {e}")
+        return {"success": False, "error": str(e)}
+
+
+@mcp.tool()
+async def bulk_update_entity_status(
+    status: str,
+    where: dict = None,
+    ips: List[str] = None
+) -> dict:
+    """
+    Set the status of every matching entity in one call.
+
+    Args:
+        status: New status (e.g., "online", "offline", "decommissioned")
+        where: Field/value pairs to match, as for delete_entities_where
+        ips: IP addresses to match (combined with where)
+
+    Returns:
+        Status with count of updated entities
+    """
+    try:
+        where = dict(where or {})
+        if ips:
+            where["ip"] = list(ips)
+        filter_conditions = payload_filter(where)
+        if not filter_conditions:
+            return {"success": False, "error": "where or ips must be given"}
+
+        count = await qdrant_count("entities", filter_conditions)
+        if not count:
+            return {"success": True, "updated": 0}
+
+        success = await qdrant_set_payload_by_filter("entities", filter_conditions, {
+            "status": status,
+            "status_changed_at": datetime.now(timezone.utc).isoformat()
+        })
+        entity_index.clear()
+        return {"success": success, "updated": count if success else 0}
+    except Exception as e:
+        logger.error(f"Bulk update entity status failed: {e}")
+        return {"success": False, "error": str(e)}
+
+
+@mcp.tool()
+async def batch_update_entities(operations: List[dict]) -> dict:
+    """
+    Apply several filter-based entity changes, in order, in one request.
+
+    Each operation is {"where": {...}, "set": {...}} to merge payload fields,
+    or {"where": {...}, "delete": true}. Renumbering a network is one call:
+    [{"where": {"ip": "10.10.0.5"}, "set": {"ip": "10.20.0.5"}}, ...].
+    Entities whose vector text changed (ip, network, location, ...) are
+    re-embedded once the batch is applied.
+
+    Args:
+        operations: List of operations as above
+
+    Returns:
+        Status with the number of operations applied and entities re-embedded
+    """
+    try:
+        batch = []
+        reembed_filters = []
+        for index, op in enumerate(operations):
+            filter_conditions = payload_filter(op.get("where"))
+            if not filter_conditions:
+                return {"success": False, "error": f"operation {index}: where must name at least one field"}
+            if op.get("delete"):
+                batch.append({"delete": {"filter": filter_conditions}})
+            elif op.get("set"):
+                batch.append({"set_payload": {"payload": op["set"], "filter": filter_conditions}})
+                if ENTITY_EMBEDDING_FIELDS.intersection(op["set"]):
+                    reembed_filters.append(filter_conditions)
+            else:
+                return {"success": False, "error": f"operation {index}: needs set or delete"}
+
+        if not batch:
+            return {"success": True, "applied": 0, "reembedded": 0}
+
+        # Matched before the batch runs, since a changed field may no longer match its where
+        reembed_ids = {
+            str(point["id"])
+            for filter_conditions in reembed_filters
+            async for point in qdrant_scroll_iter("entities", filter_conditions, with_payload=False)
+        }
+
+        success = await qdrant_batch_update("entities", batch)
+        entity_index.clear()
+        if not success:
+            return {"success": False, "applied": 0, "reembedded": 0}
+        reembedded = await qdrant_reembed_points("entities", sorted(reembed_ids), entity_embedding_text)
+        return {"success": True, "applied": len(batch), "reembedded": reembedded}
+    except Exception as e:
+        logger.error(f"Batch update entities failed: {e}")
         return {"success": False, "error": str(e)}
 
 
+async def entity_counts_by(field: str) -> List[dict]:
+    """Entity counts grouped by a payload field, sorted by count descending."""
+    counts = await payload_aggregates.counts("entities", field)
+    return [{field: value, "count": count} for value, count in sorted(counts.items(), key=lambda x: -x[1])]
+
+
 @mcp.tool()
 async def list_entity_types() -> List[dict]:
     """
@@ -1429,31 +4284,681 @@ async def list_entity_types() -> List[dict]:
         List of {type: str, count: int} entries
     """
     try:
-        # Scroll through all entities and count types
-        all_points = await qdrant_scroll("entities", limit=1000)
+        return await entity_counts_by("type")
+    except Exception as e:
+        logger.error(f"List entity types failed: {e}")
+        return []
 
-        type_counts = {}
-        for point in all_points:
-            entity_type = point.get("payload", {}).get("type", "unknown")
-            type_counts[entity_type] = type_counts.get(entity_type, 0) + 1
 
-        # Sort by count descending
-        result = [{"type": t, "count": c} for t, c in sorted(type_counts.items(), key=lambda x: -x[1])]
-        return result
+@mcp.tool()
+async def list_entity_categories() -> List[dict]:
+    """
+    List all entity categories with their counts.
+
+    Returns:
+        List of {category: str, count: int} entries
+    """
+    try:
+        return await entity_counts_by("category")
     except Exception as e:
-        logger.error(f"List entity types failed: {e}")
+        logger.error(f"List entity categories failed: {e}")
         return []
 
 
-def main():
+@mcp.tool()
+async def list_entity_networks() -> List[dict]:
+    """
+    List all networks with their entity counts.
+
+    Returns:
+        List of {network: str, count: int} entries
+    """
+    try:
+        return await entity_counts_by("network")
+    except Exception as e:
+        logger.error(f"List entity networks failed: {e}")
+        return []
+
+
+# ============================================================
+# COLLECTION SCHEMA
+# ============================================================
+
+# Vector and index settings every knowledge collection is created with
+COLLECTION_DEFAULTS = {
+    "vectors": {"size": VECTOR_SIZE, "distance": "Cosine"},
+    "on_disk_payload": True,
+    "hnsw_config": {"m": HNSW_M, "ef_construct": HNSW_EF_CONSTRUCT},
+    "optimizers_config": {"indexing_threshold": INDEXING_THRESHOLD}
+}
+
+QUANTIZATION_CONFIGS = {
+    "scalar": {"scalar": {"type": "int8", "quantile": 0.99, "always_ram": True}},
+    "binary": {"binary": {"always_ram": True}}
+}
+
+
+def collection_config(collection: str, quantization: Optional[str] = None, on_disk: Optional[bool] = None) -> dict:
+    """Create-collection body: COLLECTION_DEFAULTS plus quantization and on-disk vector settings.
+
+    Collections in QUANTIZED_COLLECTIONS default to QUANTIZATION with the
+    original vectors on disk; everything else keeps plain in-RAM vectors.
+    """
+    if quantization is None:
+        quantization = QUANTIZATION if collection in QUANTIZED_COLLECTIONS else "none"
+    if quantization not in QUANTIZATION_CONFIGS and quantization != "none":
+        raise ValueError(f"Unknown quantization {quantization!r}, expected scalar, binary, or none")
+    if on_disk is None:
+        on_disk = quantization != "none"
+
+    config = copy.deepcopy(COLLECTION_DEFAULTS)
+    config["vectors"]["on_disk"] = on_disk
+    if quantization != "none":
+        config["quantization_config"] = copy.deepcopy(QUANTIZATION_CONFIGS[quantization])
+    return config
+
+# Payload indexes for every field this server filters, facets, or orders on
+COLLECTION_SCHEMAS = {
+    "runbooks": {
+        "alertname": "keyword",
+        "trigger_pattern": "keyword",
+        "automation_level": "keyword",
+        "execution_count": "integer",
+        "success_rate": "float"
+    },
+    "decisions": {
+        "decision_type": "keyword",
+        "timestamp": "datetime"
+    },
+    "documentation": {
+        "doc_type": "keyword",
+        "source": "keyword"
+    },
+    "document_sections": {
+        "parent_id": "keyword",
+        "collection": "keyword",
+        "path": "keyword",
+        "doc_type": "keyword",
+        "section_index": "integer"
+    },
+    "agent_events": {
+        "event_type": "keyword",
+        "source_agent": "keyword",
+        "status": "keyword",
+        "timestamp": "datetime",
+        "rollup": "bool"
+    },
+    "entities": {
+        "ip": "keyword",
+        "mac": "keyword",
+        "hostname": "keyword",
+        "category": "keyword",
+        "type": "keyword",
+        "manufacturer": "keyword",
+        "network": "keyword",
+        "status": "keyword"
+    },
+    "device_types": {
+        "name": "keyword",
+        "category": "keyword"
+    }
+}
+
+
+class SchemaReconciler:
+    """Brings Qdrant in line with COLLECTION_SCHEMAS at startup.
+
+    Missing collections and payload indexes are created. Settings that can't
+    be changed in place (vector size/distance, an index of the wrong type) or
+    that differ from collection_config() are reported as drift, not changed;
+    migrate_collection applies quantization/on-disk changes.
+    """
+
+    def __init__(self, schemas: dict):
+        self.schemas = schemas
+        self.report: dict = {}
+        self.reconciled_at: Optional[str] = None
+
+    async def reconcile(self) -> dict:
+        report = {}
+        for collection, indexes in self.schemas.items():
+            try:
+                report[collection] = await self._reconcile_collection(collection, indexes)
+            except httpx.HTTPError as e:
+                logger.warning(f"Could not reconcile schema for {collection}: {e}")
+                report[collection] = {"error": str(e)}
+        self.report = report
+        self.reconciled_at = datetime.now(timezone.utc).isoformat()
+        return report
+
+    async def try_reconcile(self):
+        try:
+            await self.reconcile()
+        except Exception as e:
+            logger.warning(f"Schema reconcile failed: {e}")
+
+    async def _reconcile_collection(self, collection: str, indexes: dict) -> dict:
+        result = {"created": False, "indexes_created": [], "drift": []}
+        response = await backends.qdrant.get(f"/collections/{collection}")
+        if response.status_code == 404:
+            create = await backends.qdrant.put(f"/collections/{collection}", json=collection_config(collection))
+            create.raise_for_status()
+            logger.info(f"Created collection {collection}")
+            result["created"] = True
+            info = {}
+        else:
+            response.raise_for_status()
+            info = response.json().get("result", {})
+            result["drift"].extend(self._config_drift(info.get("config", {}), collection_config(collection)))
+
+        existing = info.get("payload_schema", {})
+        for field, schema in indexes.items():
+            current = existing.get(field, {}).get("data_type")
+            if current is None:
+                if await qdrant_create_payload_index(collection, field, schema):
+                    result["indexes_created"].append(field)
+                else:
+                    result["drift"].append(f"index {field}: could not create {schema} index")
+            elif current != schema:
+                result["drift"].append(f"index {field}: {current}, expected {schema}")
+
+        if result["indexes_created"]:
+            logger.info(f"Created payload indexes on {collection}: {', '.join(result['indexes_created'])}")
+        for drift in result["drift"]:
+            logger.warning(f"Schema drift in {collection}: {drift}")
+        return result
+
+    def _config_drift(self, config: dict, expected_config: dict) -> List[str]:
+        drift = []
+        vectors = config.get("params", {}).get("vectors", {})
+        for key, expected in expected_config["vectors"].items():
+            current = vectors.get(key, False if key == "on_disk" else None)
+            if current != expected:
+                drift.append(f"vectors.{key}: {current}, expected {expected}")
+        # Qdrant reports optimizers_config back as optimizer_config
+        sections = {"hnsw_config": "hnsw_config", "optimizers_config": "optimizer_config"}
+        for section, reported in sections.items():
+            current = config.get(reported, {})
+            for key, expected in expected_config[section].items():
+                if current.get(key) != expected:
+                    drift.append(f"{section}.{key}: {current.get(key)}, expected {expected}")
+        current_mode = next(iter(config.get("quantization_config") or {}), "none")
+        expected_mode = next(iter(expected_config.get("quantization_config") or {}), "none")
+        if current_mode != expected_mode:
+            drift.append(f"quantization: {current_mode}, expected {expected_mode}")
+        return drift
+
+    def stats(self) -> dict:
+        return {"reconciled_at": self.reconciled_at, "collections": self.report}
+
+
+# Global schema reconciler
+schema_reconciler = SchemaReconciler(COLLECTION_SCHEMAS)
+
+
+class CollectionMigrator:
+    """Re-creates a collection with new vector storage settings while it stays in use.
+
+    Points are streamed into a new versioned collection. Writes made through
+    this server during the copy are tracked by point id and re-copied from
+    the source. For the switch-over, writes to the collection are held back
+    until the ones in flight finish; the last tracked ids are re-copied and
+    the name is pointed at the new collection with a Qdrant alias before
+    writes resume, so none of them land on the old collection afterwards.
+    """
+
+    def __init__(self):
+        self.migrations: dict = {}
+        self._dirty: dict = {}  # collection -> point ids written since the copy started
+        self._tasks: set = set()
+        self._paused: dict = {}  # collection -> event set when writes resume
+        self._inflight: dict = {}  # collection -> writes in progress
+        self._drained: dict = {}  # collection -> event set when the last in-flight write finishes
+
+    @asynccontextmanager
+    async def writing(self, collection: str):
+        """Wrap a write (request plus cache invalidation); waits while the collection is paused."""
+        while collection in self._paused:
+            await self._paused[collection].wait()
+        self._inflight[collection] = self._inflight.get(collection, 0) + 1
+        try:
+            yield
+        finally:
+            self._inflight[collection] -= 1
+            if not self._inflight[collection]:
+                del self._inflight[collection]
+                drained = self._drained.pop(collection, None)
+                if drained is not None:
+                    drained.set()
+
+    async def pause_writes(self, collection: str):
+        """Hold back new writes to a collection and wait for those in flight."""
+        self._paused[collection] = asyncio.Event()
+        if self._inflight.get(collection):
+            drained = self._drained.setdefault(collection, asyncio.Event())
+            await drained.wait()
+
+    def resume_writes(self, collection: str):
+        paused = self._paused.pop(collection, None)
+        if paused is not None:
+            paused.set()
+
+    def note_write(self, collection: str, point_ids: Optional[List]):
+        dirty = self._dirty.get(collection)
+        if dirty is None:
+            return
+        if point_ids is None:
+            # A write by filter: its points can't be re-copied individually
+            self.migrations[collection]["untracked_writes"] += 1
+            logger.warning(f"Untracked write to {collection} during migration")
+            return
+        dirty.update(str(point_id) for point_id in point_ids)
+
+    def start(self, collection: str, config: dict) -> dict:
+        current = self.migrations.get(collection)
+        if current and current["status"] not in ("done", "failed"):
+            raise RuntimeError(f"Migration of {collection} already {current['status']}")
+
+        target = f"{collection}_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
+        self.migrations[collection] = {
+            "collection": collection,
+            "target": target,
+            "config": config,
+            "status": "starting",
+            "copied": 0,
+            "resynced": 0,
+            "untracked_writes": 0,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "finished_at": None,
+            "error": None
+        }
+        self._dirty[collection] = set()
+        task = asyncio.ensure_future(self._run(collection, target, config))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return dict(self.migrations[collection])
+
+    async def _run(self, collection: str, target: str, config: dict):
+        state = self.migrations[collection]
+        try:
+            response = await backends.qdrant.get(f"/collections/{target}")
+            if response.status_code != 404:
+                raise RuntimeError(f"Target collection {target} already exists")
+            response = await backends.qdrant.put(f"/collections/{target}", json=config)
+            response.raise_for_status()
+            for field, schema in COLLECTION_SCHEMAS.get(collection, {}).items():
+                await qdrant_create_payload_index(target, field, schema)
+
+            state["status"] = "copying"
+            batch = []
+            async for point in qdrant_scroll_iter(collection, with_vector=True):
+                batch.append({"id": point["id"], "vector": point["vector"], "payload": point.get("payload", {})})
+                if len(batch) >= BULK_UPSERT_CHUNK:
+                    await self._upsert(target, batch)
+                    state["copied"] += len(batch)
+                    batch = []
+            if batch:
+                await self._upsert(target, batch)
+                state["copied"] += len(batch)
+
+            state["status"] = "syncing"
+            # Catch up while writes still flow, so the pass with writes paused is short
+            await self._resync(collection, collection, target)
+
+            state["status"] = "switching"
+            previous = (await qdrant_aliases()).get(collection)
+            await self.pause_writes(collection)
+            try:
+                # Nothing can be written now, so this re-copies the last of the tracked
+                # writes; once the name points at the target, tracking stops
+                await self._resync(collection, collection, target)
+                if previous:
+                    await self._update_aliases([
+                        {"delete_alias": {"alias_name": collection}},
+                        {"create_alias": {"collection_name": target, "alias_name": collection}}
+                    ])
+                else:
+                    # A plain collection can't share its name with an alias, so it has
+                    # to be dropped first; reads in that gap of one request fail
+                    response = await backends.qdrant.delete(f"/collections/{collection}")
+                    response.raise_for_status()
+                    await self._update_aliases([
+                        {"create_alias": {"collection_name": target, "alias_name": collection}}
+                    ])
+                self._dirty.pop(collection, None)
+            finally:
+                self.resume_writes(collection)
+            if previous:
+                await backends.qdrant.delete(f"/collections/{previous}")
+
+            state["status"] = "done"
+            logger.info(f"Migrated {collection} -> {target} ({state['copied']} points)")
+        except Exception as e:
+            state["status"] = "failed"
+            state["error"] = str(e)
+            logger.error(f"Migration of {collection} failed: {e}")
+        finally:
+            self._dirty.pop(collection, None)
+            state["finished_at"] = datetime.now(timezone.utc).isoformat()
+            invalidate_collection_caches(collection)
+
+    async def _resync(self, collection: str, source: str, target: str):
+        """Re-copy the points written since the last pass (later writes wait for the next one)."""
+        dirty = self._dirty[collection]
+        pending = list(dirty)
+        dirty.clear()
+        for start in range(0, len(pending), BULK_UPSERT_CHUNK):
+            point_ids = pending[start:start + BULK_UPSERT_CHUNK]
+            response = await backends.qdrant.post(
+                f"/collections/{source}/points",
+                json={"ids": point_ids, "with_payload": True, "with_vector": True}
+            )
+            response.raise_for_status()
+            points = response.json().get("result", [])
+            if points:
+                await self._upsert(target, [
+                    {"id": p["id"], "vector": p["vector"], "payload": p.get("payload", {})} for p in points
+                ])
+            found = {str(p["id"]) for p in points}
+            deleted = [point_id for point_id in point_ids if point_id not in found]
+            if deleted:
+                response = await backends.qdrant.post(f"/collections/{target}/points/delete", json={"points": deleted})
+                response.raise_for_status()
+            self.migrations[collection]["resynced"] += len(point_ids)
+
+    async def _upsert(self, target: str, points: List[dict]):
+        response = await backends.qdrant.put(
+            f"/collections/{target}/points",
+            params={"wait": "true"},
+            json={"points": points}
+        )
+        response.raise_for_status()
+
+    async def _update_aliases(self, actions: List[dict]):
+        response = await backends.qdrant.post("/collections/aliases", json={"actions": actions})
+        response.raise_for_status()
+
+    def stats(self) -> dict:
+        return {name: {k: v for k, v in state.items() if k != "config"} for name, state in self.migrations.items()}
+
+
+# Global collection migrator
+collection_migrator = CollectionMigrator()
+
+
+async def qdrant_aliases() -> dict:
+    """Alias name -> collection name."""
+    response = await backends.qdrant.get("/aliases")
+    response.raise_for_status()
+    aliases = response.json().get("result", {}).get("aliases", [])
+    return {alias["alias_name"]: alias["collection_name"] for alias in aliases}
+
+
+@mcp.tool()
+async def migrate_collection(
+    collection: str,
+    quantization: str = "scalar",
+    on_disk: bool = True,
+    in_place: bool = False
+) -> dict:
+    """
+    Change how a collection stores its vectors (quantization, on-disk originals).
+
+    By default the collection is re-created under a versioned name, points are
+    streamed across in the background, and the original name is switched over
+    with an alias; progress is at stats://migrations. With in_place=True the
+    settings are patched onto the existing collection instead and Qdrant
+    rebuilds its segments in the background.
+
+    Args:
+        collection: Collection to migrate (e.g. "agent_events")
+        quantization: scalar (int8), binary, or none
+        on_disk: Keep original float32 vectors on disk, used only for rescoring
+        in_place: Patch the live collection rather than copying it
+
+    Returns:
+        Migration state (target collection, status) or the patch result
+    """
+    try:
+        config = collection_config(collection, quantization, on_disk)
+        if in_place:
+            update = {"vectors": {"": {"on_disk": on_disk}}}
+            update["quantization_config"] = config.get("quantization_config", "Disabled")
+            response = await backends.qdrant.patch(f"/collections/{collection}", json=update)
+            response.raise_for_status()
+            invalidate_collection_caches(collection)
+            return {"success": True, "collection": collection, "status": "patched"}
+        return {"success": True, **collection_migrator.start(collection, config)}
+    except Exception as e:
+        logger.error(f"Migrate collection failed: {e}")
+        return {"success": False, "error": str(e)}
+
+
+# ============================================================
+# NDJSON EXPORT / IMPORT
+# ============================================================
+
+def encode_vector(vector: List[float]) -> str:
+    """Vector as base64 of little-endian float32."""
+    values = array("f", vector)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+
+def decode_vector(encoded: str) -> List[float]:
+    values = array("f")
+    values.frombytes(base64.b64decode(encoded))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tolist()
+
+
+async def export_ndjson(collection: str, with_vectors: bool = False) -> AsyncIterator[str]:
+    """One JSON line per point ({id, payload, vector?}), streamed page by page."""
+    async for point in qdrant_scroll_iter(collection, with_vector=with_vectors):
+        record = {"id": point["id"], "payload": point.get("payload", {})}
+        if with_vectors and point.get("vector") is not None:
+            record["vector"] = encode_vector(point["vector"])
+        yield json.dumps(record, separators=(",", ":")) + "\n"
+
+
+async def import_ndjson(
+    collection: str,
+    lines: AsyncIterator[str],
+    reembed: bool = False,
+    embed_as: Optional[str] = None
+) -> dict:
+    """
+    Upsert NDJSON points into a collection with constant memory.
+
+    Lines are grouped into BULK_UPSERT_CHUNK-point upserts with up to
+    IMPORT_CONCURRENCY in flight. Points without a vector (or all of them,
+    with reembed) are embedded from their payload via EMBEDDING_TEXTS, using
+    embed_as as the collection kind when restoring under another name.
+    """
+    embedding_text = EMBEDDING_TEXTS.get(embed_as or collection)
+    if reembed and embedding_text is None:
+        raise ValueError(f"Don't know how to embed {embed_as or collection} payloads")
+
+    result = {"imported": 0, "failed": 0, "errors": []}
+    slots = asyncio.Semaphore(IMPORT_CONCURRENCY)
+    tasks = set()
+
+    def fail(count: int, error: str):
+        result["failed"] += count
+        if len(result["errors"]) < 20:
+            result["errors"].append(error)
+
+    async def write(chunk: List[dict]):
+        try:
+            missing = [p for p in chunk if p.get("vector") is None]
+            if missing:
+                texts = [embedding_text(p["payload"]) for p in missing]
+                for point, text, vector in zip(missing, texts, await get_embeddings(texts)):
+                    point["vector"] = vector
+                    point["payload"]["text_hash"] = text_hash(text)
+            if await qdrant_upsert(collection, chunk, wait=True):
+                result["imported"] += len(chunk)
+            else:
+                fail(len(chunk), f"Upsert of {len(chunk)} points rejected")
+        except Exception as e:
+            fail(len(chunk), str(e))
+        finally:
+            slots.release()
+
+    async def flush(chunk: List[dict]):
+        await slots.acquire()
+        task = asyncio.ensure_future(write(chunk))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    chunk = []
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            point = {"id": record["id"], "payload": record.get("payload", {})}
+            vector = record.get("vector")
+            if vector is not None and not reembed:
+                point["vector"] = decode_vector(vector) if isinstance(vector, str) else vector
+            elif embedding_text is None:
+                raise ValueError("no vector and no embedding text for this collection")
+        except Exception as e:
+            fail(1, f"line {line_number}: {e}")
+            continue
+        chunk.append(point)
+        if len(chunk) >= BULK_UPSERT_CHUNK:
+            await flush(chunk)
+            chunk = []
+    if chunk:
+        await flush(chunk)
+    if tasks:
+        await asyncio.gather(*tasks)
+    return result
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into text lines."""
+    buffer = b""
+    async for data in chunks:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8")
+    if buffer:
+        yield buffer.decode("utf-8")
+
+
+async def rest_export(request):
+    """GET /export/{collection}?vectors=true - stream a collection as NDJSON."""
+    from starlette.responses import JSONResponse, StreamingResponse
+    collection = request.path_params["collection"]
+    with_vectors = request.query_params.get("vectors", "false").lower() == "true"
+    response = await backends.qdrant.get(f"/collections/{collection}")
+    if response.status_code != 200:
+        return JSONResponse({"status": "error", "error": f"Collection {collection} not found"}, status_code=404)
+    return StreamingResponse(export_ndjson(collection, with_vectors), media_type="application/x-ndjson")
+
+
+async def rest_import(request):
+    """POST /import/{collection}?reembed=true&embed_as=runbooks - upsert an NDJSON request body."""
+    from starlette.responses import JSONResponse
+    collection = request.path_params["collection"]
+    reembed = request.query_params.get("reembed", "false").lower() == "true"
+    embed_as = request.query_params.get("embed_as")
+    try:
+        result = await import_ndjson(collection, iter_lines(request.stream()), reembed, embed_as)
+        return JSONResponse({"status": "ok", "data": result})
+    except Exception as e:
+        logger.error(f"Import into {collection} failed: {e}")
+        return JSONResponse({"status": "error", "error": str(e)}, status_code=500)
+
+
+async def cli_export(collection: str, output: str, with_vectors: bool):
+    out = sys.stdout if output == "-" else open(output, "w", encoding="utf-8")
+    count = 0
+    try:
+        async for line in export_ndjson(collection, with_vectors):
+            out.write(line)
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        await backends.close()
+    logger.info(f"Exported {count} points from {collection}")
+
+
+async def cli_import(collection: str, source: str, reembed: bool, embed_as: Optional[str]) -> dict:
+    async def file_lines():
+        handle = sys.stdin if source == "-" else open(source, encoding="utf-8")
+        try:
+            for line in handle:
+                yield line
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+
+    try:
+        result = await import_ndjson(collection, file_lines(), reembed, embed_as)
+    finally:
+        await backends.close()
+        embedding_cache.close()
+    logger.info(f"Imported {result['imported']} points into {collection}, {result['failed']} failed")
+    for error in result["errors"]:
+        logger.warning(error)
+    return result
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Open shared backend clients for the lifetime of the server."""
+    await backends.start()
+    await schema_reconciler.try_reconcile()
+    await runbook_index.try_refresh()
+    await local_indexes.start()
+    await event_retention.start_schedule()
+    if EVENT_WRITE_BEHIND:
+        await event_queue.start()
+    try:
+        async with app.state.mcp_app.lifespan(app):
+            yield
+    finally:
+        await event_queue.stop(EVENT_QUEUE_DRAIN_TIMEOUT)
+        await event_retention.stop()
+        await local_indexes.stop()
+        await backends.close()
+        embedding_cache.close()
+
+
+def serve():
     port = int(os.environ.get("PORT", "8000"))
     transport = os.environ.get("MCP_TRANSPORT", "sse")
 
     logger.info(f"Starting knowledge MCP server on port {port} with {transport} transport")
 
+    from starlette.applications import Starlette
+    from starlette.routing import Mount, Route
+    import uvicorn
+
+    if transport == "http":
+        mcp_app = mcp.streamable_http_app()
+    else:
+        mcp_app = mcp.http_app(transport="sse")
+
+    rest_routes = [
+        Route("/export/{collection}", rest_export, methods=["GET"]),
+        Route("/import/{collection}", rest_import, methods=["POST"]),
+        Route("/metrics", rest_metrics, methods=["GET"]),
+    ]
+    app = Starlette(routes=rest_routes + [Mount("/", app=mcp_app)], lifespan=lifespan)
+    app.state.mcp_app = mcp_app
+
     if transport == "http":
         from starlette.middleware.cors import CORSMiddleware
-        app = mcp.streamable_http_app()
         app.add_middleware(
             CORSMiddleware,
             allow_origins=["*"],
@@ -1461,10 +4966,33 @@ def main():
             allow_methods=["GET", "POST", "OPTIONS"],
             allow_headers=["*"],
         )
-        import uvicorn
-        uvicorn.run(app, host="0.0.0.0", port=port)
+
+    uvicorn.run(app, host="0.0.0.0", port=port)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Knowledge MCP server")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("serve", help="Run the MCP server (default)")
+    export_parser = commands.add_parser("export", help="Stream a collection to NDJSON")
+    export_parser.add_argument("collection")
+    export_parser.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    export_parser.add_argument("--vectors", action="store_true", help="Include vectors as base64 float32")
+    import_parser = commands.add_parser("import", help="Upsert NDJSON points into a collection")
+    import_parser.add_argument("collection")
+    import_parser.add_argument("input", nargs="?", default="-", help="Input file (default: stdin)")
+    import_parser.add_argument("--reembed", action="store_true", help="Re-embed payloads instead of using stored vectors")
+    import_parser.add_argument("--embed-as", help="Collection whose embedding text to use (e.g. runbooks)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        asyncio.run(cli_export(args.collection, args.output, args.vectors))
+    elif args.command == "import":
+        result = asyncio.run(cli_import(args.collection, args.input, args.reembed, args.embed_as))
+        sys.exit(1 if result["failed"] else 0)
     else:
-        mcp.run(transport="sse", host="0.0.0.0", port=port)
+        serve()
 
 
 if __name__ == "__main__":
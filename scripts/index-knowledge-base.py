@@ -5,52 +5,81 @@ Index knowledge base documentation into Qdrant.
 Reads markdown files from docs/knowledge-base/ and runbooks/
 and indexes them into Qdrant via LiteLLM embeddings.
 
+Indexing is incremental: each point is keyed by its file path and carries a
+content_hash, so unchanged files are skipped, changed files are re-embedded
+(concurrently, in batches) and points for deleted files are removed.
+
+Besides one point per file, every file is split on its headings into
+sections stored in the document_sections collection (created by
+knowledge-mcp at startup, or here if it's missing), each linked to its
+file's point by parent_id.
+search_documentation matches these sections.
+
 Usage:
-    python scripts/index-knowledge-base.py
+    python scripts/index-knowledge-base.py            # index changed files
+    python scripts/index-knowledge-base.py --full     # re-embed everything
+    python scripts/index-knowledge-base.py --watch    # re-index on file changes
 
 Environment:
     QDRANT_URL: Qdrant URL (default: http://10.20.0.40:30633)
     LITELLM_URL: LiteLLM URL (default: http://10.20.0.40:30400)
+    REPO_ROOT: Repository checkout (default: /home/agentic_lab)
+    EMBED_BATCH: Texts per embeddings request (default: 16)
+    EMBED_CONCURRENCY: Embeddings requests in flight (default: 4)
+    UPSERT_CHUNK: Points per upsert request (default: 64)
+    MAX_SECTION_CHARS: Sections longer than this are split at paragraphs (default: 4000)
+
+--watch uses the watchdog package for filesystem notifications when it is
+installed and falls back to polling file modification times otherwise.
 """
 
 import os
 import sys
-import json
+import time
+import re
 import uuid
+import asyncio
+import hashlib
+import argparse
 import httpx
 from pathlib import Path
 from datetime import datetime, timezone
 
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
 # Configuration
 QDRANT_URL = os.environ.get("QDRANT_URL", "http://10.20.0.40:30633")
 LITELLM_URL = os.environ.get("LITELLM_URL", "http://10.20.0.40:30400")
 EMBEDDING_MODEL = "embeddings"
+EMBED_BATCH = int(os.environ.get("EMBED_BATCH", "16"))
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "4"))
+UPSERT_CHUNK = int(os.environ.get("UPSERT_CHUNK", "64"))
+MAX_SECTION_CHARS = int(os.environ.get("MAX_SECTION_CHARS", "4000"))
+SNIPPET_CHARS = 300
+SECTIONS_COLLECTION = "document_sections"
 
 # Paths
-REPO_ROOT = Path("/home/agentic_lab")
+REPO_ROOT = Path(os.environ.get("REPO_ROOT", "/home/agentic_lab"))
 DOCS_PATH = REPO_ROOT / "docs" / "knowledge-base"
 RUNBOOKS_PATH = REPO_ROOT / "runbooks"
 
+# Point ids are derived from the file path so re-indexing overwrites in place
+POINT_NAMESPACE = uuid.UUID("6f1c7e2a-4b1d-4f7e-9a51-8d3c2b0e9f14")
 
-def get_embedding(text: str) -> list[float]:
-    """Get embedding vector via LiteLLM."""
-    response = httpx.post(
-        f"{LITELLM_URL}/v1/embeddings",
-        json={"model": EMBEDDING_MODEL, "input": text},
-        timeout=60.0
-    )
-    response.raise_for_status()
-    return response.json()["data"][0]["embedding"]
 
+def content_hash(text: str) -> str:
+    """Hash of a file's content, stored in the payload to detect changes."""
+    return hashlib.sha256(text.encode()).hexdigest()
 
-def upsert_points(collection: str, points: list[dict]) -> bool:
-    """Upsert points to Qdrant collection."""
-    response = httpx.put(
-        f"{QDRANT_URL}/collections/{collection}/points",
-        json={"points": points},
-        timeout=30.0
-    )
-    return response.status_code == 200
+
+def point_id(path: str) -> str:
+    """Stable point id for a file path relative to REPO_ROOT."""
+    return str(uuid.uuid5(POINT_NAMESPACE, path))
 
 
 def read_markdown(file_path: Path) -> dict:
@@ -79,95 +108,349 @@ def read_markdown(file_path: Path) -> dict:
         "content": content,
         "path": str(file_path.relative_to(REPO_ROOT)),
         "tags": tags,
+        "content_hash": content_hash(content),
         "indexed_at": datetime.now(timezone.utc).isoformat()
     }
 
 
-def index_documentation():
-    """Index documentation files into Qdrant."""
-    print(f"Indexing documentation from {DOCS_PATH}")
+def documentation_payload(doc: dict) -> dict:
+    return doc
 
-    if not DOCS_PATH.exists():
-        print(f"  Directory not found: {DOCS_PATH}")
-        return 0
 
+def runbook_payload(doc: dict) -> dict:
+    # Runbooks use 'solution' field for content; trigger pattern is the title
+    return {
+        "title": doc["title"],
+        "trigger_pattern": doc["title"],
+        "solution": doc["content"],
+        "path": doc["path"],
+        "content_hash": doc["content_hash"],
+        "created_at": doc["indexed_at"]
+    }
+
+
+HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+FENCE = re.compile(r"^\s*(```|~~~)")
+
+
+def split_paragraphs(text: str, limit: int) -> list[str]:
+    """Split text into pieces of at most limit characters at blank lines (or hard, as a last resort)."""
+    pieces, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        while len(paragraph) > limit:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(paragraph[:limit])
+            paragraph = paragraph[limit:]
+        if current and len(current) + len(paragraph) + 2 > limit:
+            pieces.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current.strip():
+        pieces.append(current)
+    return pieces
+
+
+def split_sections(content: str) -> list[dict]:
+    """
+    Split markdown into sections at headings below the document title.
+
+    Each section is {"heading": "Setup > Secrets", "content": ...}: the
+    heading path of its H2..H6 ancestors and its text including the heading
+    line. Headings inside code fences are ignored, headings without a body
+    of their own are folded into their subsections' paths, and sections
+    over MAX_SECTION_CHARS are split at paragraph boundaries.
+    """
+    sections = []
+    stack = []  # (level, heading text)
+    lines = []
+    in_fence = False
+
+    def flush():
+        body = "\n".join(lines).strip()
+        has_text = any(line.strip() and not HEADING.match(line) for line in lines)
+        if body and has_text:
+            heading = " > ".join(text for _, text in stack)
+            pieces = split_paragraphs(body, MAX_SECTION_CHARS)
+            for n, piece in enumerate(pieces, 1):
+                suffix = f" (part {n})" if len(pieces) > 1 else ""
+                sections.append({"heading": heading + suffix, "content": piece})
+
+    for line in content.split("\n"):
+        if FENCE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING.match(line)
+        if match and len(match.group(1)) > 1:
+            flush()
+            lines = []
+            level = len(match.group(1))
+            stack = [(lvl, text) for lvl, text in stack if lvl < level] + [(level, match.group(2).strip())]
+        elif match:
+            # The H1 is the document title, carried on every section
+            continue
+        lines.append(line)
+    flush()
+    return sections
+
+
+def snippet(text: str) -> str:
+    """Start of a section's text without its heading line, cut at a word boundary."""
+    body = " ".join(line for line in text.split("\n") if not HEADING.match(line))
+    body = " ".join(body.split())
+    if len(body) <= SNIPPET_CHARS:
+        return body
+    return body[:SNIPPET_CHARS].rsplit(" ", 1)[0] + "…"
+
+
+def section_embedding_text(title: str, heading: str, content: str) -> str:
+    """Mirrors knowledge-mcp's section_embedding_text."""
+    return f"{title} > {heading}\n\n{content}"
+
+
+def section_points(doc: dict, collection: str, payload: dict) -> list[tuple]:
+    """(point, embed_text) for each section of a document."""
+    sections = split_sections(doc["content"])
     points = []
-    for md_file in DOCS_PATH.glob("*.md"):
-        print(f"  Processing: {md_file.name}")
-        try:
-            doc = read_markdown(md_file)
+    for index, section in enumerate(sections):
+        text = section_embedding_text(doc["title"], section["heading"], section["content"])
+        section_payload = {
+            "parent_id": point_id(doc["path"]),
+            "collection": collection,
+            "path": doc["path"],
+            "title": doc["title"],
+            "heading": section["heading"],
+            "section_index": index,
+            "content": section["content"],
+            "snippet": snippet(section["content"]),
+            "content_hash": content_hash(text)
+        }
+        if payload.get("doc_type"):
+            section_payload["doc_type"] = payload["doc_type"]
+        points.append(({"id": point_id(f"{doc['path']}#{index}"), "payload": section_payload}, text))
+    return points
+
+
+# collection, source directory, glob, payload builder
+SOURCES = [
+    ("documentation", DOCS_PATH, "*.md", documentation_payload),
+    ("runbooks", RUNBOOKS_PATH, "**/*.md", runbook_payload),
+]
+
+
+async def get_embeddings(client: httpx.AsyncClient, texts: list[str]) -> list[list[float]]:
+    """Get embedding vectors for a batch of texts via LiteLLM."""
+    response = await client.post(
+        f"{LITELLM_URL}/v1/embeddings",
+        json={"model": EMBEDDING_MODEL, "input": texts},
+        timeout=120.0
+    )
+    response.raise_for_status()
+    data = sorted(response.json()["data"], key=lambda item: item["index"])
+    return [item["embedding"] for item in data]
+
+
+async def upsert_points(client: httpx.AsyncClient, collection: str, points: list[dict]) -> bool:
+    """Upsert points to Qdrant collection."""
+    response = await client.put(
+        f"{QDRANT_URL}/collections/{collection}/points",
+        params={"wait": "true"},
+        json={"points": points},
+        timeout=60.0
+    )
+    return response.status_code == 200
+
+
+async def delete_points(client: httpx.AsyncClient, collection: str, ids: list[str]) -> bool:
+    """Delete points by id from Qdrant collection."""
+    response = await client.post(
+        f"{QDRANT_URL}/collections/{collection}/points/delete",
+        params={"wait": "true"},
+        json={"points": ids},
+        timeout=60.0
+    )
+    return response.status_code == 200
 
-            # Create embedding from title + content summary
-            embed_text = f"{doc['title']}\n\n{doc['content'][:2000]}"
-            vector = get_embedding(embed_text)
-
-            point = {
-                "id": str(uuid.uuid4()),
-                "vector": vector,
-                "payload": doc
-            }
-            points.append(point)
-            print(f"    ✓ Embedded: {doc['title']}")
-        except Exception as e:
-            print(f"    ✗ Error: {e}")
 
-    if points:
-        print(f"\n  Upserting {len(points)} documents to 'documentation' collection...")
-        if upsert_points("documentation", points):
-            print("    ✓ Success")
-            return len(points)
+async def indexed_files(client: httpx.AsyncClient, collection: str, prefix: str) -> dict:
+    """Points indexed from files under prefix, grouped by path: {path: [point, ...]}.
+
+    Points without a path (e.g. runbooks added through knowledge-mcp) are
+    not managed by this script and are left alone.
+    """
+    by_path = {}
+    offset = None
+    while True:
+        body = {"limit": 256, "with_payload": True, "with_vector": False}
+        if offset is not None:
+            body["offset"] = offset
+        response = await client.post(
+            f"{QDRANT_URL}/collections/{collection}/points/scroll",
+            json=body,
+            timeout=60.0
+        )
+        if response.status_code == 404:
+            return by_path  # collection doesn't exist yet: nothing indexed
+        response.raise_for_status()
+        result = response.json()["result"]
+        for point in result["points"]:
+            path = point.get("payload", {}).get("path")
+            if path and path.startswith(prefix):
+                by_path.setdefault(path, []).append(point)
+        offset = result.get("next_page_offset")
+        if offset is None:
+            return by_path
+
+
+async def ensure_collection(client: httpx.AsyncClient, collection: str):
+    """Create collection, sized from a probe embedding, if it doesn't exist.
+
+    knowledge-mcp adds its payload indexes when it next reconciles schemas.
+    """
+    response = await client.get(f"{QDRANT_URL}/collections/{collection}", timeout=10.0)
+    if response.status_code != 404:
+        response.raise_for_status()
+        return
+    vector = (await get_embeddings(client, [collection]))[0]
+    response = await client.put(
+        f"{QDRANT_URL}/collections/{collection}",
+        json={"vectors": {"size": len(vector), "distance": "Cosine"}},
+        timeout=30.0
+    )
+    response.raise_for_status()
+    print(f"Created collection {collection} ({len(vector)} dimensions)")
+
+
+async def embed_and_upsert(client: httpx.AsyncClient, collection: str, docs: list[tuple]) -> set:
+    """Embed (point, embed_text) pairs concurrently in batches and upsert them in chunks.
+
+    Returns the ids of the points written.
+    """
+    semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+    pending = []
+    written = set()
+
+    async def embed_batch(batch):
+        async with semaphore:
+            vectors = await get_embeddings(client, [text for _, text in batch])
+        return [{**point, "vector": vector} for (point, _), vector in zip(batch, vectors)]
+
+    batches = [docs[i:i + EMBED_BATCH] for i in range(0, len(docs), EMBED_BATCH)]
+    for task in asyncio.as_completed([embed_batch(batch) for batch in batches]):
+        try:
+            pending.extend(await task)
+        except Exception as e:
+            print(f"    ✗ Embedding batch failed: {e}")
+            continue
+        while len(pending) >= UPSERT_CHUNK:
+            chunk, pending = pending[:UPSERT_CHUNK], pending[UPSERT_CHUNK:]
+            if await upsert_points(client, collection, chunk):
+                written.update(point["id"] for point in chunk)
+            else:
+                print(f"    ✗ Failed to upsert {len(chunk)} points")
+    if pending:
+        if await upsert_points(client, collection, pending):
+            written.update(point["id"] for point in pending)
         else:
-            print("    ✗ Failed to upsert")
+            print(f"    ✗ Failed to upsert {len(pending)} points")
+    return written
 
-    return 0
 
+async def index_source(client: httpx.AsyncClient, collection: str, root: Path, pattern: str, build, full: bool = False) -> dict:
+    """Bring a collection, and its files' sections, in line with the markdown files under root."""
+    print(f"Indexing {collection} from {root}")
+    summary = {"indexed": 0, "sections": 0, "unchanged": 0, "deleted": 0, "failed": 0}
 
-def index_runbooks():
-    """Index runbook files into Qdrant."""
-    print(f"\nIndexing runbooks from {RUNBOOKS_PATH}")
+    if not root.exists():
+        print(f"  Directory not found: {root}")
+        return summary
 
-    if not RUNBOOKS_PATH.exists():
-        print(f"  Directory not found: {RUNBOOKS_PATH}")
-        return 0
+    prefix = str(root.relative_to(REPO_ROOT)) + "/"
+    existing = await indexed_files(client, collection, prefix)
+    existing_sections = await indexed_files(client, SECTIONS_COLLECTION, prefix)
 
-    points = []
-    for md_file in RUNBOOKS_PATH.rglob("*.md"):
-        print(f"  Processing: {md_file.relative_to(RUNBOOKS_PATH)}")
+    docs = []
+    sections = []
+    replaced = {}  # new point id -> ids it supersedes, deleted once it's written
+    stale_sections = []
+    seen = set()
+    for md_file in sorted(root.glob(pattern)):
         try:
             doc = read_markdown(md_file)
-
-            # Runbooks use 'solution' field for content
-            embed_text = f"{doc['title']}\n\n{doc['content'][:2000]}"
-            vector = get_embedding(embed_text)
-
-            # Extract trigger pattern from overview section
-            trigger_pattern = doc['title']
-
-            point = {
-                "id": str(uuid.uuid4()),
-                "vector": vector,
-                "payload": {
-                    "title": doc['title'],
-                    "trigger_pattern": trigger_pattern,
-                    "solution": doc['content'],
-                    "path": doc['path'],
-                    "created_at": doc['indexed_at']
-                }
-            }
-            points.append(point)
-            print(f"    ✓ Embedded: {doc['title']}")
         except Exception as e:
-            print(f"    ✗ Error: {e}")
-
-    if points:
-        print(f"\n  Upserting {len(points)} runbooks to 'runbooks' collection...")
-        if upsert_points("runbooks", points):
-            print("    ✓ Success")
-            return len(points)
+            print(f"  ✗ {md_file.relative_to(root)}: {e}")
+            summary["failed"] += 1
+            continue
+
+        path = doc["path"]
+        seen.add(path)
+        new_id = point_id(path)
+        points = existing.get(path, [])
+        doc_current = [str(p["id"]) for p in points] == [new_id] \
+            and points[0]["payload"].get("content_hash") == doc["content_hash"]
+
+        # Keep fields other tools added (execution stats, autonomy level, ...)
+        payload = {}
+        for point in points:
+            payload.update(point.get("payload", {}))
+        payload.pop("text_hash", None)  # knowledge-mcp's hash of the text behind the old vector
+        payload.update(build(doc))
+
+        # Sections are hashed on their own text, so editing one section re-embeds only that one
+        new_sections = section_points(doc, collection, payload)
+        old_hashes = {str(p["id"]): p["payload"].get("content_hash") for p in existing_sections.get(path, [])}
+        changed_sections = [
+            (point, text) for point, text in new_sections
+            if full or old_hashes.get(point["id"]) != point["payload"]["content_hash"]
+        ]
+        new_section_ids = {point["id"] for point, _ in new_sections}
+        removed_sections = [section_id for section_id in old_hashes if section_id not in new_section_ids]
+
+        if not full and doc_current and not changed_sections and not removed_sections:
+            summary["unchanged"] += 1
+            continue
+
+        if full or not doc_current:
+            replaced[new_id] = [str(p["id"]) for p in points if str(p["id"]) != new_id]
+            embed_text = f"{doc['title']}\n\n{doc['content'][:2000]}"
+            docs.append(({"id": new_id, "payload": payload}, embed_text))
+        sections.extend(changed_sections)
+        stale_sections.extend(removed_sections)
+        print(f"  • {md_file.relative_to(root)} ({len(changed_sections)}/{len(new_sections)} sections changed)")
+
+    stale_ids = [str(p["id"]) for path, points in existing.items() if path not in seen for p in points]
+    stale_sections.extend(str(p["id"]) for path, points in existing_sections.items() if path not in seen for p in points)
+
+    if docs:
+        written = await embed_and_upsert(client, collection, docs)
+        summary["indexed"] = len(written)
+        summary["failed"] += len(docs) - len(written)
+        for new_id in written:
+            stale_ids.extend(replaced[new_id])
+    if sections:
+        written = await embed_and_upsert(client, SECTIONS_COLLECTION, sections)
+        summary["sections"] = len(written)
+        summary["failed"] += len(sections) - len(written)
+    for target, ids in ((collection, stale_ids), (SECTIONS_COLLECTION, stale_sections)):
+        if not ids:
+            continue
+        if await delete_points(client, target, ids):
+            summary["deleted"] += len(ids)
         else:
-            print("    ✗ Failed to upsert")
+            print(f"  ✗ Failed to delete {len(ids)} stale points from {target}")
+
+    print(f"  {summary['indexed']} indexed ({summary['sections']} sections), {summary['unchanged']} unchanged, "
+          f"{summary['deleted']} deleted, {summary['failed']} failed")
+    return summary
+
 
-    return 0
+async def index_all(full: bool = False) -> dict:
+    async with httpx.AsyncClient() as client:
+        await ensure_collection(client, SECTIONS_COLLECTION)
+        return {
+            collection: await index_source(client, collection, root, pattern, build, full)
+            for collection, root, pattern, build in SOURCES
+        }
 
 
 def verify_connectivity():
@@ -194,7 +477,74 @@ def verify_connectivity():
     return True
 
 
+class MarkdownChangeHandler(FileSystemEventHandler):
+    """Records that a markdown file changed; the watch loop does the indexing."""
+
+    def __init__(self):
+        self.changed_at = None
+
+    def on_any_event(self, event):
+        paths = [getattr(event, "src_path", ""), getattr(event, "dest_path", "")]
+        if any(str(path).endswith(".md") for path in paths):
+            self.changed_at = time.monotonic()
+
+
+def snapshot_mtimes() -> dict:
+    return {
+        path: path.stat().st_mtime
+        for _, root, pattern, _ in SOURCES if root.exists()
+        for path in root.glob(pattern)
+    }
+
+
+def reindex() -> bool:
+    """One --watch pass; a failure is reported and retried on the next change or poll."""
+    try:
+        asyncio.run(index_all())
+        return True
+    except Exception as e:
+        print(f"  ✗ Re-index failed, will retry: {e}")
+        return False
+
+
+def watch(debounce: float, poll_interval: float):
+    """Re-index whenever markdown files change, once they've been quiet for debounce seconds."""
+    if Observer is not None:
+        handler = MarkdownChangeHandler()
+        observer = Observer()
+        for _, root, _, _ in SOURCES:
+            if root.exists():
+                observer.schedule(handler, str(root), recursive=True)
+        observer.start()
+        print(f"\nWatching {DOCS_PATH} and {RUNBOOKS_PATH} for changes (Ctrl-C to stop)")
+        try:
+            while True:
+                time.sleep(0.5)
+                if handler.changed_at and time.monotonic() - handler.changed_at >= debounce:
+                    handler.changed_at = None
+                    if not reindex():
+                        handler.changed_at = time.monotonic()
+        finally:
+            observer.stop()
+            observer.join()
+    else:
+        print(f"\nwatchdog not installed, polling every {poll_interval}s (Ctrl-C to stop)")
+        mtimes = snapshot_mtimes()
+        while True:
+            time.sleep(poll_interval)
+            current = snapshot_mtimes()
+            if current != mtimes and reindex():
+                mtimes = current
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Index knowledge base documentation into Qdrant")
+    parser.add_argument("--full", action="store_true", help="Re-embed every file, even unchanged ones")
+    parser.add_argument("--watch", action="store_true", help="Keep running and re-index on file changes")
+    parser.add_argument("--debounce", type=float, default=2.0, help="Seconds of quiet before re-indexing in --watch")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="Polling interval without watchdog")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("Knowledge Base Indexer")
     print("=" * 60)
@@ -204,15 +554,22 @@ def main():
         sys.exit(1)
 
     print()
-    docs_count = index_documentation()
-    runbooks_count = index_runbooks()
+    started = time.monotonic()
+    results = asyncio.run(index_all(full=args.full))
 
     print("\n" + "=" * 60)
-    print(f"Indexing complete:")
-    print(f"  Documentation: {docs_count} files")
-    print(f"  Runbooks: {runbooks_count} files")
+    print(f"Indexing complete in {time.monotonic() - started:.1f}s:")
+    for collection, summary in results.items():
+        print(f"  {collection}: {summary['indexed']} indexed ({summary['sections']} sections), {summary['unchanged']} unchanged, "
+              f"{summary['deleted']} deleted, {summary['failed']} failed")
     print("=" * 60)
 
+    if args.watch:
+        try:
+            watch(args.debounce, args.poll_interval)
+        except KeyboardInterrupt:
+            print("\nStopped watching")
+
 
 if __name__ == "__main__":
     main()
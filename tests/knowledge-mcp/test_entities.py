@@ -174,3 +174,32 @@ class TestDeviceTypes:
             assert "control" in result or "methods" in result or "api" in result
         elif response.status_code == 404:
             pytest.skip("get_device_type_info not implemented or type not found")
+
+
+class TestEntityBulkMutation:
+    """Test filter-based entity mutations."""
+
+    @pytest.mark.integration
+    def test_delete_entities_where_dry_run(self, mcp_client):
+        """Dry run counts matches without deleting."""
+        payload = {
+            "tool": "delete_entities_where",
+            "arguments": {"where": {"network": "prod"}, "dry_run": True}
+        }
+        response = mcp_client.post("/invoke", json=payload)
+        assert response.status_code == 200
+
+        result = response.json()
+        assert result["success"]
+        assert result["deleted"] == 0
+
+    @pytest.mark.integration
+    def test_delete_entities_where_requires_filter(self, mcp_client):
+        """An empty filter is rejected rather than deleting everything."""
+        payload = {
+            "tool": "delete_entities_where",
+            "arguments": {"where": {}}
+        }
+        response = mcp_client.post("/invoke", json=payload)
+        assert response.status_code == 200
+        assert response.json()["success"] is False
@@ -0,0 +1,35 @@
+"""
+Test agent event listing via knowledge-mcp.
+"""
+
+import pytest
+
+
+class TestRecentEventPaging:
+    """Test list_recent_events pagination."""
+
+    @pytest.mark.integration
+    def test_paging_returns_each_event_once(self, mcp_client):
+        """Paging with before/before_id until an empty page returns every event once, newest first."""
+        seen = []
+        cursor = {}
+        for _ in range(200):
+            payload = {
+                "tool": "list_recent_events",
+                "arguments": {"event_type": "agent.tool.call", "limit": 7, **cursor}
+            }
+            response = mcp_client.post("/invoke", json=payload)
+            assert response.status_code == 200
+
+            page = response.json().get("results", [])
+            if not page:
+                break
+            seen.extend((event["timestamp"], event["id"]) for event in page)
+            cursor = {"before": page[-1]["timestamp"], "before_id": page[-1]["id"]}
+        else:
+            pytest.fail("Paging never reached an empty page")
+
+        if not seen:
+            pytest.skip("No agent.tool.call events recorded")
+        assert len(set(seen)) == len(seen), "An event was returned on more than one page"
+        assert seen == sorted(seen, reverse=True)
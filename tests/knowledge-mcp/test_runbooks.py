@@ -142,3 +142,57 @@ class TestRunbookGitIntegration:
 
         # This may not be implemented, so accept various responses
         assert response.status_code in [200, 404, 501]
+
+
+class TestRunbookTieredLookup:
+    """Test alertname-first runbook lookup used by the orchestrator."""
+
+    @pytest.mark.integration
+    def test_tiered_lookup_returns_match_type(self, mcp_client):
+        """Every lookup reports a match type, exact or not."""
+        payload = {
+            "tool": "lookup_runbook_tiered",
+            "arguments": {"alertname": "KubePodCrashLooping"}
+        }
+        response = mcp_client.post("/invoke", json=payload)
+
+        if response.status_code == 200:
+            result = response.json()
+            assert result.get("match_type") in ["EXACT", "SIMILAR", "NO_MATCH"]
+        else:
+            pytest.skip("lookup_runbook_tiered not available")
+
+    @pytest.mark.integration
+    def test_tiered_lookup_exact_match_skips_semantic(self, mcp_client):
+        """An exact alertname hit is served from the exact tier."""
+        payload = {
+            "tool": "lookup_runbook_tiered",
+            "arguments": {"alertname": "KubeJobFailed"}
+        }
+        response = mcp_client.post("/invoke", json=payload)
+
+        if response.status_code == 200:
+            result = response.json()
+            if result.get("match_type") == "EXACT" and result.get("tier") == "exact":
+                assert result.get("score") == 1.0
+                assert result.get("runbook", {}).get("id")
+        else:
+            pytest.skip("lookup_runbook_tiered not available")
+
+
+class TestRunbookAutonomy:
+    """Test autonomy suggestions from rolling execution windows."""
+
+    @pytest.mark.integration
+    def test_autonomy_candidates_report_windows(self, mcp_client):
+        """Candidates carry the basis they were judged on and their window stats."""
+        payload = {
+            "tool": "list_autonomy_candidates",
+            "arguments": {"min_executions": 1, "min_success_rate": 0.0}
+        }
+        response = mcp_client.post("/invoke", json=payload)
+        assert response.status_code == 200
+
+        for candidate in response.json():
+            assert candidate["basis"] in ["7d", "30d", "90d", "lifetime"]
+            assert set(candidate["windows"]) == {"7d", "30d", "90d"}
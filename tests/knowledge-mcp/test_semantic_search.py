@@ -155,3 +155,55 @@ class TestSearchQuality:
         response = mcp_client.post("/invoke", json=payload)
         # Should not crash, may return empty or error
         assert response.status_code in [200, 400]
+
+
+class TestFederatedSearch:
+    """Test search_knowledge across collections."""
+
+    @pytest.mark.integration
+    def test_search_knowledge_tags_collections(self, mcp_client):
+        """Merged results are tagged by source collection and best-first."""
+        payload = {
+            "tool": "search_knowledge",
+            "arguments": {"query": "argocd sync failure", "limit": 10}
+        }
+        response = mcp_client.post("/invoke", json=payload)
+        assert response.status_code == 200
+
+        result = response.json()
+        results = result.get("results", [])
+
+        for item in results:
+            assert item["metadata"]["collection"] in ["runbooks", "decisions", "documentation"]
+        scores = [item["score"] for item in results]
+        assert scores == sorted(scores, reverse=True)
+
+
+class TestSectionSearch:
+    """Test section-level documentation search."""
+
+    @pytest.mark.integration
+    def test_section_results_link_to_full_text(self, mcp_client):
+        """Section hits carry a heading and resolve to full text via get_document_section."""
+        payload = {
+            "tool": "search_documentation",
+            "arguments": {"query": "argocd app of apps pattern"}
+        }
+        response = mcp_client.post("/invoke", json=payload)
+        assert response.status_code == 200
+
+        results = response.json().get("results", [])
+        sections = [item for item in results if "heading" in item["metadata"]]
+        if not sections:
+            pytest.skip("No document sections indexed")
+
+        payload = {
+            "tool": "get_document_section",
+            "arguments": {"section_id": sections[0]["id"]}
+        }
+        response = mcp_client.post("/invoke", json=payload)
+        assert response.status_code == 200
+
+        section = response.json()
+        assert section["parent_id"] == sections[0]["metadata"]["parent_id"]
+        assert len(section["content"]) >= len(sections[0]["content"].rstrip("…"))